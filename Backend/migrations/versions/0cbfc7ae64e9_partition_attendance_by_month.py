@@ -0,0 +1,112 @@
+"""partition attendance by month
+
+Revision ID: 0cbfc7ae64e9
+Revises: bcff1e0c54f2
+Create Date: 2026-10-17 10:03:18.271904
+
+Converts attendance into a Postgres declarative range-partitioned table on
+attendance_date (one partition per month plus a default partition). The
+existing rows are copied into the new table, so run it in a maintenance
+window. Future months are created by src.db.partitions on startup and daily.
+Other databases are left untouched.
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0cbfc7ae64e9'
+down_revision: Union[str, Sequence[str], None] = 'bcff1e0c54f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, student_id, teacher_id, class_id, attendance_date, is_present, created_at"
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_table(partitioned: bool) -> None:
+    # a partitioned table's primary key has to include the partition key
+    primary_key = "PRIMARY KEY (id, attendance_date)" if partitioned else "PRIMARY KEY (id)"
+    partition_by = " PARTITION BY RANGE (attendance_date)" if partitioned else ""
+    op.execute(f"""
+        CREATE TABLE attendance (
+            id INTEGER NOT NULL DEFAULT nextval('attendance_id_seq'::regclass),
+            student_id INTEGER NOT NULL REFERENCES student (id),
+            teacher_id INTEGER NOT NULL REFERENCES teacher (id),
+            class_id INTEGER NOT NULL REFERENCES class (id),
+            attendance_date DATE NOT NULL,
+            is_present BOOLEAN NOT NULL,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            CONSTRAINT attendance_pkey {primary_key},
+            CONSTRAINT uq_attendance_student_class_date UNIQUE (student_id, class_id, attendance_date)
+        ){partition_by}
+    """)
+    op.execute("CREATE INDEX ix_attendance_attendance_date ON attendance (attendance_date)")
+    op.execute("CREATE INDEX ix_attendance_class_date ON attendance (class_id, attendance_date)")
+
+
+def _swap_out_old_table() -> None:
+    """Rename the current table (and its index names) out of the way"""
+    op.execute("ALTER SEQUENCE attendance_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE attendance RENAME TO attendance_old")
+    op.execute("ALTER TABLE attendance_old RENAME CONSTRAINT attendance_pkey TO attendance_old_pkey")
+    op.execute("ALTER TABLE attendance_old RENAME CONSTRAINT uq_attendance_student_class_date TO uq_attendance_old_student_class_date")
+    op.execute("ALTER INDEX ix_attendance_attendance_date RENAME TO ix_attendance_old_attendance_date")
+    op.execute("ALTER INDEX ix_attendance_class_date RENAME TO ix_attendance_old_class_date")
+
+
+def _copy_and_drop_old_table() -> None:
+    op.execute(f"INSERT INTO attendance ({COLUMNS}) SELECT {COLUMNS} FROM attendance_old")
+    op.execute("DROP TABLE attendance_old")
+    op.execute("ALTER SEQUENCE attendance_id_seq OWNED BY attendance.id")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    first_date = bind.execute(sa.text("SELECT min(attendance_date) FROM attendance")).scalar()
+
+    _swap_out_old_table()
+    _create_table(partitioned=True)
+
+    # one partition per month from the oldest record up to a few months ahead
+    current = date.today().replace(day=1)
+    month = first_date.replace(day=1) if first_date else current
+    last = _add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        next_month = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE attendance_y{month.year:04d}m{month.month:02d} PARTITION OF attendance "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')"
+        )
+        month = next_month
+    op.execute("CREATE TABLE attendance_default PARTITION OF attendance DEFAULT")
+
+    _copy_and_drop_old_table()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # dropping the partitioned parent drops every partition attached to it,
+    # detached (archived) months are not brought back
+    _swap_out_old_table()
+    _create_table(partitioned=False)
+    _copy_and_drop_old_table()
@@ -0,0 +1,37 @@
+"""class student count
+
+Revision ID: 3c8f1a6d9e27
+Revises: 9b4e7d2a6c15
+Create Date: 2026-10-17 16:41:09.274518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c8f1a6d9e27'
+down_revision: Union[str, Sequence[str], None] = '9b4e7d2a6c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('class')]
+    if 'student_count' not in columns:
+        with op.batch_alter_table('class') as batch_op:
+            batch_op.add_column(sa.Column('student_count', sa.Integer(), nullable=False, server_default='0'))
+
+    op.execute(
+        'UPDATE "class" SET student_count = (SELECT COUNT(*) FROM student WHERE student.class_id = "class".id)'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.drop_column('student_count')
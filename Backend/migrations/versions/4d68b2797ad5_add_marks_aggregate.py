@@ -0,0 +1,66 @@
+"""add marks aggregate
+
+Revision ID: 4d68b2797ad5
+Revises: ecb52e46973c
+Create Date: 2026-10-17 12:02:41.530917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d68b2797ad5'
+down_revision: Union[str, Sequence[str], None] = 'ecb52e46973c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    exam_type = postgresql.ENUM(
+        'TERM1', 'TERM2', 'TERM3', 'FINAL', 'QUIZ', 'MIDTERM', 'CUSTOM',
+        name='examtype', create_type=False,
+    )
+    op.create_table(
+        'marks_aggregate',
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('subject_id', sa.Integer(), nullable=False),
+        sa.Column('exam_type', exam_type, nullable=False),
+        sa.Column('marks_sum', sa.Float(), nullable=False),
+        sa.Column('marks_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['school_id'], ['school.id']),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['subject_id'], ['subject.id']),
+        sa.PrimaryKeyConstraint('school_id', 'class_id', 'subject_id', 'exam_type'),
+        if_not_exists=True,
+    )
+
+    # backfill from marks and exam marks (as a percentage of max_marks)
+    op.execute("DELETE FROM marks_aggregate")
+    op.execute("""
+        INSERT INTO marks_aggregate (school_id, class_id, subject_id, exam_type, marks_sum, marks_count)
+        SELECT school_id, class_id, subject_id, exam_type, COALESCE(SUM(score), 0), COUNT(score)
+        FROM (
+            SELECT c.school_id, m.class_id, m.subject_id, m.exam_type, m.marks AS score
+            FROM marks m
+            JOIN class c ON c.id = m.class_id
+            UNION ALL
+            SELECT c.school_id, e.class_id, e.subject_id, e.exam_type,
+                   em.marks_obtained * 100.0 / NULLIF(e.max_marks, 0) AS score
+            FROM exammarks em
+            JOIN exam e ON e.id = em.exam_id
+            JOIN class c ON c.id = e.class_id
+        ) AS scores
+        GROUP BY school_id, class_id, subject_id, exam_type
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('marks_aggregate')
@@ -0,0 +1,43 @@
+"""link teacher to user
+
+Revision ID: 5e2d8a41c7b3
+Revises: 7a1f3c9e2b64
+Create Date: 2026-10-17 13:58:22.617034
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e2d8a41c7b3'
+down_revision: Union[str, Sequence[str], None] = '7a1f3c9e2b64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('teacher')]
+    if 'user_id' not in columns:
+        with op.batch_alter_table('teacher') as batch_op:
+            batch_op.add_column(sa.Column('user_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_teacher_user_id', 'user', ['user_id'], ['id'])
+    op.create_index('ix_teacher_user_id', 'teacher', ['user_id'], unique=True, if_not_exists=True)
+
+    # teachers were matched to their login by email until now
+    op.execute(
+        'UPDATE teacher SET user_id = (SELECT "user".id FROM "user" WHERE "user".email = teacher.email) '
+        'WHERE user_id IS NULL'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_teacher_user_id', table_name='teacher')
+    with op.batch_alter_table('teacher') as batch_op:
+        batch_op.drop_constraint('fk_teacher_user_id', type_='foreignkey')
+        batch_op.drop_column('user_id')
@@ -0,0 +1,62 @@
+"""student attendance prefix
+
+Revision ID: 6a2e9c4f1b83
+Revises: 3c8f1a6d9e27
+Create Date: 2026-10-17 18:12:40.531904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a2e9c4f1b83'
+down_revision: Union[str, Sequence[str], None] = '3c8f1a6d9e27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'student_attendance_prefix',
+        sa.Column('student_id', sa.Integer(), nullable=False),
+        sa.Column('attendance_date', sa.Date(), nullable=False),
+        sa.Column('present', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('cum_present', sa.Integer(), nullable=False),
+        sa.Column('cum_total', sa.Integer(), nullable=False),
+        sa.Column('absence_streak', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['student_id'], ['student.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('student_id', 'attendance_date'),
+        if_not_exists=True,
+    )
+
+    # backfill from the existing attendance rows
+    op.execute("DELETE FROM student_attendance_prefix")
+    op.execute("""
+        INSERT INTO student_attendance_prefix
+            (student_id, attendance_date, present, total, cum_present, cum_total, absence_streak)
+        SELECT student_id, attendance_date, present, total,
+               SUM(present) OVER w, SUM(total) OVER w,
+               seq - COALESCE(MAX(CASE WHEN present > 0 THEN seq END) OVER w, 0)
+        FROM (
+            SELECT student_id, attendance_date, present, total,
+                   ROW_NUMBER() OVER (PARTITION BY student_id ORDER BY attendance_date) AS seq
+            FROM (
+                SELECT student_id, attendance_date,
+                       SUM(CASE WHEN is_present THEN 1 ELSE 0 END) AS present, COUNT(id) AS total
+                FROM attendance
+                GROUP BY student_id, attendance_date
+            ) days
+        ) ranked
+        WINDOW w AS (PARTITION BY student_id ORDER BY attendance_date)
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('student_attendance_prefix')
@@ -0,0 +1,36 @@
+"""add data version
+
+Revision ID: 7a1f3c9e2b64
+Revises: 4d68b2797ad5
+Create Date: 2026-10-17 12:41:09.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a1f3c9e2b64'
+down_revision: Union[str, Sequence[str], None] = '4d68b2797ad5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'data_version',
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('entity', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('school_id', 'entity'),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('data_version')
@@ -0,0 +1,44 @@
+"""store refresh tokens by jti
+
+Revision ID: 9b4e7d2a6c15
+Revises: 5e2d8a41c7b3
+Create Date: 2026-10-17 15:06:47.381250
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e7d2a6c15'
+down_revision: Union[str, Sequence[str], None] = '5e2d8a41c7b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table('refreshtoken'):
+        return
+
+    # revoked rows are never looked up again
+    op.execute('DELETE FROM refreshtoken WHERE is_revoked = true')
+
+    # the full JWT (and its unique index) is redundant with the signed jti
+    if 'token' in [column['name'] for column in inspector.get_columns('refreshtoken')]:
+        op.drop_index('ix_refreshtoken_token', table_name='refreshtoken', if_exists=True)
+        with op.batch_alter_table('refreshtoken') as batch_op:
+            batch_op.drop_column('token')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # outstanding tokens cannot be restored, users log in again
+    op.execute('DELETE FROM refreshtoken')
+    with op.batch_alter_table('refreshtoken') as batch_op:
+        batch_op.add_column(sa.Column('token', sqlmodel.sql.sqltypes.AutoString(), nullable=False))
+    op.create_index('ix_refreshtoken_token', 'refreshtoken', ['token'], unique=True)
@@ -0,0 +1,59 @@
+"""alert rules and alerts
+
+Revision ID: b7d3f19a4c52
+Revises: 6a2e9c4f1b83
+Create Date: 2026-10-17 21:04:16.318420
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d3f19a4c52'
+down_revision: Union[str, Sequence[str], None] = '6a2e9c4f1b83'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'alert_rule',
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('threshold', sa.Float(), nullable=False),
+        sa.Column('window_days', sa.Integer(), nullable=False),
+        sa.Column('enabled', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('school_id', 'kind'),
+        if_not_exists=True,
+    )
+    op.create_table(
+        'alert',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=True),
+        sa.Column('target_id', sa.Integer(), nullable=False),
+        sa.Column('target_name', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('threshold', sa.Float(), nullable=False),
+        sa.Column('first_seen', sa.DateTime(), nullable=False),
+        sa.Column('last_seen', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['school_id'], ['school.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('kind', 'target_id', name='uq_alert_kind_target'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_alert_school_class', 'alert', ['school_id', 'class_id'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_alert_school_class', table_name='alert')
+    op.drop_table('alert')
+    op.drop_table('alert_rule')
@@ -0,0 +1,136 @@
+"""add composite and unique indexes for fact tables
+
+Revision ID: bcff1e0c54f2
+Revises: 260344a16f9b
+Create Date: 2026-10-17 09:12:41.508217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bcff1e0c54f2'
+down_revision: Union[str, Sequence[str], None] = '260344a16f9b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_attendance_class_date', 'attendance', ['class_id', 'attendance_date']),
+    ('ix_marks_student_subject', 'marks', ['student_id', 'subject_id']),
+    ('ix_class_school_id', 'class', ['school_id']),
+    ('ix_teacherassignment_teacher_id', 'teacherassignment', ['teacher_id']),
+]
+
+# uniqueness the routers already enforce in Python
+UNIQUE_CONSTRAINTS = [
+    ('uq_attendance_student_class_date', 'attendance', ['student_id', 'class_id', 'attendance_date']),
+    ('uq_exammarks_exam_student', 'exammarks', ['exam_id', 'student_id']),
+    ('uq_teacherassignment_class_subject', 'teacherassignment', ['class_id', 'subject_id']),
+    ('uq_student_class_roll', 'student', ['class_id', 'roll_no']),
+]
+
+# rows that would violate the new unique constraints -> keep the latest write
+DEDUPLICATE = [
+    ('attendance', ['student_id', 'class_id', 'attendance_date']),
+    ('exammarks', ['exam_id', 'student_id']),
+]
+
+# duplicates that can't be resolved automatically (students carry marks and
+# attendance, assignments name different teachers) -> refuse to migrate
+MUST_BE_UNIQUE = [
+    ('student', ['class_id', 'roll_no']),
+    ('teacherassignment', ['class_id', 'subject_id']),
+]
+
+
+def _constraint_exists(name: str) -> bool:
+    result = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_constraint "
+            "WHERE conname = :name AND connamespace = current_schema()::regnamespace"
+        ),
+        {"name": name},
+    )
+    return result.first() is not None
+
+
+def _drop_invalid_index(name: str) -> None:
+    """Drop what an interrupted CREATE INDEX CONCURRENTLY left behind, so it is rebuilt"""
+    result = op.get_bind().execute(
+        sa.text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND c.relnamespace = current_schema()::regnamespace "
+            "AND NOT i.indisvalid"
+        ),
+        {"name": name},
+    )
+    if result.first() is not None:
+        op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+def _check_unique(table: str, columns: list) -> None:
+    cols = ', '.join(columns)
+    duplicates = op.get_bind().execute(sa.text(
+        f'SELECT {cols}, count(*) FROM "{table}" GROUP BY {cols} HAVING count(*) > 1 ORDER BY {cols} LIMIT 20'
+    )).all()
+    if duplicates:
+        rows = '\n'.join(f'  {tuple(row[:-1])}: {row[-1]} rows' for row in duplicates)
+        raise RuntimeError(
+            f'"{table}" has duplicate ({cols}) values, resolve them before '
+            f'upgrading (first {len(duplicates)} shown):\n{rows}'
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    for table, columns in MUST_BE_UNIQUE:
+        _check_unique(table, columns)
+
+    for table, columns in DEDUPLICATE:
+        cols = ', '.join(columns)
+        op.execute(
+            f'DELETE FROM "{table}" WHERE id NOT IN '
+            f'(SELECT max(id) FROM "{table}" GROUP BY {cols})'
+        )
+
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block,
+    # it builds the index without blocking writes to the table
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            if is_postgres:
+                if _constraint_exists(name):
+                    continue
+                _drop_invalid_index(name)
+            op.create_index(name, table, columns, unique=True, postgresql_concurrently=True, if_not_exists=True)
+
+    if is_postgres:
+        # promote the prebuilt unique indexes to constraints (no table scan)
+        for name, table, columns in UNIQUE_CONSTRAINTS:
+            if not _constraint_exists(name):
+                op.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT {name} UNIQUE USING INDEX {name}')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    is_postgres = op.get_bind().dialect.name == 'postgresql'
+
+    for name, table, columns in UNIQUE_CONSTRAINTS:
+        if is_postgres:
+            op.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS {name}')
+        else:
+            op.drop_index(name, table_name=table, if_exists=True)
+
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,55 @@
+"""add class daily attendance rollup
+
+Revision ID: ecb52e46973c
+Revises: 0cbfc7ae64e9
+Create Date: 2026-10-17 11:26:05.113482
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ecb52e46973c'
+down_revision: Union[str, Sequence[str], None] = '0cbfc7ae64e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'class_daily_attendance',
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.Column('attendance_date', sa.Date(), nullable=False),
+        sa.Column('school_id', sa.Integer(), nullable=False),
+        sa.Column('present', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['class_id'], ['class.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['school_id'], ['school.id']),
+        sa.PrimaryKeyConstraint('class_id', 'attendance_date'),
+        if_not_exists=True,
+    )
+    op.create_index('ix_class_daily_attendance_attendance_date', 'class_daily_attendance', ['attendance_date'], if_not_exists=True)
+    op.create_index('ix_class_daily_attendance_school_date', 'class_daily_attendance', ['school_id', 'attendance_date'], if_not_exists=True)
+
+    # backfill from the existing attendance rows
+    op.execute("DELETE FROM class_daily_attendance")
+    op.execute("""
+        INSERT INTO class_daily_attendance (class_id, attendance_date, school_id, present, total)
+        SELECT a.class_id, a.attendance_date, c.school_id,
+               SUM(CASE WHEN a.is_present THEN 1 ELSE 0 END), COUNT(a.id)
+        FROM attendance a
+        JOIN class c ON c.id = a.class_id
+        GROUP BY a.class_id, a.attendance_date, c.school_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_class_daily_attendance_school_date', table_name='class_daily_attendance')
+    op.drop_index('ix_class_daily_attendance_attendance_date', table_name='class_daily_attendance')
+    op.drop_table('class_daily_attendance')
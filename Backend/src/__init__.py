@@ -1,15 +1,32 @@
+import asyncio
 from fastapi import FastAPI
-from src.db.main import init_db
+from src.db.main import init_db, close_db, async_engine, replica_engine, replica_guard, pool_status
 from contextlib import asynccontextmanager
 from src.auth.routes import auth_router 
+from src.db.partitions import maintain_attendance_partitions
+from src.auth.token_store import purge_refresh_tokens_periodically
+from src.services.student_counts import reconcile_student_counts_periodically
+from src.services.alerts import evaluate_alerts_periodically
+from src.services.response_cache import dashboard_cache, school_detail_cache
+from src.services.activity import activity_buffer
+from src.auth.user_cache import user_cache
 from .middleware import register_middleware
-from src.routers import dashboard, analytics, subjects, schools, classes, teachers, attendance, students, exams, teacher_assignments
+from src.routers import dashboard, analytics, subjects, schools, classes, teachers, attendance, students, exams, teacher_assignments, exports
 
 @asynccontextmanager
 async def life_span(app: FastAPI):
     print(f"server is starting up")
     await init_db()
+    background_tasks = [
+        asyncio.create_task(maintain_attendance_partitions()),
+        asyncio.create_task(purge_refresh_tokens_periodically()),
+        asyncio.create_task(reconcile_student_counts_periodically()),
+        asyncio.create_task(evaluate_alerts_periodically()),
+    ]
     yield
+    for task in background_tasks:
+        task.cancel()
+    await close_db()
     print(f"server is shutting down")
 
 version = "v1"
@@ -31,6 +48,35 @@ async def root():
 async def health_check():
     return {"status": "Healthy", "message": "Backend is running 🚀"}
 
+@app.get("/api/v1/health/db-pool")
+async def db_pool_health():
+    """Live connection pool counters (checkouts, waits, overflow)"""
+    status = {"primary": pool_status(async_engine)}
+    if replica_engine is not None:
+        status["replica"] = pool_status(replica_engine)
+        status["replica"]["lag"] = replica_guard.status()
+    return status
+
+@app.get("/api/v1/health/dashboard-cache")
+async def dashboard_cache_health():
+    """Dashboard response cache size and hit / miss counters"""
+    return dashboard_cache.stats()
+
+@app.get("/api/v1/health/school-detail-cache")
+async def school_detail_cache_health():
+    """School detail response cache size and hit / miss counters"""
+    return school_detail_cache.stats()
+
+@app.get("/api/v1/health/activity-buffer")
+async def activity_buffer_health():
+    """Activity feed ring buffer size and hit / miss counters"""
+    return activity_buffer.stats()
+
+@app.get("/api/v1/health/user-cache")
+async def user_cache_health():
+    """Authenticated user snapshot cache size and hit / miss counters"""
+    return user_cache.stats()
+
 app.include_router(auth_router, prefix=f"/api/{version}/auth", tags=["auth"])
 app.include_router(dashboard.router, prefix=f"/api/{version}/routers/dashboard", tags=["dashboard"])
 app.include_router(analytics.router, prefix=f"/api/{version}/routers/analytics", tags=["analytics"])
@@ -41,4 +87,5 @@ app.include_router(teachers.router, prefix=f"/api/{version}/routers/teachers", t
 app.include_router(attendance.router, prefix=f"/api/{version}/routers/attendance", tags=["attendance"])
 app.include_router(students.router, prefix=f"/api/{version}/routers/students", tags=["students"])
 app.include_router(exams.router, prefix=f"/api/{version}/routers/exams", tags=["exams"])
-app.include_router(teacher_assignments.router, prefix=f"/api/{version}/routers/teacher_assignments", tags=["teacher_assignments"])
\ No newline at end of file
+app.include_router(teacher_assignments.router, prefix=f"/api/{version}/routers/teacher_assignments", tags=["teacher_assignments"])
+app.include_router(exports.router, prefix=f"/api/{version}/routers/exports", tags=["exports"])
\ No newline at end of file
@@ -14,6 +14,8 @@ import uuid
 from .models import User, UserRole, RefreshToken
 from src.db.main import get_session
 from .security import security
+from .user_cache import UserSnapshot, user_cache
+from .token_store import is_revoked
 
 
 #security scheme for JWT tokens
@@ -22,7 +24,7 @@ security_scheme = HTTPBearer()
 async def get_current_user(
         credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
         session: AsyncSession = Depends(get_session)
-    ) -> User:
+    ) -> UserSnapshot:
     """Dependency to get the current authenticated user from JWT token"""
 
     credentials_exception = HTTPException(
@@ -46,17 +48,28 @@ async def get_current_user(
     except(HTTPException, ValueError):
         raise credentials_exception
     
-    # Fetch the user with eager loading of school relationship
-    result = await session.exec(
-        select(User)
-        .where(User.id == user_id)
-        .options(selectinload(User.school))
-    )
-    user = result.first()
-    
+    user = user_cache.get(user_id)
     if user is None:
-        raise credentials_exception
-    
+        version = user_cache.version(user_id)
+
+        # Fetch the user with eager loading of school relationship
+        result = await session.exec(
+            select(User)
+            .where(User.id == user_id)
+            .options(selectinload(User.school))
+        )
+        db_user = result.first()
+
+        # end the lookup transaction so its pooled connection is not held for the
+        # whole request while the endpoint opens its own (e.g. read) session
+        await session.commit()
+
+        if db_user is None:
+            raise credentials_exception
+
+        user = UserSnapshot.from_user(db_user)
+        user_cache.put(user, version)
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -66,8 +79,8 @@ async def get_current_user(
     return user
 
 async def get_current_active_user(
-        current_user: User = Depends(get_current_user)
-    ) -> User:
+        current_user: UserSnapshot = Depends(get_current_user)
+    ) -> UserSnapshot:
 
     """Dependency to get current active user"""
 
@@ -84,7 +97,7 @@ def require_roles(*allowed_roles: UserRole):
     Dependency to enforce role-based access control
     Usage: @app.get("/admin", dependencies=[Depends(require_roles(Role.DISTRICT_ADMIN))])
     """
-    async def role_checker(current_user: User = Depends(get_current_active_user)) -> User:
+    async def role_checker(current_user: UserSnapshot = Depends(get_current_active_user)) -> UserSnapshot:
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -120,10 +133,15 @@ async def verify_refresh_token(
         
         user_id = int(user_id_str)
 
+        if is_revoked(jti):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid refresh token",    
+            )
+
         #check if refresh token exists in DB and is not revoked
         result = await session.exec(
             select(RefreshToken)
-            .where(RefreshToken.token == refresh_token)
             .where(RefreshToken.jti == jti)
             .where(RefreshToken.is_revoked == False)
         )
@@ -46,7 +46,7 @@ class User(SQLModel, table=True):
 
 class RefreshToken(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    token: str = Field(unique=True, index=True)
+    # the token itself is not stored, it is looked up by its (signed) jti
     jti: str = Field(unique=True, index=True)
     user_id: int = Field(foreign_key="user.id")
     expires_at: datetime
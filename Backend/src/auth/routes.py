@@ -4,7 +4,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from src.db.main import get_session
 from .dependencies import get_current_active_user, security_scheme
-from .models import User
+from .user_cache import UserSnapshot
 from .services import AuthService, get_auth_service
 
 from .models import(
@@ -71,15 +71,11 @@ async def logout(
 
 @auth_router.get("/me", response_model=UserResponse)
 async def get_current_user_info(
-    current_user: User = Depends(get_current_active_user) 
+    current_user: UserSnapshot = Depends(get_current_active_user) 
 ):
     """
     Get current user information
     """
-    school_name = None
-    if current_user.school and hasattr(current_user.school, 'name'):
-        school_name = current_user.school.name
-
     # Convert User model to UserResponse
     return UserResponse(
         id=current_user.id,
@@ -90,7 +86,7 @@ async def get_current_user_info(
         role=current_user.role,
         status=current_user.status,
         school_id=current_user.school_id,
-        school_name=school_name,
+        school_name=current_user.school_name,
         created_at=current_user.created_at,
         last_login=current_user.last_login,
         is_verified=current_user.is_verified
@@ -99,14 +95,14 @@ async def get_current_user_info(
 @auth_router.post("/change-password")
 async def change_password(
     password_data: ChangePasswordRequest,
-    current_user: User = Depends(get_current_active_user),  
+    current_user: UserSnapshot = Depends(get_current_active_user),  
     auth_service: AuthService = Depends(get_auth_service)
 ):
     """
     Change user password
     """
     success = await auth_service.change_password(
-        current_user, 
+        current_user.id, 
         password_data.current_password, 
         password_data.new_password
     )
@@ -122,7 +118,7 @@ async def change_password(
 @auth_router.get("/verify-token")
 async def verify_token(
     credentials: HTTPAuthorizationCredentials = Depends(security_scheme),
-    current_user: User = Depends(get_current_active_user)  
+    current_user: UserSnapshot = Depends(get_current_active_user)  
 ):
     """
     Verify if the current token is valid
@@ -138,7 +134,7 @@ async def verify_token(
         role=current_user.role,
         status=current_user.status,
         school_id=current_user.school_id,
-        school_name=current_user.school,
+        school_name=current_user.school_name,
         created_at=current_user.created_at,
         last_login=current_user.last_login,
         is_verified=current_user.is_verified
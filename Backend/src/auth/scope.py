@@ -0,0 +1,143 @@
+"""
+Request scope
+Resolves once per request what the current user can reach: their teacher
+record, school and the classes / subjects they teach. Resolved scopes are
+kept in an LRU cache keyed by the user and their school's scope generation,
+which is bumped whenever assignments, classes or teachers of that school
+change (see services.data_versions).
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import Depends
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.main import get_session
+from src.models import Class, Teacher, TeacherAssignment
+from .dependencies import get_current_active_user
+from .models import UserRole
+from .user_cache import UserSnapshot
+
+
+@dataclass(frozen=True)
+class ScopeContext:
+    user_id: int
+    role: UserRole
+    school_id: Optional[int]
+    teacher_id: Optional[int] = None
+    # classes the teacher is class teacher of
+    class_ids: FrozenSet[int] = frozenset()
+    # (class_id, subject_id) pairs the teacher is assigned to teach
+    assignments: FrozenSet[Tuple[int, int]] = frozenset()
+
+    @property
+    def is_admin(self) -> bool:
+        return self.role == UserRole.ADMIN
+
+    @property
+    def is_principal(self) -> bool:
+        return self.role == UserRole.PRINCIPAL
+
+    @property
+    def is_teacher(self) -> bool:
+        return self.role == UserRole.TEACHER
+
+    @property
+    def assigned_class_ids(self) -> FrozenSet[int]:
+        return frozenset(class_id for class_id, _ in self.assignments)
+
+    @property
+    def subject_ids(self) -> FrozenSet[int]:
+        return frozenset(subject_id for _, subject_id in self.assignments)
+
+
+async def _find_teacher(session: AsyncSession, user: UserSnapshot) -> Optional[Teacher]:
+    teacher = (await session.exec(select(Teacher).where(Teacher.user_id == user.id))).first()
+    if teacher:
+        return teacher
+
+    # teacher records created before the user link existed, link them on first use
+    teacher = (await session.exec(
+        select(Teacher).where(Teacher.email == user.email, Teacher.user_id.is_(None))
+    )).first()
+    if teacher:
+        teacher.user_id = user.id
+        session.add(teacher)
+        await session.commit()
+    return teacher
+
+
+async def resolve_scope(session: AsyncSession, user: UserSnapshot) -> ScopeContext:
+    """Build the scope of `user` from the database"""
+    if user.role != UserRole.TEACHER:
+        return ScopeContext(user_id=user.id, role=user.role, school_id=user.school_id)
+
+    teacher = await _find_teacher(session, user)
+    if not teacher:
+        return ScopeContext(user_id=user.id, role=user.role, school_id=user.school_id)
+
+    class_ids = (await session.exec(select(Class.id).where(Class.teacher_id == teacher.id))).all()
+    assignments = (await session.exec(
+        select(TeacherAssignment.class_id, TeacherAssignment.subject_id)
+        .where(TeacherAssignment.teacher_id == teacher.id)
+    )).all()
+
+    return ScopeContext(
+        user_id=user.id,
+        role=user.role,
+        school_id=teacher.school_id,
+        teacher_id=teacher.id,
+        class_ids=frozenset(class_ids),
+        assignments=frozenset((class_id, subject_id) for class_id, subject_id in assignments),
+    )
+
+
+class ScopeCache:
+    def __init__(self, maxsize: int, ttl: float):
+        # the TTL bounds staleness when another process changed the assignments
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # school_id -> generation, None covers users without a school
+        self._generations: Dict[Optional[int], int] = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, user: UserSnapshot) -> tuple:
+        return (user.id, user.role, user.school_id, self._generations[user.school_id])
+
+    async def get(self, session: AsyncSession, user: UserSnapshot) -> ScopeContext:
+        key = self._key(user)
+        scope = self._entries.get(key)
+        if scope is not None:
+            self.hits += 1
+            return scope
+
+        self.misses += 1
+        scope = await resolve_scope(session, user)
+        # release the connection like get_current_user does
+        await session.commit()
+        self._entries[key] = scope
+        return scope
+
+    def invalidate_school(self, *school_ids: int):
+        for school_id in set(school_ids):
+            self._generations[school_id] += 1
+        self._generations[None] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+scope_cache = ScopeCache(Config.SCOPE_CACHE_MAX_ENTRIES, Config.SCOPE_CACHE_TTL_SECONDS)
+
+
+async def get_scope(
+        current_user: UserSnapshot = Depends(get_current_active_user),
+        session: AsyncSession = Depends(get_session)
+    ) -> ScopeContext:
+    """Dependency to get the access scope of the current user"""
+    return await scope_cache.get(session, current_user)
@@ -2,8 +2,10 @@
 Security utilities for authentication
 Handles password hashing, JWT tokens, and security validations
 """
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, TypeVar
+import asyncio
 import uuid
 import jwt
 from passlib.context import CryptContext
@@ -19,7 +21,16 @@ ALGORITHM = Config.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = Config.ACCESS_TOKEN_EXPIRE_MINUTES
 REFRESH_TOKEN_EXPIRE_DAYS = Config.REFRESH_TOKEN_EXPIRE_DAYS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=Config.BCRYPT_ROUNDS)
+
+# bcrypt keeps a CPU busy for hundreds of ms per call (and releases the GIL),
+# so it runs on a small dedicated pool instead of blocking the event loop
+_hashing_pool = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+T = TypeVar("T")
+
+async def _run_hashing(fn: Callable[..., T], *args) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_hashing_pool, fn, *args)
 
 class SecurityManager:
     @staticmethod
@@ -36,6 +47,16 @@ class SecurityManager:
         """Verify a plaintext password against the hashed version"""
         return pwd_context.verify(plain_password, hashed_password)
 
+    @staticmethod
+    async def hash_password_async(password: str) -> str:
+        """Hash a plaintext password on the hashing pool"""
+        return await _run_hashing(pwd_context.hash, password)
+
+    @staticmethod
+    async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+        """Verify a plaintext password on the hashing pool"""
+        return await _run_hashing(pwd_context.verify, plain_password, hashed_password)
+
     @staticmethod
     def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """Create a JWT access token"""
@@ -56,8 +77,8 @@ class SecurityManager:
         return encoded_jwt
 
     @staticmethod
-    def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
-        """Create a JWT refresh token"""
+    def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None, jti: Optional[str] = None) -> str:
+        """Create a JWT refresh token, `jti` lets the caller store the token without decoding it"""
         to_encode = data.copy()
 
         if expires_delta:
@@ -68,7 +89,7 @@ class SecurityManager:
         to_encode.update({
             "exp": expire,
             "type": "refresh",
-            "jti": str(uuid.uuid4())
+            "jti": jti or str(uuid.uuid4())
         })
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
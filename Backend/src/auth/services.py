@@ -5,17 +5,19 @@ Contain logic for user authentication and token management
 
 from fastapi import Depends, HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlmodel import select
+from sqlmodel import select, update
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 import traceback
+import uuid
 
 from .models import (
     User, UserRole, RefreshToken, UserLogin, UserCreate, UserResponse,
     TokenResponse, LoginResponse
 )
 from .security import security
+from .token_store import is_revoked, mark_revoked
 from src.db.main import get_session
 from src.config import Config
 
@@ -32,7 +34,7 @@ class AuthService:
         )
         user = result.first()
 
-        if not user or not security.verify_password(password, user.hashed_password):
+        if not user or not await security.verify_password_async(password, user.hashed_password):
             return None
         
         if not user.is_active:
@@ -55,23 +57,15 @@ class AuthService:
 
             access_token = security.create_access_token(access_token_data)
 
-            # Create refresh token
+            # Create refresh token, stored by its jti only
+            jti = str(uuid.uuid4())
             refresh_token_data = {
                 "sub": str(user.id)
             }
-            refresh_token = security.create_refresh_token(refresh_token_data)
-
-        # Extract jti from refresh token to store in db
-            refresh_payload = security.verify_token(refresh_token, "refresh")
-            jti = refresh_payload.get("jti")
-
-        # Validate jti exists
-            if not jti:
-                raise ValueError("Failed to extract JTI from refresh token")
+            refresh_token = security.create_refresh_token(refresh_token_data, jti=jti)
 
         # Store refresh token in db
             db_refresh_token = RefreshToken(
-                token=refresh_token,
                 jti=jti,
                 user_id=user.id,
                 expires_at=datetime.utcnow() + timedelta(days=Config.REFRESH_TOKEN_EXPIRE_DAYS),
@@ -164,16 +158,25 @@ class AuthService:
                 detail="Invalid refresh token"
             )
 
-        #check if refresh token exists and is not revoked
+        if is_revoked(jti):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token not found or revoked"
+            )
+
+        #revoke the presented token, only one of two concurrent refreshes with
+        #the same token can flip it, the other finds no row
         result = await self.session.exec(
-            select(RefreshToken)
-            .where(RefreshToken.token == refresh_token)
+            update(RefreshToken)
             .where(RefreshToken.jti == jti)
             .where(RefreshToken.is_revoked == False)
+            .values(is_revoked=True)
+            .returning(RefreshToken.user_id, RefreshToken.device_info, RefreshToken.ip_address)
         )
         db_token = result.first()
 
-        if not db_token:
+        if not db_token or db_token.user_id != user_id:
+            await self.session.rollback()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Refresh token not found or revoked"
@@ -182,18 +185,15 @@ class AuthService:
         #get user 
         user = await self.session.get(User, user_id)
         if not user or not user.is_active:
+            await self.session.rollback()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found or inactive"
             )
         
-        #create new tokens
+        #create new tokens, committed together with the revocation
         new_tokens = await self.create_user_tokens(user, db_token.device_info, db_token.ip_address)
-
-        #revoke old refresh token
-        db_token.is_revoked = True
-        self.session.add(db_token)
-        await self.session.commit()
+        mark_revoked(jti)
 
         return new_tokens
     
@@ -211,21 +211,19 @@ class AuthService:
         except HTTPException:
             return False
 
+        if is_revoked(jti):
+            return False
+
         result = await self.session.exec(
-            select(RefreshToken)
-            .where(RefreshToken.token == refresh_token)
+            update(RefreshToken)
             .where(RefreshToken.jti == jti)
             .where(RefreshToken.is_revoked == False)
+            .values(is_revoked=True)
         )
-        db_token = result.first()
-
-        if db_token:
-            db_token.is_revoked = True
-            self.session.add(db_token)
-            await self.session.commit()
-            return True
+        await self.session.commit()
+        mark_revoked(jti)
 
-        return False
+        return result.rowcount > 0
     
     async def create_user(self, user_data: UserCreate) -> UserResponse:
         """Create a new user"""
@@ -253,7 +251,7 @@ class AuthService:
             )
     
         # create user object
-        hashed_password = security.get_password_hash(user_data.password)
+        hashed_password = await security.hash_password_async(user_data.password)
         user = User(
             email=user_data.email.lower(),
             first_name=user_data.first_name,
@@ -324,11 +322,18 @@ class AuthService:
             is_verified=user.is_verified
         )
 
-    async def change_password(self, user: User, current_password: str, new_password: str) -> bool:
+    async def change_password(self, user_id: int, current_password: str, new_password: str) -> bool:
         """Change user's password"""
+
+        user = await self.session.get(User, user_id)
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
         
         #verify current password
-        if not security.verify_password(current_password, user.hashed_password):
+        if not await security.verify_password_async(current_password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
@@ -342,7 +347,7 @@ class AuthService:
             )
         
         #update password
-        user.hashed_password = security.get_password_hash(new_password)
+        user.hashed_password = await security.hash_password_async(new_password)
         user.updated_at = datetime.utcnow()
         self.session.add(user)
         await self.session.commit()
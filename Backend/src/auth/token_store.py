@@ -0,0 +1,57 @@
+"""
+Refresh token store maintenance
+Refresh tokens are stored and looked up by jti only. Revoked jtis are also
+kept in process so that replayed / logged out tokens are rejected without a
+query, and a background loop deletes revoked and expired rows so the table
+and its index stay small.
+"""
+
+import asyncio
+from datetime import datetime
+
+from cachetools import TTLCache
+from sqlmodel import delete, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.main import async_session_maker
+from .models import RefreshToken
+
+# a jti stops mattering once its token has expired
+revoked_jtis = TTLCache(
+    maxsize=Config.REVOKED_JTI_CACHE_MAX_ENTRIES,
+    ttl=Config.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60,
+)
+
+
+def mark_revoked(jti: str):
+    revoked_jtis[jti] = True
+
+
+def is_revoked(jti: str) -> bool:
+    return jti in revoked_jtis
+
+
+async def purge_refresh_tokens(session: AsyncSession) -> int:
+    """Delete revoked and expired refresh tokens, returns the number of rows removed"""
+    result = await session.exec(
+        delete(RefreshToken).where(or_(
+            RefreshToken.is_revoked == True,
+            RefreshToken.expires_at < datetime.utcnow(),
+        ))
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def purge_refresh_tokens_periodically():
+    """Background loop: keep the refresh token table down to live tokens"""
+    while True:
+        try:
+            async with async_session_maker() as session:
+                purged = await purge_refresh_tokens(session)
+            if purged:
+                print(f"Purged {purged} revoked / expired refresh tokens")
+        except Exception as e:
+            print(f"Refresh token purge failed: {str(e)}")
+        await asyncio.sleep(Config.REFRESH_TOKEN_PURGE_INTERVAL_SECONDS)
@@ -0,0 +1,134 @@
+"""
+Authenticated user cache
+Immutable snapshots of authenticated users kept in process so that
+get_current_user does not read the user table on every request. Entries are
+keyed by user id and a per-user version; a committed update of the user row
+(password, status, role, school, ...) bumps the version, and the TTL bounds
+how stale a snapshot changed by another process can get.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.config import Config
+from .models import User, UserRole, UserStatus
+
+_PENDING_KEY = "changed_user_ids"
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    contact_number: Optional[str]
+    role: UserRole
+    status: UserStatus
+    is_deleted: bool
+    school_id: Optional[int]
+    school_name: Optional[str]
+    created_at: datetime
+    last_login: Optional[datetime]
+    is_verified: bool
+
+    @property
+    def is_active(self) -> bool:
+        return self.status == UserStatus.ACTIVE and not self.is_deleted
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        """Snapshot of a user loaded with its school"""
+        return cls(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            contact_number=user.contact_number,
+            role=user.role,
+            status=user.status,
+            is_deleted=user.is_deleted,
+            school_id=user.school_id,
+            school_name=user.school.name if user.school else None,
+            created_at=user.created_at,
+            last_login=user.last_login,
+            is_verified=user.is_verified,
+        )
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._versions: Dict[int, int] = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, user_id: int) -> int:
+        return self._versions[user_id]
+
+    def get(self, user_id: int) -> Optional[UserSnapshot]:
+        snapshot = self._entries.get((user_id, self._versions[user_id]))
+        if snapshot is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return snapshot
+
+    def put(self, snapshot: UserSnapshot, version: int):
+        """
+        Store a snapshot read while the user was at `version`; a snapshot read
+        before a concurrent update lands under the old version and is never served
+        """
+        self._entries[(snapshot.id, version)] = snapshot
+
+    def invalidate_user(self, *user_ids: int):
+        for user_id in set(user_ids):
+            self._versions[user_id] += 1
+        self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache(Config.AUTH_USER_CACHE_MAX_ENTRIES, Config.AUTH_USER_CACHE_TTL_SECONDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context):
+    user_ids = {
+        obj.id for obj in list(session.dirty) + list(session.deleted)
+        if isinstance(obj, User) and obj.id is not None
+    }
+    if user_ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session):
+    user_ids = session.info.pop(_PENDING_KEY, None)
+    if user_ids:
+        user_cache.invalidate_user(*user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
@@ -1,17 +1,118 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
-    DATABASE_URL: str 
+    DATABASE_URL: str
     SECRET_KEY: str
 
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    REFRESH_TOKEN_PURGE_INTERVAL_SECONDS: int = 60 * 60
+    REVOKED_JTI_CACHE_MAX_ENTRIES: int = 100000
     ALGORITHM: str = "HS256"
     PASSWORD_MIN_LENGTH: int = 8
+    # bcrypt cost factor for new hashes (each +1 doubles the time), existing
+    # hashes keep the cost they were created with
+    BCRYPT_ROUNDS: int = 12
+    # threads hashing / verifying passwords off the event loop
+    PASSWORD_HASH_WORKERS: int = 2
+
+    # "development" or "production" -> production disables SQL echo
+    ENVIRONMENT: str = "development"
+
+    # Database engine / connection pool
+    DB_ECHO: bool = True
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # set when connecting through PgBouncer in transaction pooling mode
+    DB_PGBOUNCER_MODE: bool = False
+
+    # Optional read replica for side-effect free analytics / dashboard reads
+    DATABASE_REPLICA_URL: Optional[str] = None
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL: float = 2.0
+
+    # Max concurrent queries (pooled connections) one request may fan out to
+    DB_FANOUT_CONCURRENCY: int = 4
+
+    # In-process dashboard response cache
+    DASHBOARD_CACHE_TTL_SECONDS: float = 60.0
+    DASHBOARD_CACHE_MAX_ENTRIES: int = 4096
+
+    # In-process cache of assembled school detail responses
+    SCHOOL_DETAIL_CACHE_TTL_SECONDS: float = 300.0
+    SCHOOL_DETAIL_CACHE_MAX_ENTRIES: int = 1024
+
+    # In-process cache of authenticated user snapshots, the TTL is the max
+    # staleness of a user changed by another process
+    AUTH_USER_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_USER_CACHE_MAX_ENTRIES: int = 10000
+
+    # In-process cache of resolved user scopes (teacher, classes, subjects)
+    SCOPE_CACHE_TTL_SECONDS: float = 300.0
+    SCOPE_CACHE_MAX_ENTRIES: int = 10000
+
+    # Roster (students / teachers / classes) file imports
+    ROSTER_IMPORT_CHUNK_ROWS: int = 500
+    ROSTER_IMPORT_MAX_ROWS: int = 50000
+
+    # Rows fetched per round trip by streaming exports
+    EXPORT_FETCH_ROWS: int = 2000
+
+    # List endpoint pages: default / max page size, and how many rows are
+    # counted exactly before the total falls back to the planner's estimate
+    PAGE_SIZE_DEFAULT: int = 200
+    PAGE_SIZE_MAX: int = 1000
+    PAGE_EXACT_COUNT_LIMIT: int = 10000
+
+    # Attendance range summaries: default and longest date range in days
+    ATTENDANCE_SUMMARY_DEFAULT_DAYS: int = 30
+    ATTENDANCE_SUMMARY_MAX_DAYS: int = 366
+
+    # Score distributions: pass mark (percent), histogram bins over 0-100 and
+    # how many schools' results are kept in memory
+    PASS_PERCENTAGE: float = 33.0
+    SCORE_HISTOGRAM_BINS: int = 10
+    SCORE_DISTRIBUTION_CACHE_MAX_ENTRIES: int = 256
+
+    # Rankings: default / max top-K size and how many ranked lists are kept
+    # in memory
+    RANKING_TOP_DEFAULT: int = 10
+    RANKING_TOP_MAX: int = 500
+    RANKING_CACHE_MAX_ENTRIES: int = 2048
+
+    # Alerts: default thresholds (percent) and attendance window, overridden
+    # per school by alert_rule rows, how often every school is re-evaluated
+    # and how long writes are batched before their schools are re-evaluated
+    ALERT_ATTENDANCE_THRESHOLD: float = 75.0
+    ALERT_STUDENT_ATTENDANCE_THRESHOLD: float = 85.0
+    ALERT_PERFORMANCE_THRESHOLD: float = 50.0
+    ALERT_ATTENDANCE_WINDOW_DAYS: int = 7
+    ALERT_EVALUATE_INTERVAL_SECONDS: int = 15 * 60
+    ALERT_EVALUATE_DEBOUNCE_SECONDS: float = 5.0
+
+    # Activity feed: newest events kept in memory per school (and for the
+    # whole district), how long a school's buffer is trusted before it is
+    # reloaded (bounds staleness from other processes) and the page size
+    ACTIVITY_BUFFER_SIZE: int = 50
+    ACTIVITY_BUFFER_TTL_SECONDS: float = 60.0
+    ACTIVITY_BUFFER_MAX_SCHOOLS: int = 1024
+    ACTIVITY_FEED_PAGE_DEFAULT: int = 20
+
+    # How often class student counts are recounted to repair drift
+    STUDENT_COUNT_RECONCILE_INTERVAL_SECONDS: int = 6 * 60 * 60
 
     model_config = SettingsConfigDict(
         env_file=".env",
         extra="ignore",
     )
 
-Config = Settings()
\ No newline at end of file
+    @property
+    def is_production(self) -> bool:
+        return self.ENVIRONMENT.lower() == "production"
+
+Config = Settings()
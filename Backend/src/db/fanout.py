@@ -0,0 +1,63 @@
+"""
+Concurrent query fan-out
+Runs independent read queries of one request at the same time, each on its
+own pooled session, so an endpoint's latency is its slowest query instead of
+the sum of all of them. A per-request semaphore bounds how many connections
+one request can hold at once.
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, Awaitable, Callable, List, Union
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.sql import Executable
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.main import async_session_maker, read_session_maker
+
+# a statement, or a coroutine function for work that needs several dependent queries
+Query = Union[Executable, Callable[[AsyncSession], Awaitable[Any]]]
+
+
+class QueryFanOut:
+    def __init__(self, session_maker: async_sessionmaker, limit: int):
+        self._session_maker = session_maker
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def _run(self, query: Query) -> Any:
+        async with self._semaphore:
+            async with self._session_maker() as session:
+                if isinstance(query, Executable):
+                    # rows are fetched before the session (and its connection) is released
+                    return (await session.exec(query)).all()
+                return await query(session)
+
+    async def gather(self, *queries: Query) -> List[Any]:
+        """
+        Run the queries concurrently and return their results in order: the
+        list of rows for a statement, the return value for a coroutine function
+        """
+        return list(await asyncio.gather(*(self._run(query) for query in queries)))
+
+    async def run(self, query: Query) -> Any:
+        """Run a single query on its own session (for a step that depends on earlier results)"""
+        return await self._run(query)
+
+
+async def get_read_fanout() -> AsyncGenerator[QueryFanOut, None]:
+    """
+    Request-scoped fan-out over read sessions (replica when healthy). Do not
+    hold another session open across a gather, or concurrent requests can
+    exhaust the pool waiting on each other.
+    """
+    yield QueryFanOut(await read_session_maker(), Config.DB_FANOUT_CONCURRENCY)
+
+
+async def get_primary_fanout() -> AsyncGenerator[QueryFanOut, None]:
+    """
+    Request-scoped fan-out over primary sessions, for results cached until
+    the next write: the cache is invalidated when the primary commits, and a
+    refill from a lagging replica would store the pre-write data again.
+    """
+    yield QueryFanOut(async_session_maker, Config.DB_FANOUT_CONCURRENCY)
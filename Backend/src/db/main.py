@@ -1,33 +1,246 @@
-from sqlmodel import create_engine, SQLModel
-from sqlalchemy.ext.asyncio import AsyncEngine
-from sqlmodel.ext.asyncio.session import AsyncSession 
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncGenerator, Dict, Optional
+
+from sqlmodel import SQLModel
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.config import Config
 
-#Importing all models 
-from src.models import *  
-from src.auth.models import *  
+#Importing all models
+from src.models import *
+from src.auth.models import *
 
-async_engine = AsyncEngine(
-    create_engine(
-        url=Config.DATABASE_URL,
-        echo=True,
-    )
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool that keeps running checkout / wait / overflow counters
+    so pool saturation can be observed while the app is serving traffic.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.checkins = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def _do_get(self):
+        # QueuePool blocks only when it may not overflow and no idle connection is queued
+        must_wait = self._max_overflow > -1 and self._overflow >= self._max_overflow and self._pool.qsize() == 0
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            if must_wait:
+                waited = time.perf_counter() - start
+                self.waits += 1
+                self.wait_time_total += waited
+                self.wait_time_max = max(self.wait_time_max, waited)
+        self.checkouts += 1
+        return conn
+
+    def _do_return_conn(self, record):
+        self.checkins += 1
+        super()._do_return_conn(record)
+
+
+def _async_url(url: str):
+    """Map a plain database URL to its asyncio driver (asyncpg / aiosqlite)"""
+    db_url = make_url(url)
+    if db_url.drivername in ("postgresql", "postgresql+psycopg2", "postgres"):
+        db_url = db_url.set(drivername="postgresql+asyncpg")
+    elif db_url.drivername in ("sqlite", "sqlite+pysqlite"):
+        db_url = db_url.set(drivername="sqlite+aiosqlite")
+    return db_url
+
+
+def build_engine(url: str, read_only: bool = False) -> AsyncEngine:
+    """Create a native async engine configured from Settings"""
+    db_url = _async_url(url)
+
+    engine_kwargs: Dict[str, Any] = {
+        "echo": Config.DB_ECHO and not Config.is_production,
+        "pool_pre_ping": Config.DB_POOL_PRE_PING,
+    }
+    connect_args: Dict[str, Any] = {}
+
+    if db_url.get_backend_name() == "postgresql":
+        if Config.DB_PGBOUNCER_MODE:
+            # PgBouncer (transaction pooling) can hand us a different server
+            # connection per transaction, so prepared statements must not be cached
+            # and need unique names
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+        else:
+            connect_args["prepared_statement_cache_size"] = Config.DB_STATEMENT_CACHE_SIZE
+        if read_only:
+            connect_args["server_settings"] = {"default_transaction_read_only": "on"}
+
+    # in-memory sqlite needs a single shared connection (StaticPool), leave it to the dialect
+    if not (db_url.get_backend_name() == "sqlite" and db_url.database in (None, "", ":memory:")):
+        engine_kwargs.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+        )
+
+    engine = create_async_engine(db_url, connect_args=connect_args, **engine_kwargs)
+
+    if read_only and db_url.get_backend_name() == "sqlite":
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_query_only(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA query_only = ON")
+            cursor.close()
+
+    return engine
+
+
+def pool_status(engine: AsyncEngine) -> Dict[str, Any]:
+    """Live connection pool counters for an engine"""
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return {"pool": type(pool).__name__}
+
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "max_overflow": pool._max_overflow,
+        "checkouts": pool.checkouts,
+        "checkins": pool.checkins,
+        "waits": pool.waits,
+        "timeouts": pool.timeouts,
+        "wait_time_total": round(pool.wait_time_total, 4),
+        "wait_time_max": round(pool.wait_time_max, 4),
+    }
+
+
+async_engine = build_engine(Config.DATABASE_URL)
+
+async_session_maker = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
 )
 
+
+class ReplicaLagGuard:
+    """
+    Decides whether the read replica is fresh enough to serve reads.
+    The lag is measured at most once per check interval and shared by all requests.
+    """
+
+    def __init__(self, engine: AsyncEngine, max_lag: float, check_interval: float):
+        self.engine = engine
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.last_lag: Optional[float] = None
+        self.last_checked = 0.0
+        self.healthy = False
+        self.fallbacks = 0
+        self._lock = asyncio.Lock()
+
+    async def _measure_lag(self) -> float:
+        if self.engine.dialect.name != "postgresql":
+            return 0.0
+        async with self.engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT CASE "
+                "WHEN NOT pg_is_in_recovery() THEN 0 "
+                "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            ))
+            return float(result.scalar() or 0)
+
+    async def is_healthy(self) -> bool:
+        if time.monotonic() - self.last_checked < self.check_interval:
+            return self.healthy
+
+        async with self._lock:
+            # another request may have refreshed it while we waited
+            if time.monotonic() - self.last_checked >= self.check_interval:
+                try:
+                    self.last_lag = await self._measure_lag()
+                    self.healthy = self.last_lag <= self.max_lag
+                except Exception as e:
+                    print(f"Replica lag check failed: {str(e)}")
+                    self.last_lag = None
+                    self.healthy = False
+                self.last_checked = time.monotonic()
+
+        return self.healthy
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "healthy": self.healthy,
+            "lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag,
+            "fallbacks": self.fallbacks,
+        }
+
+
+replica_engine: Optional[AsyncEngine] = None
+replica_session_maker = None
+replica_guard: Optional[ReplicaLagGuard] = None
+
+if Config.DATABASE_REPLICA_URL:
+    replica_engine = build_engine(Config.DATABASE_REPLICA_URL, read_only=True)
+    replica_session_maker = async_sessionmaker(
+        bind=replica_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+    )
+    replica_guard = ReplicaLagGuard(
+        replica_engine,
+        max_lag=Config.REPLICA_MAX_LAG_SECONDS,
+        check_interval=Config.REPLICA_LAG_CHECK_INTERVAL,
+    )
+
 async def init_db():
     async with async_engine.begin() as conn:
         # Create all tables in the database
         await conn.run_sync(SQLModel.metadata.create_all)
     print("Database initialized successfully.")
 
-async def get_session() -> AsyncSession:
-    Session = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
+async def close_db():
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+async def get_session() -> AsyncGenerator[AsyncSession, None]:
+    async with async_session_maker() as session:
+        yield session
+
+async def read_session_maker() -> async_sessionmaker:
+    """
+    Session factory for side-effect free reads: the read replica when one is
+    configured and within the allowed lag, otherwise the primary.
+    """
+    if replica_session_maker is not None:
+        if await replica_guard.is_healthy():
+            return replica_session_maker
+        replica_guard.fallbacks += 1
+    return async_session_maker
 
-    async with Session() as session:
-        yield session
\ No newline at end of file
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    """Session for side-effect free endpoints (see read_session_maker)"""
+    session_maker = await read_session_maker()
+    async with session_maker() as session:
+        yield session
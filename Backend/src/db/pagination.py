@@ -0,0 +1,119 @@
+"""
+Keyset pagination
+List endpoints return one page of rows ordered by a unique sort key. The
+cursor is the sort key of the last row sent, so the next page is a range
+scan from there however deep it is (unlike OFFSET, which reads and throws
+away every earlier row). Pages keep the plain list body; the cursor of the
+next page and the total go in response headers:
+
+    X-Next-Cursor             pass as ?cursor= to get the next page, absent on the last one
+    X-Total-Count             rows in the whole (filtered) list, first page only
+    X-Total-Count-Estimated   "true" when the total is the planner's estimate
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import func, tuple_
+from sqlalchemy.sql import Select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+PAGE_HEADERS = [NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, TOTAL_ESTIMATED_HEADER]
+
+
+@dataclass(frozen=True)
+class PageParams:
+    limit: int
+    cursor: Optional[str] = None
+
+
+def page_params(
+        limit: int = Query(Config.PAGE_SIZE_DEFAULT, ge=1, le=Config.PAGE_SIZE_MAX),
+        cursor: Optional[str] = None
+    ) -> PageParams:
+    """Dependency for the page size and cursor query parameters"""
+    return PageParams(limit=limit, cursor=cursor)
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode()
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        values = None
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+async def _planner_rows(session: AsyncSession, statement: Select) -> int:
+    sql = statement.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    # sent as is: text() would read a ":word" in a rendered filter value as a bind parameter
+    connection = await session.connection()
+    plan = (await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def count_rows(session: AsyncSession, statement: Select) -> Tuple[int, bool]:
+    """
+    Number of rows `statement` returns and whether it is an estimate. Counts
+    exactly up to PAGE_EXACT_COUNT_LIMIT rows; past that Postgres answers with
+    the planner's estimate instead of counting the whole list.
+    """
+    statement = statement.order_by(None)
+    if session.bind.dialect.name != "postgresql":
+        return (await session.exec(select(func.count()).select_from(statement.subquery()))).one(), False
+
+    limit = Config.PAGE_EXACT_COUNT_LIMIT
+    counted = (await session.exec(
+        select(func.count()).select_from(statement.limit(limit + 1).subquery())
+    )).one()
+    if counted <= limit:
+        return counted, False
+    return max(await _planner_rows(session, statement), counted), True
+
+
+async def paginate(
+        session: AsyncSession,
+        statement: Select,
+        keys: Sequence[Any],
+        row_key: Callable[[Any], Sequence[Any]],
+        page: PageParams,
+        response: Response,
+        descending: bool = False
+    ) -> List[Any]:
+    """
+    One page of `statement` ordered by the `keys` columns, which together must
+    be unique; `row_key` returns their values for a result row. Sets the
+    pagination headers on `response`.
+    """
+    if page.cursor is None:
+        total, estimated = await count_rows(session, statement)
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
+        response.headers[TOTAL_ESTIMATED_HEADER] = "true" if estimated else "false"
+    else:
+        values = decode_cursor(page.cursor, len(keys))
+        key, after = (keys[0], values[0]) if len(keys) == 1 else (tuple_(*keys), tuple_(*values))
+        statement = statement.where(key < after if descending else key > after)
+
+    statement = statement.order_by(*(key.desc() if descending else key for key in keys))
+    rows = (await session.exec(statement.limit(page.limit + 1))).all()
+
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(row_key(rows[-1]))
+    return rows
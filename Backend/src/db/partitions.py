@@ -0,0 +1,120 @@
+"""
+Attendance partition maintenance
+On Postgres the attendance table is range partitioned by month on attendance_date
+(see the partition_attendance_by_month migration). This keeps future months created
+ahead of time and lets old months be detached without a long DELETE.
+"""
+
+import asyncio
+import sys
+from datetime import date
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from src.db.main import async_engine
+
+PARENT_TABLE = "attendance"
+MONTHS_AHEAD = 3
+MAINTENANCE_INTERVAL_SECONDS = 24 * 60 * 60
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + (month.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+async def is_partitioned(conn: AsyncConnection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace"
+    ), {"table": PARENT_TABLE})
+    return result.first() is not None
+
+
+async def create_month_partition(conn: AsyncConnection, month: date) -> str:
+    """Create the partition holding one calendar month (no-op if it exists)"""
+    month = month_start(month)
+    name = partition_name(month)
+    await conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{PARENT_TABLE}" '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+    return name
+
+
+async def ensure_attendance_partitions(conn: AsyncConnection, months_ahead: int = MONTHS_AHEAD) -> List[str]:
+    """Make sure the current month and the next `months_ahead` months have partitions"""
+    if not await is_partitioned(conn):
+        return []
+
+    current = month_start(date.today())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        try:
+            # a savepoint so one failing month (e.g. rows already sitting in the
+            # default partition) does not abort the rest
+            async with conn.begin_nested():
+                created.append(await create_month_partition(conn, month))
+        except Exception as e:
+            print(f"Could not create partition {partition_name(month)}: {str(e)}")
+    return created
+
+
+async def detach_attendance_partition(month: date) -> str:
+    """
+    Detach one month from the attendance table. The detached table keeps its
+    data (renamed to <partition>_archived) and can then be dumped, compressed
+    or dropped independently.
+    """
+    name = partition_name(month_start(month))
+    # plain DETACH only updates the catalog (CONCURRENTLY is not allowed
+    # while a default partition exists), so the lock is held very briefly
+    async with async_engine.begin() as conn:
+        if not await is_partitioned(conn):
+            raise RuntimeError("attendance table is not partitioned")
+        await conn.execute(text(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"'))
+        await conn.execute(text(f'ALTER TABLE "{name}" RENAME TO "{name}_archived"'))
+    return f"{name}_archived"
+
+
+async def maintain_attendance_partitions():
+    """Background loop: keep future attendance partitions created"""
+    while True:
+        try:
+            async with async_engine.begin() as conn:
+                created = await ensure_attendance_partitions(conn)
+            if created:
+                print(f"Attendance partitions ensured: {', '.join(created)}")
+        except Exception as e:
+            print(f"Attendance partition maintenance failed: {str(e)}")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+async def main(args: List[str]):
+    if args and args[0] == "detach" and len(args) == 2:
+        year, month = args[1].split("-")
+        print(f"Detached {await detach_attendance_partition(date(int(year), int(month), 1))}")
+    else:
+        async with async_engine.begin() as conn:
+            print(f"Partitions: {', '.join(await ensure_attendance_partitions(conn)) or 'none (table not partitioned)'}")
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    # python -m src.db.partitions            -> create upcoming partitions
+    # python -m src.db.partitions detach 2024-06
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,17 @@
+"""
+Dialect specific INSERT constructs
+Both Postgres and SQLite support INSERT ... ON CONFLICT ... DO UPDATE ... RETURNING,
+this picks the matching construct for the session's database.
+"""
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+def dialect_insert(session, model):
+    """Return an insert() for `model` that supports on_conflict_do_update / do_nothing"""
+    dialect = session.bind.dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"Upserts are not supported for {dialect}")
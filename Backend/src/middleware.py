@@ -4,6 +4,8 @@ from fastapi.middleware.cors import CORSMiddleware
 import logging
 import time
 
+from src.db.pagination import PAGE_HEADERS
+
 logger = logging.getLogger('uvicorn.access')
 logger.disabled = True
 
@@ -22,6 +24,7 @@ def register_middleware(app: FastAPI):
         allow_methods=["*"],
         allow_headers=["*"],
         allow_credentials=True,
+        expose_headers=PAGE_HEADERS,
     )
     
     @app.middleware("http")
@@ -8,9 +8,16 @@ from .models import (
     Student,
     StudentSubject,
     Marks,
+    MarksAggregate,
     Attendance,
+    ClassDailyAttendance,
+    StudentAttendancePrefix,
     Exam,
-    ExamMarks
+    ExamMarks,
+    DataVersion,
+    AlertRule,
+    Alert,
+    ActivityEvent
 )
 
 __all__ = [
@@ -23,7 +30,14 @@ __all__ = [
     "Student",
     "StudentSubject",
     "Marks",
+    "MarksAggregate",
     "Attendance",
+    "ClassDailyAttendance",
+    "StudentAttendancePrefix",
     "Exam",
     "ExamMarks",
+    "DataVersion",
+    "AlertRule",
+    "Alert",
+    "ActivityEvent",
 ]
@@ -1,6 +1,6 @@
 from email.policy import default
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, UniqueConstraint
 from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 from enum import Enum
@@ -19,6 +19,25 @@ class ExamType(str, Enum):
     MIDTERM = "midterm"
     CUSTOM = "custom"
 
+class AlertKind(str, Enum):
+    SCHOOL_ATTENDANCE = "school_attendance"
+    SCHOOL_PERFORMANCE = "school_performance"
+    CLASS_ATTENDANCE = "class_attendance"
+    CLASS_PERFORMANCE = "class_performance"
+    STUDENT_ATTENDANCE = "student_attendance"
+    STUDENT_PERFORMANCE = "student_performance"
+
+class ActivityKind(str, Enum):
+    ATTENDANCE_MARKED = "attendance_marked"
+    EXAM_CREATED = "exam_created"
+    MARKS_SUBMITTED = "marks_submitted"
+    STUDENT_ADDED = "student_added"
+    STUDENT_UPDATED = "student_updated"
+    STUDENT_REMOVED = "student_removed"
+    STUDENTS_IMPORTED = "students_imported"
+    TEACHERS_IMPORTED = "teachers_imported"
+    TEACHER_ASSIGNED = "teacher_assigned"
+
 
 # BASE MODELS
 
@@ -51,8 +70,10 @@ class Class(SQLModel, table=True):
     name: str
     grade: str
     section: str
-    school_id: int = Field(foreign_key="school.id")
+    school_id: int = Field(foreign_key="school.id", index=True)
     teacher_id: Optional[int] = Field(default=None, foreign_key="teacher.id")
+    # maintained by src.services.student_counts
+    student_count: int = Field(default=0)
 
     # Relationships
     school: School = Relationship(back_populates="classes")
@@ -68,6 +89,8 @@ class Teacher(SQLModel, table=True):
     email: str = Field(unique=True)
     phone: Optional[str] = None
     school_id: int = Field(foreign_key="school.id")
+    # login account of the teacher
+    user_id: Optional[int] = Field(default=None, foreign_key="user.id", unique=True, index=True)
 
     # Relationships
     school: School = Relationship(back_populates="teachers")
@@ -91,8 +114,12 @@ class Subject(SQLModel, table=True):
     exams: List["Exam"] = Relationship(back_populates="subject")
 
 class TeacherAssignment(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("class_id", "subject_id", name="uq_teacherassignment_class_subject"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    teacher_id: int = Field(foreign_key="teacher.id")
+    teacher_id: int = Field(foreign_key="teacher.id", index=True)
     class_id: int = Field(foreign_key="class.id")
     subject_id: int = Field(foreign_key="subject.id")
 
@@ -114,6 +141,10 @@ class StudentSubject(SQLModel, table=True):
     subject: Subject = Relationship(back_populates="student_subjects")
 
 class Student(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("class_id", "roll_no", name="uq_student_class_roll"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
     roll_no: str
@@ -131,6 +162,10 @@ class Student(SQLModel, table=True):
 # MARKS & ATTENDANCE
 
 class Marks(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_marks_student_subject", "student_id", "subject_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     student_id: int = Field(foreign_key="student.id")
     subject_id: int = Field(foreign_key="subject.id")
@@ -146,7 +181,29 @@ class Marks(SQLModel, table=True):
     teacher: Teacher = Relationship(back_populates="marks")
     class_: Class = Relationship()
 
+class MarksAggregate(SQLModel, table=True):
+    """
+    Running sum / count of scores per school, class, subject and exam type,
+    kept in step with Marks and ExamMarks writes. Exam marks are added as a
+    percentage of the exam's max_marks so both sources share a scale.
+    """
+    __tablename__ = "marks_aggregate"
+
+    school_id: int = Field(foreign_key="school.id", primary_key=True)
+    class_id: int = Field(foreign_key="class.id", primary_key=True, ondelete="CASCADE")
+    subject_id: int = Field(foreign_key="subject.id", primary_key=True)
+    exam_type: ExamType = Field(primary_key=True)
+    marks_sum: float = Field(default=0)
+    marks_count: int = Field(default=0)
+
+# On Postgres this table is range partitioned by month on attendance_date
+# (migration 0cbfc7ae64e9, maintained by src.db.partitions)
 class Attendance(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("student_id", "class_id", "attendance_date", name="uq_attendance_student_class_date"),
+        Index("ix_attendance_class_date", "class_id", "attendance_date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     student_id: int = Field(foreign_key="student.id")
     teacher_id: int = Field(foreign_key="teacher.id")
@@ -161,6 +218,38 @@ class Attendance(SQLModel, table=True):
     class_: Class = Relationship(back_populates="attendance_records")
 
 
+class ClassDailyAttendance(SQLModel, table=True):
+    """Per class, per day attendance counts kept in step with Attendance writes"""
+    __tablename__ = "class_daily_attendance"
+    __table_args__ = (
+        Index("ix_class_daily_attendance_school_date", "school_id", "attendance_date"),
+    )
+
+    class_id: int = Field(foreign_key="class.id", primary_key=True, ondelete="CASCADE")
+    attendance_date: date = Field(primary_key=True, index=True)
+    school_id: int = Field(foreign_key="school.id")
+    present: int = Field(default=0)
+    total: int = Field(default=0)
+
+
+class StudentAttendancePrefix(SQLModel, table=True):
+    """
+    Per student, per marked day attendance counts with running totals, kept
+    in step with Attendance writes. The counts over any date range are the
+    difference of two rows' running totals.
+    """
+    __tablename__ = "student_attendance_prefix"
+
+    student_id: int = Field(foreign_key="student.id", primary_key=True, ondelete="CASCADE")
+    attendance_date: date = Field(primary_key=True)
+    present: int = Field(default=0)
+    total: int = Field(default=0)
+    cum_present: int = Field(default=0)
+    cum_total: int = Field(default=0)
+    # marked days in a row without a present mark, ending on this day
+    absence_streak: int = Field(default=0)
+
+
 # EXAMS
 
 class Exam(SQLModel, table=True):
@@ -181,6 +270,10 @@ class Exam(SQLModel, table=True):
     exam_marks: List["ExamMarks"] = Relationship(back_populates="exam", sa_relationship_kwargs={"cascade": "all, delete-orphan"})
 
 class ExamMarks(SQLModel, table=True):
+    __table_args__ = (
+        UniqueConstraint("exam_id", "student_id", name="uq_exammarks_exam_student"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     exam_id: int = Field(foreign_key="exam.id")
     student_id: int = Field(foreign_key="student.id")
@@ -190,7 +283,89 @@ class ExamMarks(SQLModel, table=True):
     # Relationships
     exam: Exam = Relationship(back_populates="exam_marks")
     student: Student = Relationship(back_populates="exam_marks")
-    
+
+
+# DATA VERSIONS
+
+class DataVersion(SQLModel, table=True):
+    """
+    Monotonic version per school and entity type ("students", "marks", ...),
+    bumped inside every write transaction. school_id 0 holds district-wide
+    entities such as subjects and schools.
+    """
+    __tablename__ = "data_version"
+
+    school_id: int = Field(primary_key=True)
+    entity: str = Field(primary_key=True)
+    version: int = Field(default=0)
+
+
+# ALERTS
+
+class AlertRule(SQLModel, table=True):
+    """
+    Alert threshold per school and alert kind. school_id 0 holds district
+    wide defaults, kinds without any row use the Config defaults.
+    """
+    __tablename__ = "alert_rule"
+
+    school_id: int = Field(primary_key=True)
+    kind: str = Field(primary_key=True)
+    # percent, attendance / average score below it raises the alert
+    threshold: float
+    # days of attendance looked at, unused by performance alerts
+    window_days: int = Field(default=7)
+    enabled: bool = Field(default=True)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Alert(SQLModel, table=True):
+    """
+    A school, class or student currently matching an alert rule, written by
+    the alert evaluator. The row keeps its id and first_seen time while the
+    condition holds and is removed once it no longer does.
+    """
+    __tablename__ = "alert"
+    __table_args__ = (
+        UniqueConstraint("kind", "target_id", name="uq_alert_kind_target"),
+        Index("ix_alert_school_class", "school_id", "class_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str
+    school_id: int = Field(foreign_key="school.id", ondelete="CASCADE")
+    # set for class and student alerts
+    class_id: Optional[int] = None
+    # the school, class or student id
+    target_id: int
+    target_name: str
+    value: float
+    threshold: float
+    first_seen: datetime
+    last_seen: datetime
+
+
+# ACTIVITY
+
+class ActivityEvent(SQLModel, table=True):
+    """
+    Append-only log of writes for the activity feed, one compact row per
+    write, added in the write's own transaction.
+    """
+    __tablename__ = "activity_event"
+    __table_args__ = (
+        Index("ix_activity_event_school_id", "school_id", "id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    school_id: int = Field(foreign_key="school.id", ondelete="CASCADE")
+    # the class written to, kept after the class is deleted
+    class_id: Optional[int] = None
+    # the user who wrote
+    actor_id: Optional[int] = None
+    kind: str
+    message: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Request/Response Models
 class ClassCreate(SQLModel):
     name: str
@@ -244,6 +419,34 @@ class AttendanceResponse(SQLModel):
     is_present: bool
     date: date
 
+class AttendancePeriod(SQLModel):
+    start: date
+    end: date
+    present: int
+    total: int
+    attendance_percentage: float
+
+class AbsenceStreak(SQLModel):
+    student_id: int
+    student_name: str
+    class_id: int
+    streak_days: int
+    last_marked: date
+
+class AttendanceRangeSummary(SQLModel):
+    scope: str
+    id: int
+    name: str
+    date_from: date
+    date_to: date
+    present: int
+    total: int
+    attendance_percentage: float
+    daily: List[AttendancePeriod]
+    weekly: List[AttendancePeriod]
+    monthly: List[AttendancePeriod]
+    absence_streaks: List[AbsenceStreak]
+
 class ExamCreate(SQLModel):
     name: str
     subject_id: int
@@ -281,6 +484,20 @@ class SubjectCreate(SQLModel):
 class SubjectUpdate(SQLModel):
     name: Optional[str] = None
 
+class RosterImportError(SQLModel):
+    row: int
+    field: Optional[str] = None
+    message: str
+
+class RosterImportReport(SQLModel):
+    kind: str
+    dry_run: bool
+    total_rows: int
+    # rows written, or that would be written on a dry run
+    imported: int
+    failed: int
+    errors: List[RosterImportError]
+
 class SchoolDetailResponse(SQLModel):
     id: int
     name: str
@@ -291,4 +508,67 @@ class SchoolDetailResponse(SQLModel):
     stats: Dict[str, Any]
     teachers: List[Dict[str, Any]]
     classes: List[Dict[str, Any]]
-    subject_performance: List[Dict[str, Any]]
\ No newline at end of file
+    subject_performance: List[Dict[str, Any]]
+class ScoreDistribution(SQLModel):
+    # the group, only the ids it is keyed by are set
+    school_id: Optional[int] = None
+    school_name: Optional[str] = None
+    class_id: Optional[int] = None
+    class_name: Optional[str] = None
+    subject_id: Optional[int] = None
+    subject_name: Optional[str] = None
+    count: int
+    mean: float
+    std: float
+    min: float
+    q1: float
+    median: float
+    q3: float
+    max: float
+    pass_rate: float
+    histogram: List[int]
+
+class ScoreDistributionResponse(SQLModel):
+    # None for the whole district
+    school_id: Optional[int] = None
+    pass_mark: float
+    bin_edges: List[float]
+    by_school: List[ScoreDistribution] = []
+    by_class: List[ScoreDistribution] = []
+    by_subject: List[ScoreDistribution] = []
+    by_school_subject: List[ScoreDistribution] = []
+    by_class_subject: List[ScoreDistribution] = []
+
+class RankEntry(SQLModel):
+    student_id: int
+    student_name: str
+    class_id: int
+    class_name: str
+    score: float
+    # 1 for the top score, ties share a rank
+    rank: int
+    out_of: int
+    # percent of the other ranked students scoring lower
+    percentile: float
+
+class RankingResponse(SQLModel):
+    scope: str
+    # class / school id, None for the district
+    scope_id: Optional[int] = None
+    exam_id: Optional[int] = None
+    subject_id: Optional[int] = None
+    term: Optional[ExamType] = None
+    entries: List[RankEntry] = []
+
+class AlertRuleUpdate(SQLModel):
+    threshold: float = Field(ge=0, le=100)
+    window_days: int = Field(default=7, ge=1, le=366)
+    enabled: bool = True
+
+class AlertRuleResponse(SQLModel):
+    kind: AlertKind
+    # where the rule comes from: the school, 0 for the district, None for the defaults
+    school_id: Optional[int] = None
+    threshold: float
+    window_days: int
+    enabled: bool
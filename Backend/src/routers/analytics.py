@@ -7,18 +7,27 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlmodel import select, func
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Dict, Any, Optional
-from src.db.main import get_session
-from src.auth.dependencies import get_current_active_user, require_admin
-from src.auth.models import User, UserRole
-from src.models import Student, Class, School, Subject, Marks, TeacherAssignment
+from src.config import Config
+from src.db.main import get_read_session
+from src.auth.dependencies import get_current_active_user, require_admin, require_admin_or_principal
+from src.auth.scope import ScopeContext, get_scope
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
+from src.models import Student, Class, School, Subject, Marks, MarksAggregate
+from src.models.models import ExamType, RankingResponse, ScoreDistributionResponse
+from src.services.data_versions import conditional_get, ASSIGNMENTS, CLASSES, EXAMS, MARKS, SCHOOLS, STUDENTS, SUBJECTS
+from src.services.marks_aggregate import average_marks
+from src.services.rankings import RANKING_ENTITIES, RankScope, cached_ranking, scope_filters, subject_scores
+from src.services.score_distribution import score_distribution
 
 router = APIRouter()
 
 # Subject performance per school
-@router.get("/subject-performance")
+@router.get("/subject-performance", dependencies=[Depends(conditional_get(MARKS, SUBJECTS, ASSIGNMENTS, session_dependency=get_read_session))])
 async def get_subject_performance(
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session),
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    session: AsyncSession = Depends(get_read_session),
     school_id: Optional[int] = Query(None)
 ) -> List[Dict[str, Any]]:
     
@@ -26,25 +35,16 @@ async def get_subject_performance(
     if current_user.role == UserRole.PRINCIPAL:
         school_id = current_user.school_id
     elif current_user.role == UserRole.TEACHER:
-        # Get school_id from teacher's assigned classes
-        teacher_class = (await session.exec(
-            select(Class.school_id)
-            .join(TeacherAssignment, TeacherAssignment.class_id == Class.id)
-            .where(TeacherAssignment.teacher_id == current_user.id)
-            .limit(1)
-        )).first()
-        if not teacher_class:
+        if not scope.assignments:
             raise HTTPException(status_code=403, detail="No classes assigned")
-        school_id = teacher_class
+        school_id = scope.school_id
     elif school_id is None:
         raise HTTPException(status_code=400, detail="School ID required")
     
     query = (
-        select(Subject.id, Subject.name, func.avg(Marks.marks))
-        .join(Marks, Marks.subject_id == Subject.id)
-        .join(Student, Marks.student_id == Student.id)
-        .join(Class, Student.class_id == Class.id)
-        .where(Class.school_id == school_id)
+        select(Subject.id, Subject.name, average_marks)
+        .join(MarksAggregate, MarksAggregate.subject_id == Subject.id)
+        .where(MarksAggregate.school_id == school_id)
         .group_by(Subject.id, Subject.name)
     )
 
@@ -52,10 +52,11 @@ async def get_subject_performance(
     return [{"subject_id": sid, "subject": name, "average": round(avg or 0, 1)} for sid, name, avg in results]
 
 #class performance 
-@router.get("/class-performance")
+@router.get("/class-performance", dependencies=[Depends(conditional_get(CLASSES, STUDENTS, MARKS, SUBJECTS, ASSIGNMENTS, session_dependency=get_read_session))])
 async def get_class_performance(
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    session: AsyncSession = Depends(get_read_session)
 ) -> List[Dict[str, Any]]:
     
     """Class Wise performance with student count and subject averages"""
@@ -64,13 +65,8 @@ async def get_class_performance(
     if current_user.role == UserRole.PRINCIPAL:
         class_query = class_query.where(Class.school_id == current_user.school_id)
     elif current_user.role == UserRole.TEACHER:
-        teacher_classes = (await session.exec(
-            select(Class).join(TeacherAssignment, TeacherAssignment.class_id == Class.id)
-            .where(TeacherAssignment.teacher_id == current_user.id)
-        )).all()
-        
         #its structured so because a teacher could be assigned multiple classes
-        class_query = class_query.where(Class.id.in_([c.id for c in teacher_classes]))
+        class_query = class_query.where(Class.id.in_(scope.assigned_class_ids))
 
     classes = (await session.exec(class_query)).all()
     if not classes:
@@ -78,23 +74,12 @@ async def get_class_performance(
     
     class_ids = [c.id for c in classes]
 
-    #Number of students 
-    students_counts = dict(
-        (await session.exec(
-            select(Student.class_id, func.count(Student.id))
-            .where(Student.class_id.in_(class_ids))
-            .group_by(Student.class_id)
-        )).all()
-    )
-
     #subject averages per class
     results = (await session.exec(
-        select(Class.id, Subject.name, func.avg(Marks.marks))
-        .join(Student, Student.class_id == Class.id)
-        .join(Marks, Marks.student_id == Student.id)
-        .join(Subject, Marks.subject_id == Subject.id)
-        .where(Class.id.in_(class_ids))
-        .group_by(Class.id, Subject.name)
+        select(MarksAggregate.class_id, Subject.name, average_marks)
+        .join(Subject, MarksAggregate.subject_id == Subject.id)
+        .where(MarksAggregate.class_id.in_(class_ids))
+        .group_by(MarksAggregate.class_id, Subject.name)
     )).all()
 
 
@@ -108,16 +93,16 @@ async def get_class_performance(
         response.append({
             "class_id": c.id,
             "class": f"{c.grade}{c.section}",
-            "studentCount": students_counts.get(c.id, 0),
+            "studentCount": c.student_count,
             "subjects": subject_avgs.get(c.id, {})
         })
     return response
 
 # School comparison
-@router.get("/school-comparison")
+@router.get("/school-comparison", dependencies=[Depends(conditional_get(SCHOOLS, CLASSES, STUDENTS, MARKS, SUBJECTS, session_dependency=get_read_session))])
 async def get_school_comparison(
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    session: AsyncSession = Depends(get_read_session)
 ) -> List[Dict[str, Any]]:
     """Compare schools by avg score and per-subject averages"""
     
@@ -136,32 +121,24 @@ async def get_school_comparison(
         raise HTTPException(status_code=403, detail="Access denied")
 
     # School stats
-    query = (
-        select(Class.school_id, func.count(Student.id), func.avg(Marks.marks))
-        .join(Student, Student.class_id == Class.id)
-        .join(Marks, Marks.student_id == Student.id)
-    )
+    query = select(MarksAggregate.school_id, average_marks)
+    count_query = select(Class.school_id, func.count(Student.id)).join(Student, Student.class_id == Class.id)
     if school_ids:
-        query = query.where(Class.school_id.in_(school_ids))
+        query = query.where(MarksAggregate.school_id.in_(school_ids))
+        count_query = count_query.where(Class.school_id.in_(school_ids))
 
-    school_stats = {
-        school_id: (student_count, avg_score)
-        for school_id, student_count, avg_score in (await session.exec(
-            query.group_by(Class.school_id)
-        )).all()
-    }
+    averages = dict((await session.exec(query.group_by(MarksAggregate.school_id))).all())
+    student_counts = dict((await session.exec(count_query.group_by(Class.school_id))).all())
 
     # Subject averages
     subj_query = (
-        select(Class.school_id, Subject.name, func.avg(Marks.marks))
-        .join(Student, Student.class_id == Class.id)
-        .join(Marks, Marks.student_id == Student.id)
-        .join(Subject, Marks.subject_id == Subject.id)
+        select(MarksAggregate.school_id, Subject.name, average_marks)
+        .join(Subject, MarksAggregate.subject_id == Subject.id)
     )
     if school_ids:
-        subj_query = subj_query.where(Class.school_id.in_(school_ids))
+        subj_query = subj_query.where(MarksAggregate.school_id.in_(school_ids))
 
-    results = (await session.exec(subj_query.group_by(Class.school_id, Subject.name))).all()
+    results = (await session.exec(subj_query.group_by(MarksAggregate.school_id, Subject.name))).all()
 
     subject_avgs = {}
     for school_id, subj_name, avg in results:
@@ -176,23 +153,23 @@ async def get_school_comparison(
 
     response = []
     for school in schools:
-        student_count, avg_score = school_stats.get(school.id, (0, 0))
         response.append({
             "school_id": school.id,
             "school": school.name,
-            "averageScore": round(avg_score or 0, 1),
-            "studentCount": student_count,
+            "averageScore": round(averages.get(school.id) or 0, 1),
+            "studentCount": student_counts.get(school.id, 0),
             "subjects": subject_avgs.get(school.id, {})
         })
 
     return sorted(response, key=lambda x: x["averageScore"], reverse=True)
 
 # Student progress
-@router.get("/student-progress/{student_id}")
+@router.get("/student-progress/{student_id}", dependencies=[Depends(conditional_get(STUDENTS, MARKS, SUBJECTS, ASSIGNMENTS, session_dependency=get_read_session))])
 async def get_student_progress(
     student_id: int,
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    session: AsyncSession = Depends(get_read_session)
 ) -> List[Dict[str, Any]]:
     
     """Term-wise progression per subject for a student"""
@@ -208,11 +185,7 @@ async def get_student_progress(
             raise HTTPException(status_code=403, detail="Access denied")
 
     elif current_user.role == UserRole.TEACHER:
-        assigned_classes = (await session.exec(
-            select(TeacherAssignment.class_id)
-            .where(TeacherAssignment.teacher_id == current_user.id)
-        )).all()
-        if student.class_id not in assigned_classes:
+        if student.class_id not in scope.assigned_class_ids:
             raise HTTPException(status_code=403, detail="Access denied")
 
     # Query average marks per exam type and subject
@@ -235,3 +208,97 @@ async def get_student_progress(
         {"term": t, "subjects": progress.get(t, {})}
         for t in term_order if t in progress
     ]
+
+# Score distributions per class and subject
+@router.get(
+    "/distribution",
+    response_model=ScoreDistributionResponse,
+    dependencies=[Depends(conditional_get(MARKS, EXAMS, CLASSES, SUBJECTS, session_dependency=get_read_session))]
+)
+async def get_score_distribution(
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    session: AsyncSession = Depends(get_read_session),
+    school_id: Optional[int] = Query(None)
+):
+    """Median, quartiles, std, histogram and pass rate of a school's scores per class, subject and class x subject"""
+    if current_user.role == UserRole.PRINCIPAL:
+        school_id = current_user.school_id
+    elif school_id is None:
+        raise HTTPException(status_code=400, detail="School ID required")
+    if not await session.get(School, school_id):
+        raise HTTPException(status_code=404, detail="School not found")
+
+    return await score_distribution(session, school_id)
+
+# District wide score distributions
+@router.get(
+    "/distribution/district",
+    response_model=ScoreDistributionResponse,
+    dependencies=[Depends(conditional_get(MARKS, EXAMS, SCHOOLS, SUBJECTS, session_dependency=get_read_session))]
+)
+async def get_district_score_distribution(
+    current_user: UserSnapshot = Depends(require_admin),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Score distributions per school, subject and school x subject across the district"""
+    return await score_distribution(session)
+
+# Subject rankings within a class, a school or the district
+@router.get(
+    "/rankings/subject/{subject_id}",
+    response_model=RankingResponse,
+    dependencies=[Depends(conditional_get(*RANKING_ENTITIES, session_dependency=get_read_session))]
+)
+async def get_subject_ranking(
+    subject_id: int,
+    rank_scope: RankScope = Query(RankScope.CLASS, alias="scope"),
+    class_id: Optional[int] = Query(None),
+    school_id: Optional[int] = Query(None),
+    term: Optional[ExamType] = Query(None),
+    top: int = Query(Config.RANKING_TOP_DEFAULT, ge=1, le=Config.RANKING_TOP_MAX),
+    student_id: Optional[int] = Query(None),
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """Students ranked by their average in a subject (of one term if given), the top `top` ranks or only `student_id`"""
+    if not await session.get(Subject, subject_id):
+        raise HTTPException(status_code=404, detail="Subject not found")
+
+    if rank_scope == RankScope.CLASS:
+        if class_id is None:
+            raise HTTPException(status_code=400, detail="Class ID required")
+        class_ = await session.get(Class, class_id)
+        if not class_:
+            raise HTTPException(status_code=404, detail="Class not found")
+        if scope.is_teacher and class_id not in scope.class_ids | scope.assigned_class_ids:
+            raise HTTPException(status_code=403, detail="You can only view rankings of your classes")
+        if scope.is_principal and class_.school_id != scope.school_id:
+            raise HTTPException(status_code=403, detail="You can only view rankings of your school")
+        scope_id, school_id = class_id, class_.school_id
+    elif rank_scope == RankScope.SCHOOL:
+        if scope.is_teacher:
+            raise HTTPException(status_code=403, detail="Teachers can only view class rankings")
+        if current_user.role == UserRole.PRINCIPAL:
+            school_id = current_user.school_id
+        elif school_id is None:
+            raise HTTPException(status_code=400, detail="School ID required")
+        if not await session.get(School, school_id):
+            raise HTTPException(status_code=404, detail="School not found")
+        scope_id = school_id
+    else:
+        if current_user.role != UserRole.ADMIN:
+            raise HTTPException(status_code=403, detail="Only admins can view district rankings")
+        scope_id = school_id = None
+
+    filters = scope_filters(rank_scope, scope_id)
+    entries = await cached_ranking(
+        session,
+        ("subject", subject_id, rank_scope, scope_id, term),
+        school_id,
+        subject_scores(subject_id, term, filters),
+        filters,
+        top,
+        student_id,
+    )
+    return RankingResponse(scope=rank_scope.value, scope_id=scope_id, subject_id=subject_id, term=term, entries=entries)
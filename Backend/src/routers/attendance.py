@@ -1,12 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlmodel import func, select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import List
-from datetime import date
+from typing import List, Optional, Sequence, Tuple
+from datetime import date, datetime, timedelta
+from src.config import Config
 from src.db.main import get_session
-from src.auth.dependencies import get_current_active_user, require_admin_or_principal
-from src.auth.models import User, UserRole
-from src.models.models import Attendance, AttendanceCreate, AttendanceResponse, Student, Class, Teacher
+from src.db.upsert import dialect_insert
+from src.auth.dependencies import require_admin_or_principal
+from src.auth.scope import ScopeContext, get_scope
+from src.auth.user_cache import UserSnapshot
+from src.models.models import (
+    Attendance, AttendanceCreate, AttendanceResponse, AttendanceRangeSummary, AbsenceStreak,
+    ClassDailyAttendance, Student, Class, School, ActivityKind
+)
+from src.services.attendance_prefix import (
+    DayCounts, absence_streaks, attendance_periods, refresh_student_days, student_days, student_range_counts
+)
+from src.services.activity import record_activity
+from src.services.attendance_rollup import refresh_class_days
+from src.services.data_versions import bump_data_version, conditional_get, ATTENDANCE, STUDENTS
 
 router = APIRouter()
 
@@ -15,72 +27,88 @@ router = APIRouter()
 async def mark_attendance(
     attendance_data: List[AttendanceCreate],
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Mark attendance for multiple students in a class on a specific date"""
-    if current_user.role != UserRole.TEACHER:
+    if not scope.is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can mark attendance")
     
-    # Get the teacher's record
-    teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-    teacher = teacher_results.first()
-    if not teacher:
+    if scope.teacher_id is None:
         raise HTTPException(status_code=404, detail="Teacher record not found")
     
-    #prefetch all students involved
-    student_ids = [record.student_id for record in attendance_data]
-    students_result = await session.exec(select(Student).where(Student.id.in_(student_ids)))
-    students = {student.id: student for student in students_result.all()}
+    if not attendance_data:
+        return []
+
+    # ownership and roster are checked with one query each
+    class_ids = {data.class_id for data in attendance_data}
+    classes_result = await session.exec(select(Class).where(Class.id.in_(class_ids)))
+    classes = {class_.id: class_ for class_ in classes_result.all()}
 
-    attendance_records = []
+    student_ids = {data.student_id for data in attendance_data}
+    students_result = await session.exec(
+        select(Student.id, Student.name, Student.class_id).where(Student.id.in_(student_ids))
+    )
+    students = {student.id: student for student in students_result.all()}
 
+    # one row per (student, class, date), a repeated entry overrides the earlier one
+    rows = {}
+    now = datetime.utcnow()
     for data in attendance_data:
-        class_ = await session.get(Class, data.class_id)
+        class_ = classes.get(data.class_id)
         student = students.get(data.student_id)
 
-        if not class_ or class_.teacher_id != teacher.id:
+        if not class_ or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail=f"Access denied to class {data.class_id}")
         if not student or student.class_id != data.class_id:
             raise HTTPException(status_code=400, detail=f"Student {data.student_id} not in class {data.class_id}")
-        
-        # Check if attendance already marked for this student on this date
-        existing_record = await session.exec(
-            select(Attendance).where(
-                Attendance.student_id == data.student_id,
-                Attendance.class_id == data.class_id,
-                Attendance.attendance_date == data.date
-            )
-        )
-        existing = existing_record.first()
-
-        if existing:
-            existing.is_present = data.is_present
-            existing.teacher_id = teacher.id
-            session.add(existing)
-            attendance_records.append(existing)
-        else:
-            new_attendance = Attendance(
-                student_id=data.student_id,
-                class_id=data.class_id,
-                attendance_date=data.date,
-                teacher_id=teacher.id,
-                is_present=data.is_present
-            )
-            session.add(new_attendance)
-            attendance_records.append(new_attendance)
 
+        rows[(data.student_id, data.class_id, data.date)] = {
+            "student_id": data.student_id,
+            "class_id": data.class_id,
+            "attendance_date": data.date,
+            "teacher_id": scope.teacher_id,
+            "is_present": data.is_present,
+            "created_at": now,
+        }
+
+    # the whole batch in one statement, re-marking a day updates the existing rows
+    stmt = dialect_insert(session, Attendance).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["student_id", "class_id", "attendance_date"],
+        set_={"is_present": stmt.excluded.is_present, "teacher_id": stmt.excluded.teacher_id},
+    ).returning(Attendance.id, Attendance.student_id, Attendance.class_id, Attendance.attendance_date, Attendance.is_present)
+    written = {
+        (record.student_id, record.class_id, record.attendance_date): record
+        for record in (await session.exec(stmt)).all()
+    }
+
+    # keep the daily rollup in the same transaction
+    await refresh_class_days(session, [(data.class_id, data.date) for data in attendance_data])
+    await refresh_student_days(session, [(data.student_id, data.date) for data in attendance_data])
+
+    # one feed event per class day marked
+    marked = {}
+    for (_, class_id, day), row in rows.items():
+        counts = marked.setdefault((class_id, day), [0, 0])
+        counts[0] += row["is_present"]
+        counts[1] += 1
+    for (class_id, day), (present, total) in marked.items():
+        class_ = classes[class_id]
+        record_activity(session, class_.school_id, ActivityKind.ATTENDANCE_MARKED, f"Attendance marked for {class_.name} on {day.isoformat()}: {present}/{total} present", scope.user_id, class_id)
+    await bump_data_version(session, {class_.school_id for class_ in classes.values()}, ATTENDANCE)
     await session.commit()
 
     #build response
-    response = [
-        AttendanceResponse(
+    response = []
+    for data in attendance_data:
+        record = written[(data.student_id, data.class_id, data.date)]
+        response.append(AttendanceResponse(
             id=record.id,
             student_id=record.student_id,
-            student_name=students.get(record.student_id).name if students.get(record.student_id) else "Unknown",
+            student_name=students[record.student_id].name,
             is_present=record.is_present,
             date=record.attendance_date
-        ) for record in attendance_records
-    ]
+        ))
 
     return response
 
@@ -90,7 +118,7 @@ async def get_attendance_for_class_date(
     class_id: int,
     attendance_date: date,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Get attendance records for a specific class on a specific date"""
     
@@ -99,12 +127,10 @@ async def get_attendance_for_class_date(
         raise HTTPException(status_code=404, detail="Class not found")
     
     #permissions 
-    if current_user.role == UserRole.TEACHER:
-        teacher_result = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_result.first()
-        if not teacher or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if scope.teacher_id is None or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == UserRole.PRINCIPAL and class_.school_id != current_user.school_id:
+    elif scope.is_principal and class_.school_id != scope.school_id:
         raise HTTPException(status_code=403, detail="Access denied")
         
     attendance_result = await session.exec(
@@ -127,39 +153,70 @@ async def get_attendance_for_class_date(
         for attendance, student in attendance_result.all()
     ]
 
-#get student's attendance summary 
-@router.get("/student/{student_id}/summary")
-async def get_student_attendance_summary(
-    student_id: int,
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
-):
-    """Get attendance summary for a specific student"""
-    
+async def _readable_student(session: AsyncSession, scope: ScopeContext, student_id: int) -> Student:
     student = await session.get(Student, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
     #permissions
-    if current_user.role == UserRole.TEACHER:
-        teacher_result = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_result.first()
-        class_ = await session.get(Class, student.class_id)
-        if not teacher or not class_ or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if student.class_id not in scope.class_ids:
             raise HTTPException(status_code=403, detail="Access denied")
         
-    elif current_user.role == UserRole.PRINCIPAL:
+    elif scope.is_principal:
         class_ = await session.get(Class, student.class_id)
-        if not class_ or class_.school_id != current_user.school_id:
+        if not class_ or class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied")
-            
-    attendance_result = await session.exec(
-            select(Attendance)
-            .where(Attendance.student_id == student_id)
-        )
-    records = attendance_result.all()
-    total_days = len(records)
-    present_days = sum(1 for record in records if record.is_present)
+    return student
+
+
+def _date_range(date_from: Optional[date], date_to: Optional[date]) -> Tuple[date, date]:
+    # the last ATTENDANCE_SUMMARY_DEFAULT_DAYS days when not given
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=Config.ATTENDANCE_SUMMARY_DEFAULT_DAYS - 1)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    if (date_to - date_from).days >= Config.ATTENDANCE_SUMMARY_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range is limited to {Config.ATTENDANCE_SUMMARY_MAX_DAYS} days")
+    return date_from, date_to
+
+
+def _range_summary(
+        scope_name: str,
+        scope_id: int,
+        name: str,
+        date_from: date,
+        date_to: date,
+        days: Sequence[DayCounts],
+        streaks: List[AbsenceStreak],
+        totals: Optional[Tuple[int, int]] = None
+    ) -> AttendanceRangeSummary:
+    present, total = totals or (sum(day[1] for day in days), sum(day[2] for day in days))
+    return AttendanceRangeSummary(
+        scope=scope_name,
+        id=scope_id,
+        name=name,
+        date_from=date_from,
+        date_to=date_to,
+        present=present,
+        total=total,
+        attendance_percentage=round(present / total * 100, 2) if total else 0,
+        **attendance_periods(days, date_from, date_to),
+        absence_streaks=streaks,
+    )
+
+#get student's attendance summary 
+@router.get("/student/{student_id}/summary")
+async def get_student_attendance_summary(
+    student_id: int,
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Get attendance summary for a specific student"""
+    student = await _readable_student(session, scope, student_id)
+
+    # running totals of the student's last marked day, no scan of their rows
+    present_days, total_days = await student_range_counts(session, student_id, date.min, date.max)
     attendance_percentage = (present_days / total_days * 100) if total_days > 0 else 0
 
     return{
@@ -168,4 +225,95 @@ async def get_student_attendance_summary(
         "total_days": total_days,
         "present_days": present_days,
         "attendance_percentage": round(attendance_percentage, 2)
-    }
\ No newline at end of file
+    }
+
+#attendance of a student over a date range
+@router.get(
+    "/student/{student_id}/range-summary",
+    response_model=AttendanceRangeSummary,
+    dependencies=[Depends(conditional_get(ATTENDANCE, STUDENTS))]
+)
+async def get_student_range_summary(
+    student_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_streak: int = Query(3, ge=1),
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """A student's attendance rate with daily, weekly and monthly breakdowns and their current absence streak"""
+    date_from, date_to = _date_range(date_from, date_to)
+    student = await _readable_student(session, scope, student_id)
+
+    totals = await student_range_counts(session, student_id, date_from, date_to)
+    days = await student_days(session, student_id, date_from, date_to)
+    streaks = await absence_streaks(session, [Student.id == student_id], date_to, min_streak)
+    return _range_summary("student", student.id, student.name, date_from, date_to, days, streaks, totals)
+
+#attendance of a class over a date range
+@router.get(
+    "/class/{class_id}/range-summary",
+    response_model=AttendanceRangeSummary,
+    dependencies=[Depends(conditional_get(ATTENDANCE, STUDENTS))]
+)
+async def get_class_range_summary(
+    class_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_streak: int = Query(3, ge=1),
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """A class's attendance rate with daily, weekly and monthly breakdowns and its students' absence streaks"""
+    date_from, date_to = _date_range(date_from, date_to)
+    class_ = await session.get(Class, class_id)
+    if not class_:
+        raise HTTPException(status_code=404, detail="Class not found")
+
+    if scope.is_teacher:
+        if class_id not in scope.class_ids | scope.assigned_class_ids:
+            raise HTTPException(status_code=403, detail="Access denied")
+    elif scope.is_principal and class_.school_id != scope.school_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    days = (await session.exec(
+        select(ClassDailyAttendance.attendance_date, ClassDailyAttendance.present, ClassDailyAttendance.total)
+        .where(ClassDailyAttendance.class_id == class_id, ClassDailyAttendance.attendance_date.between(date_from, date_to))
+        .order_by(ClassDailyAttendance.attendance_date)
+    )).all()
+    streaks = await absence_streaks(session, [Student.class_id == class_id], date_to, min_streak)
+    return _range_summary("class", class_.id, class_.name, date_from, date_to, days, streaks)
+
+#attendance of a school over a date range
+@router.get(
+    "/school/{school_id}/range-summary",
+    response_model=AttendanceRangeSummary,
+    dependencies=[Depends(conditional_get(ATTENDANCE, STUDENTS))]
+)
+async def get_school_range_summary(
+    school_id: int,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_streak: int = Query(3, ge=1),
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope),
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
+):
+    """A school's attendance rate with daily, weekly and monthly breakdowns and its students' absence streaks"""
+    date_from, date_to = _date_range(date_from, date_to)
+    if scope.is_principal and scope.school_id != school_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    school = await session.get(School, school_id)
+    if not school:
+        raise HTTPException(status_code=404, detail="School not found")
+
+    days = (await session.exec(
+        select(ClassDailyAttendance.attendance_date, func.sum(ClassDailyAttendance.present), func.sum(ClassDailyAttendance.total))
+        .where(ClassDailyAttendance.school_id == school_id, ClassDailyAttendance.attendance_date.between(date_from, date_to))
+        .group_by(ClassDailyAttendance.attendance_date)
+        .order_by(ClassDailyAttendance.attendance_date)
+    )).all()
+    streaks = await absence_streaks(
+        session, [Student.class_id.in_(select(Class.id).where(Class.school_id == school_id))], date_to, min_streak
+    )
+    return _range_summary("school", school.id, school.name, date_from, date_to, days, streaks)
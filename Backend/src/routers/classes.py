@@ -1,31 +1,49 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select, func
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from sqlmodel import select, func, delete
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Optional
 
 from src.db.main import get_session
-from src.auth.models import User, UserRole
-from src.auth.dependencies import get_current_active_user, require_admin_or_principal
-from src.models.models import Class, ClassCreate, ClassResponse, Teacher, Student, StudentResponse, StudentCreate
+from src.db.pagination import PageParams, page_params, paginate
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
+from src.auth.dependencies import require_admin_or_principal
+from src.auth.scope import ScopeContext, get_scope
+from src.models.models import Class, ClassCreate, ClassResponse, ClassDailyAttendance, MarksAggregate, StudentAttendancePrefix, Teacher, Student, StudentResponse, StudentCreate, RosterImportReport, ActivityKind
+from src.services.roster_import import ClassImporter, import_school_id, run_import
+from src.services.student_counts import apply_student_count_deltas
+from src.services.activity import record_activity
+from src.services.data_versions import bump_data_version, conditional_get, ATTENDANCE, CLASSES, EXAMS, MARKS, STUDENTS, TEACHERS
 
 router = APIRouter()
 
 # utility -> Role-based access check 
-async def verify_class_access(current_user: User, class_: Class, session: AsyncSession):
-    if current_user.role == UserRole.PRINCIPAL and class_.school_id != current_user.school_id:
+def verify_class_access(scope: ScopeContext, class_: Class):
+    if scope.is_principal and class_.school_id != scope.school_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    elif scope.is_teacher and (scope.teacher_id is None or class_.teacher_id != scope.teacher_id):
         raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == UserRole.TEACHER:
-        teacher = (await session.exec(select(Teacher).where(Teacher.email == current_user.email))).first()
-        if not teacher or class_.teacher_id != teacher.id:
-            raise HTTPException(status_code=403, detail="Access denied")
         
 
+def class_response(class_: Class, teacher_name: Optional[str]) -> ClassResponse:
+    return ClassResponse(
+        id=class_.id,
+        name=class_.name,
+        grade=class_.grade,
+        section=class_.section,
+        school_id=class_.school_id,
+        teacher_id=class_.teacher_id,
+        teacher_name=teacher_name,
+        student_count=class_.student_count
+    )
+
+
 # Create a class
 @router.post("/", response_model=ClassResponse)
 async def create_class(
     class_create: ClassCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
 ):
     """create a new class and assign it to a teacher"""
     teacher = await session.get(Teacher, class_create.teacher_id)
@@ -41,6 +59,7 @@ async def create_class(
     
     db_class = Class(**class_create.model_dump())
     session.add(db_class)
+    await bump_data_version(session, db_class.school_id, CLASSES)
     await session.commit()
     await session.refresh(db_class)
 
@@ -55,82 +74,77 @@ async def create_class(
         student_count=0
     )
 
+# Import classes
+@router.post("/import", response_model=RosterImportReport)
+async def import_classes(
+    file: UploadFile = File(...),
+    school_id: Optional[int] = None,
+    dry_run: bool = False,
+    session: AsyncSession = Depends(get_session),
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Import classes from a CSV / XLSX file in one transaction, returns a per-row error report"""
+    school_id = await import_school_id(session, scope, school_id)
+    report = await run_import(session, ClassImporter(school_id), file, dry_run)
+
+    if report.imported and not dry_run:
+        await bump_data_version(session, school_id, CLASSES)
+        await session.commit()
+    return report
+
 # List all classes
-@router.get("/", response_model=List[ClassResponse])
+@router.get("/", response_model=List[ClassResponse], dependencies=[Depends(conditional_get(CLASSES, STUDENTS, TEACHERS))])
 async def list_classes(
+    response: Response,
     school_id: Optional[int] = None,
+    name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
-    """List all classes, with optional filtering by school_id"""
+    """List classes page by page (by name), with optional filtering by school_id or name"""
     
-    statement = select(Class)
+    # one joined query: the student count is kept on the class row
+    statement = select(Class, Teacher.name).outerjoin(Teacher, Teacher.id == Class.teacher_id)
 
-    if current_user.role == UserRole.PRINCIPAL:
-        school_id = current_user.school_id
+    if scope.is_principal:
+        school_id = scope.school_id
     
-    elif current_user.role == UserRole.TEACHER:
-        teacher_result = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_result.first()
-        if not teacher:
+    elif scope.is_teacher:
+        if scope.teacher_id is None:
             raise HTTPException(status_code=404, detail="Teacher record not found")
-        statement = statement.where(Class.teacher_id == teacher.id)
+        statement = statement.where(Class.teacher_id == scope.teacher_id)
 
     if school_id: 
         statement = statement.where(Class.school_id == school_id)
+    if name:
+        statement = statement.where(Class.name.icontains(name, autoescape=True))
 
-    classes = (await session.exec(statement)).all()
-
-    #preload student counts 
-    counts_query = select(Student.class_id, func.count(Student.id)).group_by(Student.class_id)
-    counts_result = await session.exec(counts_query)
-    counts_list = counts_result.all()
-    counts = dict(counts_list)
-
-    result = []
-    for class_ in classes:
-        teacher = await session.get(Teacher, class_.teacher_id) if class_.teacher_id else None
-        result.append(ClassResponse(
-            id=class_.id,
-            name=class_.name,
-            grade=class_.grade,
-            section=class_.section,
-            school_id=class_.school_id,
-            teacher_id=class_.teacher_id,
-            teacher_name=teacher.name if teacher else None,
-            student_count=counts.get(class_.id, 0)
-        ))  
-    return result
+    classes = await paginate(
+        session, statement, [Class.name, Class.id], lambda row: (row[0].name, row[0].id), page, response
+    )
+    return [class_response(class_, teacher_name) for class_, teacher_name in classes]
 
 # Get a single class by ID
 @router.get("/{class_id}", response_model=ClassResponse)
 async def get_class(
     class_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Get detailed class information by ID"""
-    class_ = await session.get(Class, class_id)
-    if not class_:
+    row = (await session.exec(
+        select(Class, Teacher.name)
+        .outerjoin(Teacher, Teacher.id == Class.teacher_id)
+        .where(Class.id == class_id)
+    )).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    await verify_class_access(current_user, class_, session)
-
-    teacher = await session.get(Teacher, class_.teacher_id) if class_.teacher_id else None
-    student_count = (await session.exec(
-        select(func.count(Student.id)).where(Student.class_id == class_.id)
-    )).first() or 0
-    
-    return ClassResponse(
-        id=class_.id,
-        name=class_.name,
-        grade=class_.grade,
-        section=class_.section,
-        school_id=class_.school_id,
-        teacher_id=class_.teacher_id,
-        teacher_name=teacher.name if teacher else None,
-        student_count=student_count 
-    )
+    class_, teacher_name = row
+    verify_class_access(scope, class_)
+    return class_response(class_, teacher_name)
 
 #delete a class
 @router.delete("/{class_id}")
@@ -138,14 +152,15 @@ async def delete_class(
     class_id: int,
     confirm: bool = False,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Delete a class by ID (only Admin or Principal, with optional confirmation)."""
     class_ = await session.get(Class, class_id)
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
 
-    await verify_class_access(current_user, class_, session)
+    verify_class_access(scope, class_)
 
     # Check if class has students
     student_count = (
@@ -161,7 +176,13 @@ async def delete_class(
         )
 
     # Proceed with deletion
+    await session.exec(delete(ClassDailyAttendance).where(ClassDailyAttendance.class_id == class_.id))
+    await session.exec(delete(StudentAttendancePrefix).where(
+        StudentAttendancePrefix.student_id.in_(select(Student.id).where(Student.class_id == class_.id))
+    ))
+    await session.exec(delete(MarksAggregate).where(MarksAggregate.class_id == class_.id))
     await session.delete(class_)
+    await bump_data_version(session, class_.school_id, CLASSES, STUDENTS, ATTENDANCE, EXAMS, MARKS)
     await session.commit()
 
     return {
@@ -175,14 +196,14 @@ async def add_student_to_class(
     class_id: int,
     student_data: StudentCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Add a new student to a class (teacher or principal only.)"""
     class_ = await session.get(Class, class_id)
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    await verify_class_access(current_user, class_, session)
+    verify_class_access(scope, class_)
 
     if student_data.class_id != class_id:
         raise HTTPException(status_code=400, detail="Class ID mismatch")
@@ -199,6 +220,9 @@ async def add_student_to_class(
     #create new student
     db_student = Student(**student_data.model_dump())
     session.add(db_student)
+    await apply_student_count_deltas(session, [(class_id, 1)])
+    record_activity(session, class_.school_id, ActivityKind.STUDENT_ADDED, f"Student {db_student.name} added to {class_.name}", scope.user_id, class_id)
+    await bump_data_version(session, class_.school_id, STUDENTS)
     await session.commit()
     await session.refresh(db_student)
 
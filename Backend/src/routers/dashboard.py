@@ -2,152 +2,148 @@
 Dahsboard API endpoints
 Provides aggregated data for dashboard views
 """
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func, cast, Integer
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import func, delete
 from sqlmodel import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-from src.db.main import get_session
-from src.auth.dependencies import get_current_active_user
-from src.auth.models import User, UserRole
-from src.models import School, Teacher, Student, Class, Attendance, Marks, Subject
+from src.config import Config
+from src.db.main import get_read_session, get_session
+from src.db.fanout import QueryFanOut, get_primary_fanout
+from src.db.upsert import dialect_insert
+from src.auth.dependencies import get_current_active_user, require_admin_or_principal
+from src.auth.scope import ScopeContext, get_scope
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
+from src.models import School, Teacher, Student, Class, ClassDailyAttendance, MarksAggregate, Subject, Alert, AlertRule
+from src.models.models import AlertKind, AlertRuleResponse, AlertRuleUpdate
+from src.services.activity import FeedScope, activity_page, present
+from src.services.alerts import (
+    ADMIN_KINDS, DISTRICT, MESSAGES, PRINCIPAL_KINDS, TEACHER_KINDS,
+    current_alerts, effective_rules, mark_schools_dirty
+)
+from src.services.marks_aggregate import average_marks
+from src.services.response_cache import dashboard_cache
 
 router = APIRouter()
 
+# attendance share (0-1) over the daily rollup rows in a query
+attendance_rate = func.sum(ClassDailyAttendance.present) * 1.0 / func.nullif(func.sum(ClassDailyAttendance.total), 0)
+
 @router.get("/stats")
 async def get_dashboard_stats(
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    fanout: QueryFanOut = Depends(get_primary_fanout)
 ) -> Dict[str, Any]:
     """
     This endpoint gives dashboard stats based on user role
     """
+    return await dashboard_cache.get_or_compute("stats", current_user, lambda: _dashboard_stats(current_user, scope, fanout))
+
+async def _dashboard_stats(current_user: UserSnapshot, scope: ScopeContext, fanout: QueryFanOut) -> Dict[str, Any]:
     stats = {}
+    today = datetime.now().date()
+    last_30_days = ClassDailyAttendance.attendance_date.between(today - timedelta(days=30), today)
 
     if current_user.role == UserRole.ADMIN:
-        total_schools_res = await session.exec(select(func.count(School.id)))
-        total_students_res = await session.exec(select(func.count(Student.id)))
-        total_teachers_res = await session.exec(select(func.count(Teacher.id)))
-        total_subjects_res = await session.exec(select(func.count(Subject.id)))
+        # independent counts run concurrently on separate connections
+        total_schools, total_students, total_teachers, total_subjects, avg_attendance = await fanout.gather(
+            select(func.count(School.id)),
+            select(func.count(Student.id)),
+            select(func.count(Teacher.id)),
+            select(func.count(Subject.id)),
+            select(attendance_rate * 100).where(last_30_days),
+        )
 
         stats = {
-            "total_schools": total_schools_res.one(),
-            "total_students": total_students_res.one(),
-            "total_teachers": total_teachers_res.one(),
-            "total_subjects": total_subjects_res.one(),
+            "total_schools": total_schools[0],
+            "total_students": total_students[0],
+            "total_teachers": total_teachers[0],
+            "total_subjects": total_subjects[0],
+            "average_attendance": round(avg_attendance[0] or 0, 1),
         }
 
-        avg_attendance_res = await session.exec(
-            select(func.avg(cast(Attendance.is_present, Integer)) * 100)
-            .where(Attendance.attendance_date >= datetime.now().date() - timedelta(days=30))
-        )
-        stats["average_attendance"] = round(avg_attendance_res.one() or 0, 1)
-
     elif current_user.role == UserRole.PRINCIPAL:
         if current_user.school_id:
-            total_students_res = await session.exec(
+            total_students, total_teachers, total_classes, avg_attendance = await fanout.gather(
                 select(func.count(Student.id))
                 .join(Class, Student.class_id == Class.id)
-                .where(Class.school_id == current_user.school_id)
-            )
-            total_teachers_res = await session.exec(
+                .where(Class.school_id == current_user.school_id),
                 select(func.count(Teacher.id))
-                .where(Teacher.school_id == current_user.school_id)
-            )
-            total_classes_res = await session.exec(
+                .where(Teacher.school_id == current_user.school_id),
                 select(func.count(Class.id))
-                .where(Class.school_id == current_user.school_id)
+                .where(Class.school_id == current_user.school_id),
+                select(attendance_rate * 100)
+                .where(ClassDailyAttendance.school_id == current_user.school_id)
+                .where(last_30_days),
             )
 
             stats = {
-                "total_students": total_students_res.one(),
-                "total_teachers": total_teachers_res.one(),
-                "total_classes": total_classes_res.one(),
+                "total_students": total_students[0],
+                "total_teachers": total_teachers[0],
+                "total_classes": total_classes[0],
+                "average_attendance": round(avg_attendance[0] or 0, 1),
             }
 
-            avg_attendance_res = await session.exec(
-                select(func.avg(cast(Attendance.is_present, Integer) * 100))
-                .join(Class, Attendance.class_id == Class.id)
-                .where(Class.school_id == current_user.school_id)
-                .where(Attendance.attendance_date >= datetime.now().date() - timedelta(days=30))
-            )
-            stats["average_attendance"] = round(avg_attendance_res.one() or 0, 1)
-
     elif current_user.role == UserRole.TEACHER:
-        teacher_res = await session.exec(
-            select(Teacher).where(Teacher.email == current_user.email)
-        )
-        teacher = teacher_res.first()
-
-        if teacher:
-            from src.models import TeacherAssignment
-            class_ids_res = await session.exec(
-                select(TeacherAssignment.class_id)
-                .where(TeacherAssignment.teacher_id == teacher.id)
-            )
-            class_ids = [c[0] for c in class_ids_res.all()]  # unpack tuple results
-
-            total_students_res = await session.exec(
-                select(func.count(Student.id))
-                .where(Student.class_id.in_(class_ids))
-            )
-            subjects_taught_res = await session.exec(
-                select(func.count(func.distinct(TeacherAssignment.subject_id)))
-                .where(TeacherAssignment.teacher_id == teacher.id)
+        if scope.teacher_id is not None:
+            class_ids = scope.assigned_class_ids
+            total_students = await fanout.run(
+                select(func.count(Student.id)).where(Student.class_id.in_(class_ids))
             )
 
             stats = {
-                "total_students": total_students_res.one(),
+                "total_students": total_students[0],
                 "total_classes": len(class_ids),
-                "subjects_taught": subjects_taught_res.one(),
+                "subjects_taught": len(scope.subject_ids),
             }
 
     return stats
 
-#currently hardcoaded will improve and replace later
 @router.get("/recent-activity")
 async def get_recent_activity(
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session)
+    response: Response,
+    limit: int = Query(Config.ACTIVITY_FEED_PAGE_DEFAULT, ge=1, le=Config.PAGE_SIZE_MAX),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    session: AsyncSession = Depends(get_read_session)
 ) -> List[Dict[str, Any]]:
-    activities = []
-
+    """Newest activity in the user's scope first, pass X-Next-Cursor as ?cursor= for older events"""
     if current_user.role == UserRole.ADMIN:
-        activities = [
-            {"id": "1", "type": "success", "message": "New school 'Jefferson Academy' added to the system", "timestamp": (datetime.now() - timedelta(hours=2)).isoformat(), "icon": "school"},
-            {"id": "2", "type": "info", "message": "Monthly performance reports generated", "timestamp": (datetime.now() - timedelta(hours=5)).isoformat(), "icon": "report"},
-            {"id": "3", "type": "warning", "message": "Data sync from 3 schools pending", "timestamp": (datetime.now() - timedelta(days=1)).isoformat(), "icon": "sync"}
-        ]
+        feed = FeedScope()
     elif current_user.role == UserRole.PRINCIPAL:
-        activities = [
-            {"id": "1", "type": "success", "message": "Class 10A achieved 95% attendance this month", "timestamp": (datetime.now() - timedelta(hours=2)).isoformat(), "icon": "award"},
-            {"id": "2", "type": "info", "message": "New teacher Jane Smith assigned to Math classes", "timestamp": (datetime.now() - timedelta(days=1)).isoformat(), "icon": "user"},
-            {"id": "3", "type": "info", "message": "Science lab equipment maintenance completed", "timestamp": (datetime.now() - timedelta(days=2)).isoformat(), "icon": "tool"}
-        ]
-    elif current_user.role == UserRole.TEACHER:
-        activities = [
-            {"id": "1", "type": "success", "message": "Attendance marked for Class 10A", "timestamp": (datetime.now() - timedelta(hours=1)).isoformat(), "icon": "check"},
-            {"id": "2", "type": "info", "message": "Exam marks submitted for Math test", "timestamp": (datetime.now() - timedelta(hours=3)).isoformat(), "icon": "grade"}
-        ]
+        if not current_user.school_id:
+            return []
+        feed = FeedScope(school_id=current_user.school_id)
+    else:
+        # a teacher sees their classes' events and their own
+        if scope.school_id is None:
+            return []
+        feed = FeedScope(school_id=scope.school_id, class_ids=scope.class_ids | scope.assigned_class_ids, actor_id=current_user.id)
 
-    return activities
+    return [present(row) for row in await activity_page(session, feed, limit, cursor, response)]
 
 
 @router.get("/performance-data")
 async def get_performance_data(
-    current_user: User = Depends(get_current_active_user),
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
     session: AsyncSession = Depends(get_session)
 ) -> List[Dict[str, Any]]:
-    
+    return await dashboard_cache.get_or_compute("performance-data", current_user, lambda: _performance_data(current_user, scope, session))
+
+async def _performance_data(current_user: UserSnapshot, scope: ScopeContext, session: AsyncSession) -> List[Dict[str, Any]]:
     performance_data: List[Dict[str, Any]] = []
 
 
     if current_user.role == UserRole.ADMIN:
         #if district admin show average marks per subject across all schools in the table
         result = await session.exec(
-            select(Subject.name, func.avg(Marks.marks))
-            .join(Marks, Marks.subject_id == Subject.id)
+            select(Subject.name, average_marks)
+            .join(MarksAggregate, MarksAggregate.subject_id == Subject.id)
             .group_by(Subject.id, Subject.name)
         )
         for subject_name, avg_marks in result.all():
@@ -160,10 +156,9 @@ async def get_performance_data(
             raise HTTPException(status_code=400, detail="Principal not linked to a school")
 
         results = await session.exec(
-            select(Subject.name, func.avg(Marks.marks))
-            .join(Marks, Marks.subject_id == Subject.id)
-            .join(Class, Marks.class_id == Class.id)
-            .where(Class.school_id == current_user.school_id)
+            select(Subject.name, average_marks)
+            .join(MarksAggregate, MarksAggregate.subject_id == Subject.id)
+            .where(MarksAggregate.school_id == current_user.school_id)
             .group_by(Subject.id, Subject.name)
         )
         for subject_name, avg_marks in results.all():
@@ -173,19 +168,15 @@ async def get_performance_data(
             })
 
     elif current_user.role == UserRole.TEACHER:
-        teacher_res = await session.exec(
-            select(Teacher).where(Teacher.email == current_user.email)
-        )
-        teacher = teacher_res.first()
-        if not teacher:
+        if scope.teacher_id is None:
             raise HTTPException(status_code=404, detail="Teacher not found")
 
         from src.models import TeacherAssignment
         assigned_subjects_res = await session.exec(
-            select(Subject.name, func.avg(Marks.marks))
-            .join(Marks, Marks.subject_id == Subject.id)
-            .join(TeacherAssignment, TeacherAssignment.subject_id == Subject.id)
-            .where(TeacherAssignment.teacher_id == teacher.id)
+            select(Subject.name, average_marks)
+            .join(MarksAggregate, MarksAggregate.subject_id == Subject.id)
+            .join(TeacherAssignment, (TeacherAssignment.subject_id == Subject.id) & (TeacherAssignment.class_id == MarksAggregate.class_id))
+            .where(TeacherAssignment.teacher_id == scope.teacher_id)
             .group_by(Subject.id, Subject.name)
         )
 
@@ -199,132 +190,114 @@ async def get_performance_data(
 
 @router.get("/alerts")
 async def get_alerts(
-    current_user: User = Depends(get_current_active_user),
-    session: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_active_user),
+    scope: ScopeContext = Depends(get_scope),
+    session: AsyncSession = Depends(get_read_session)
 ) -> List[Dict[str, Any]]:
+    """Current alerts for the user's scope, as stored by the background alert evaluator"""
     alerts = []
 
     if current_user.role == UserRole.ADMIN:
-        #checks for low attendance for schools in last 7 days
-        low_attendance_res = await session.exec(
-            select(School.name)
-            .join(Class, School.id == Class.school_id)
-            .join(Attendance, Class.id == Attendance.class_id)
-            .where(Attendance.attendance_date >= datetime.now().date() - timedelta(days=7))
-            .group_by(School.id, School.name)
-            #if the attendance is less than 75% alert is sent -- can be changed according to schools attendance policy
-            .having(func.avg(cast(Attendance.is_present, Integer)) < 0.75)
-        )
-        low_attendance_schools = low_attendance_res.all()
-
-        for school_name in low_attendance_schools:
-            alerts.append({
-                "id": f"attendance_{school_name}",
-                "type": "warning",
-                "message": f"Low attendance detected at {school_name}",
-                "time": datetime.now().isoformat()
-            })
-
-        # Low performance of schools in terms of results (average marks < 50% can be changed later)
-        low_performance_res = await session.exec(
-            select(School.name)
-            .join(Class, School.id == Class.school_id)
-            .join(Marks, Class.id == Marks.class_id)
-            .group_by(School.id, School.name)
-            .having(func.avg(Marks.marks)<50)
-        )
-        low_performance_schools = low_performance_res.all()
-
-        for school_name in low_performance_schools:
-            alerts.append({
-                "id": f"performance_{school_name}",
-                "type": "warning",
-                "message": f"Low performance detected at {school_name}",
-                "time": datetime.now().isoformat()
-            })
-
-    #Principal alerts 
-    if current_user.role == UserRole.PRINCIPAL:
+        alerts = await current_alerts(session, ADMIN_KINDS)
+    elif current_user.role == UserRole.PRINCIPAL:
         if current_user.school_id:
-            #alerts for low attendance of classes in last 7 days
-            low_attendance_res = await session.exec(
-                select(Class.name)
-                .join(Attendance, Class.id == Attendance.class_id)
-                .where(Class.school_id == current_user.school_id)
-                .where(Attendance.attendance_date >= datetime.now().date() - timedelta(days=7))
-                .group_by(Class.id, Class.name)
-                .having(func.avg(cast(Attendance.is_present, Integer)) < 0.75)
-            )
-            low_attendance_classes = low_attendance_res.all()
-
-            for class_name in low_attendance_classes:
-                alerts.append({
-                    "id": f"attendance_class_{class_name}",
-                    "type": "warning",
-                    "message": f"Low attendance detected in class {class_name}",
-                    "time": datetime.now().isoformat()
-                })
-            
-            # Low performance for classes (average marks < 50%)
-            low_performance_res = await session.exec(
-                select(Class.name)
-                .join(Marks, Class.id == Marks.class_id)
-                .where(Class.school_id == current_user.school_id)
-                .group_by(Class.id, Class.name)
-                .having(func.avg(Marks.marks) < 50)
-            )
-            low_performance_classes = low_performance_res.all()
-
-            for class_name in low_performance_classes:
-                alerts.append({
-                    "id": f"performance_class_{class_name}",
-                    "type": "warning",
-                    "message": f"Low performance detected in class {class_name}",
-                    "time": datetime.now().isoformat()
-                })
-    # Teacher Alerts
-    if current_user.role == UserRole.TEACHER:
-        teacher_res = await session.exec(
-            select(Teacher).where(Teacher.email == current_user.email)
-        )
-        teacher = teacher_res.first()
-
-        if teacher:
-            # Check student's attendance
-            low_attendance_students_res = await session.exec(
-                select(Student.name)
-                .join(Attendance, Student.id == Attendance.student_id)
-                .where(Attendance.teacher_id == teacher.id)
-                .where(Attendance.attendance_date >= datetime.now().date() - timedelta(days=7))
-                .group_by(Student.id, Student.name)
-                .having(func.avg(cast(Attendance.is_present, Integer)) < 0.85)
-            )
-            low_attendance_students = low_attendance_students_res.all()
-
-            for student_name in low_attendance_students:
-                alerts.append({
-                    "id": f"attendance_student_{student_name}",
-                    "type": "warning",
-                    "message": f"Low attendance detected for student {student_name}",
-                    "time": datetime.now().isoformat()
-                })
-
-            # Check student's performance
-            low_performance_students_res = await session.exec(
-                select(Student.name)
-                .join(Marks, Student.id == Marks.student_id)
-                .where(Marks.teacher_id == teacher.id)
-                .group_by(Student.id, Student.name)
-                .having(func.avg(Marks.marks) < 50)
+            alerts = await current_alerts(session, PRINCIPAL_KINDS, Alert.school_id == current_user.school_id)
+    elif current_user.role == UserRole.TEACHER:
+        if scope.teacher_id is not None:
+            alerts = await current_alerts(
+                session,
+                TEACHER_KINDS,
+                Alert.school_id == scope.school_id,
+                Alert.class_id.in_(scope.class_ids | scope.assigned_class_ids),
             )
-            low_performance_students = low_performance_students_res.all()
 
-            for student_name in low_performance_students:
-                alerts.append({
-                    "id": f"performance_student_{student_name}",
-                    "type": "warning",
-                    "message": f"Declining performance detected for student {student_name}",
-                    "time": datetime.now().isoformat()
-                })
+    return [
+        {
+            "id": alert.id,
+            "kind": alert.kind,
+            "type": "warning",
+            "message": MESSAGES[AlertKind(alert.kind)].format(name=alert.target_name),
+            "value": round(alert.value, 1),
+            "threshold": alert.threshold,
+            # when the condition was first seen, stays put between polls
+            "time": alert.first_seen.isoformat()
+        }
+        for alert in alerts
+    ]
+
 
-    return alerts
+def _rules_school_id(current_user: UserSnapshot, school_id: Optional[int]) -> int:
+    # principals manage their school's rules, admins any school's or the district defaults
+    if current_user.role == UserRole.PRINCIPAL:
+        if not current_user.school_id:
+            raise HTTPException(status_code=400, detail="Principal not linked to a school")
+        return current_user.school_id
+    return school_id if school_id is not None else DISTRICT
+
+def _rule_response(kind: AlertKind, rule: AlertRule) -> AlertRuleResponse:
+    return AlertRuleResponse(
+        kind=kind,
+        school_id=rule.school_id,
+        threshold=rule.threshold,
+        window_days=rule.window_days,
+        enabled=rule.enabled
+    )
+
+@router.get("/alert-rules", response_model=List[AlertRuleResponse])
+async def get_alert_rules(
+    school_id: Optional[int] = None,
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """The alert rules in effect for a school, or the district defaults without school_id"""
+    school_id = _rules_school_id(current_user, school_id)
+    if school_id != DISTRICT and not await session.get(School, school_id):
+        raise HTTPException(status_code=404, detail="School not found")
+
+    rules = await effective_rules(session, [school_id])
+    return [_rule_response(kind, rule) for kind, rule in rules[school_id].items()]
+
+@router.put("/alert-rules/{kind}", response_model=AlertRuleResponse)
+async def set_alert_rule(
+    kind: AlertKind,
+    rule_data: AlertRuleUpdate,
+    school_id: Optional[int] = None,
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """Set a school's (or the district's) threshold for one alert kind, its alerts are re-evaluated shortly"""
+    school_id = _rules_school_id(current_user, school_id)
+    if school_id != DISTRICT and not await session.get(School, school_id):
+        raise HTTPException(status_code=404, detail="School not found")
+
+    values = {**rule_data.model_dump(), "updated_at": datetime.utcnow()}
+    stmt = dialect_insert(session, AlertRule).values(school_id=school_id, kind=kind.value, **values)
+    await session.exec(stmt.on_conflict_do_update(index_elements=["school_id", "kind"], set_=values))
+    await session.commit()
+
+    await _reevaluate(session, school_id)
+    return AlertRuleResponse(kind=kind, school_id=school_id, **rule_data.model_dump())
+
+@router.delete("/alert-rules/{kind}")
+async def delete_alert_rule(
+    kind: AlertKind,
+    school_id: Optional[int] = None,
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    session: AsyncSession = Depends(get_session)
+):
+    """Drop a school's (or the district's) rule for one alert kind, falling back to the district's or the default"""
+    school_id = _rules_school_id(current_user, school_id)
+    result = await session.exec(delete(AlertRule).where(AlertRule.school_id == school_id, AlertRule.kind == kind.value))
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Alert rule not found")
+    await session.commit()
+
+    await _reevaluate(session, school_id)
+    return {"message": "Alert rule deleted successfully"}
+
+async def _reevaluate(session: AsyncSession, school_id: int):
+    # district rules apply to every school
+    if school_id == DISTRICT:
+        mark_schools_dirty(*(await session.exec(select(School.id))).all())
+    else:
+        mark_schools_dirty(school_id)
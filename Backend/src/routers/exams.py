@@ -1,35 +1,42 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import select
+from sqlalchemy import tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from collections import Counter
+from typing import List, Optional
+from datetime import datetime
+from src.config import Config
 from src.db.main import get_session
+from src.db.pagination import PageParams, page_params, paginate
+from src.db.upsert import dialect_insert
 from src.models.models import(
     Exam, ExamCreate, ExamResponse, ExamMarks, ExamMarksCreate,
-    Student, Subject, Class, Teacher
+    RankingResponse, Student, Subject, Class, Teacher, ActivityKind
 )
-from src.auth.dependencies import get_current_active_user
-from src.auth.models import User, UserRole
+from src.auth.scope import ScopeContext, get_scope
+from src.services.marks_aggregate import apply_marks_deltas, exam_percentage
+from src.services.data_versions import bump_data_version, EXAMS, MARKS
+from src.services.activity import record_activity
+from src.services.rankings import RankScope, cached_ranking, exam_scores
 
 router = APIRouter()
 
-#helper function to fetch teacher by current user
-async def get_current_teacher(current_user: User, session: AsyncSession) -> Teacher:
-    if current_user.role != UserRole.TEACHER:
+#helper function to get the teacher id of the current user
+def get_current_teacher_id(scope: ScopeContext) -> int:
+    if not scope.is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can perform this action")
-    result = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-    teacher = result.first()
-    if not teacher:
+    if scope.teacher_id is None:
         raise HTTPException(status_code=404, detail="Teacher profile not found")
-    return teacher  
+    return scope.teacher_id
 
 #create exam
 @router.post("/", response_model=ExamResponse)
 async def create_exam(
     exam_data: ExamCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
-    teacher = await get_current_teacher(current_user, session)
+    teacher_id = get_current_teacher_id(scope)
     
     # Verify class assignment
     class_ = await session.get(Class, exam_data.class_id)
@@ -38,9 +45,11 @@ async def create_exam(
     
     # Create exam with teacher_id
     exam_dict = exam_data.model_dump()
-    exam_dict['teacher_id'] = teacher.id
+    exam_dict['teacher_id'] = teacher_id
     db_exam = Exam(**exam_dict)
     session.add(db_exam)
+    record_activity(session, class_.school_id, ActivityKind.EXAM_CREATED, f"Exam {db_exam.name} created for {class_.name}", scope.user_id, class_.id)
+    await bump_data_version(session, class_.school_id, EXAMS)
     await session.commit()
     await session.refresh(db_exam)
 
@@ -62,26 +71,33 @@ async def create_exam(
 @router.get("/teacher/{teacher_id}")
 async def get_teacher_exams(
     teacher_id: int,
+    response: Response,
+    name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
+    """Exams of a teacher page by page, newest first, optionally filtered by name"""
     #teacher or principal can access
-    if current_user.role == UserRole.TEACHER:
-        teacher = await get_current_teacher(current_user, session)
-        if teacher.id != teacher_id:
+    if scope.is_teacher:
+        current_teacher_id = get_current_teacher_id(scope)
+        if current_teacher_id != teacher_id:
             raise HTTPException(status_code=403, detail="You can only access your own exams")
-    elif current_user.role == UserRole.PRINCIPAL:
+    elif scope.is_principal:
         teacher = await session.get(Teacher, teacher_id)
-        if not teacher or teacher.school_id != current_user.school_id:
+        if not teacher or teacher.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="You can only access exams from your school")
     
-    exam_result = await session.exec(
+    statement = (
         select(Exam, Subject, Class)
         .join(Subject, Exam.subject_id == Subject.id)
         .join(Class, Exam.class_id == Class.id)
         .where(Exam.teacher_id == teacher_id)
     )
-    exams = exam_result.all()
+    if name:
+        statement = statement.where(Exam.name.icontains(name, autoescape=True))
+
+    exams = await paginate(session, statement, [Exam.id], lambda row: (row[0].id,), page, response, descending=True)
 
     return [
         {
@@ -101,64 +117,108 @@ async def get_teacher_exams(
 #get my exams
 @router.get("/me")
 async def get_my_exams(
+    response: Response,
+    name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
-    teacher = await get_current_teacher(current_user, session)
-    return await get_teacher_exams(teacher.id, session, current_user)   
+    teacher_id = get_current_teacher_id(scope)
+    return await get_teacher_exams(teacher_id, response, name, page, session, scope)   
 
 #submit exam marks -- bulk insert
 @router.post("/marks", response_model=List[dict])
 async def submit_exam_marks(
     marks_list: List[ExamMarksCreate],
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
-    teacher = await get_current_teacher(current_user, session)
+    teacher_id = get_current_teacher_id(scope)
     
-    student_ids = [marks.student_id for marks in marks_list]
+    if not marks_list:
+        return []
+
+    # every exam of the batch with its school in one query
+    exam_ids = {marks.exam_id for marks in marks_list}
+    exams_result = await session.exec(
+        select(Exam, Class.school_id)
+        .join(Class, Exam.class_id == Class.id)
+        .where(Exam.id.in_(exam_ids))
+    )
+    exams = {exam.id: (exam, school_id) for exam, school_id in exams_result.all()}
+
+    student_ids = {marks.student_id for marks in marks_list}
     students_result = await session.exec(
-        select(Student).where(Student.id.in_(student_ids))
+        select(Student.id, Student.name, Student.class_id).where(Student.id.in_(student_ids))
     )
-    students_map = {student.id: student for student in students_result.all()}   
+    students_map = {student.id: student for student in students_result.all()}
 
-    marks_records = []
+    # one row per (exam, student), a repeated entry overrides the earlier one
+    rows = {}
+    now = datetime.utcnow()
     for marks_data in marks_list:
-        exam = await session.get(Exam, marks_data.exam_id)
-        if not exam or exam.teacher_id != teacher.id:
+        exam, _ = exams.get(marks_data.exam_id, (None, None))
+        if not exam or exam.teacher_id != teacher_id:
             raise HTTPException(status_code=403, detail=f"You are not authorized to submit marks for exam ID {marks_data.exam_id}")
-        
+
         student = students_map.get(marks_data.student_id)
         if not student or student.class_id != exam.class_id:
             raise HTTPException(status_code=400, detail=f"Student ID {marks_data.student_id} is not in the exam's class")
-        
-        existing_result = await session.exec(
-            select(ExamMarks)
-            .where(ExamMarks.exam_id == marks_data.exam_id)
-            .where(ExamMarks.student_id == marks_data.student_id)
-        )
-        existing = existing_result.first()
-
-        if existing:
-            existing.marks_obtained = marks_data.marks_obtained
-            session.add(existing)
-            marks_records.append(existing)
+
+        rows[(marks_data.exam_id, marks_data.student_id)] = {
+            "exam_id": marks_data.exam_id,
+            "student_id": marks_data.student_id,
+            "marks_obtained": marks_data.marks_obtained,
+            "created_at": now,
+        }
+
+    # previous marks, needed to move the aggregate by the difference
+    existing_result = await session.exec(
+        select(ExamMarks.exam_id, ExamMarks.student_id, ExamMarks.marks_obtained)
+        .where(tuple_(ExamMarks.exam_id, ExamMarks.student_id).in_(list(rows)))
+    )
+    existing = {(exam_id, student_id): marks for exam_id, student_id, marks in existing_result.all()}
+
+    aggregate_deltas = []
+    school_ids = set()
+    for key, row in rows.items():
+        exam, school_id = exams[row["exam_id"]]
+        school_ids.add(school_id)
+        cell = (school_id, exam.class_id, exam.subject_id, exam.exam_type)
+        new_score = exam_percentage(row["marks_obtained"], exam.max_marks)
+        if new_score is None:
+            continue
+        if key in existing:
+            # a correction moves the running sum, not the count
+            aggregate_deltas.append((cell, new_score - exam_percentage(existing[key], exam.max_marks), 0))
         else:
-            new_marks = ExamMarks(**marks_data.model_dump())
-            session.add(new_marks)
-            marks_records.append(new_marks)
+            aggregate_deltas.append((cell, new_score, 1))
 
+    stmt = dialect_insert(session, ExamMarks).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["exam_id", "student_id"],
+        set_={"marks_obtained": stmt.excluded.marks_obtained},
+    ).returning(ExamMarks.id, ExamMarks.exam_id, ExamMarks.student_id, ExamMarks.marks_obtained)
+    written = {
+        (record.exam_id, record.student_id): record
+        for record in (await session.exec(stmt)).all()
+    }
+
+    await apply_marks_deltas(session, aggregate_deltas)
+    submitted = Counter(exam_id for exam_id, _ in rows)
+    for exam_id, count in submitted.items():
+        exam, school_id = exams[exam_id]
+        record_activity(session, school_id, ActivityKind.MARKS_SUBMITTED, f"Marks submitted for {count} students in {exam.name}", scope.user_id, exam.class_id)
+    await bump_data_version(session, school_ids, MARKS)
     await session.commit()
-    for record in marks_records:
-        await session.refresh(record)
     
     response = []
-    for record in marks_records:
-        student = students_map.get(record.student_id)
+    for marks_data in marks_list:
+        record = written[(marks_data.exam_id, marks_data.student_id)]
         response.append({
             "id": record.id,
             "student_id": record.student_id,
-            "student_name": student.name if student else "Unknown",
+            "student_name": students_map[record.student_id].name,
             "marks_obtained": record.marks_obtained,
         })
     return response
@@ -168,20 +228,20 @@ async def submit_exam_marks(
 async def get_exam_marks(
     exam_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     
     exam = await session.get(Exam, exam_id)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher = await get_current_teacher(current_user, session)
-        if exam.teacher_id != teacher.id:
+    if scope.is_teacher:
+        current_teacher_id = get_current_teacher_id(scope)
+        if exam.teacher_id != current_teacher_id:
             raise HTTPException(status_code=403, detail="You are not authorized to view marks for this exam")
-    elif current_user.role == UserRole.PRINCIPAL:
+    elif scope.is_principal:
         class_ = await session.get(Class, exam.class_id)
-        if not class_ or class_.school_id != current_user.school_id:
+        if not class_ or class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="You are not authorized to view marks for this exam")
     
     marks_result = await session.exec(
@@ -199,12 +259,42 @@ async def get_exam_marks(
         } for exam_marks, student in marks
     ]
 
-#student's exam performance
+#exam ranking -- top K or one student's rank
+@router.get("/{exam_id}/ranking", response_model=RankingResponse)
+async def get_exam_ranking(
+    exam_id: int,
+    top: int = Query(Config.RANKING_TOP_DEFAULT, ge=1, le=Config.RANKING_TOP_MAX),
+    student_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Students of the exam ranked by percentage, the top `top` ranks or only `student_id`"""
+    result = await session.exec(
+        select(Exam, Class.school_id)
+        .join(Class, Exam.class_id == Class.id)
+        .where(Exam.id == exam_id)
+    )
+    row = result.first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Exam not found")
+    exam, school_id = row
+
+    if scope.is_teacher:
+        current_teacher_id = get_current_teacher_id(scope)
+        if exam.teacher_id != current_teacher_id:
+            raise HTTPException(status_code=403, detail="You are not authorized to view marks for this exam")
+    elif scope.is_principal:
+        if school_id != scope.school_id:
+            raise HTTPException(status_code=403, detail="You are not authorized to view marks for this exam")
+
+    entries = await cached_ranking(session, ("exam", exam_id), school_id, exam_scores(exam_id), [], top, student_id)
+    return RankingResponse(scope=RankScope.CLASS.value, scope_id=exam.class_id, exam_id=exam_id, subject_id=exam.subject_id, term=exam.exam_type, entries=entries)
+
 @router.get("/student/{student_id}/performance")
 async def get_student_performance(
     student_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     student = await session.get(Student, student_id)
     if not student:
@@ -214,12 +304,12 @@ async def get_student_performance(
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher = await get_current_teacher(current_user, session)
-        if class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        current_teacher_id = get_current_teacher_id(scope)
+        if class_.teacher_id != current_teacher_id:
             raise HTTPException(status_code=403, detail="You are not authorized to view this student's performance")
-    elif current_user.role == UserRole.PRINCIPAL:
-        if class_.school_id != current_user.school_id:
+    elif scope.is_principal:
+        if class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="You are not authorized to view this student's performance")
         
     performance_result = await session.exec(
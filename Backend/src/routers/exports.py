@@ -0,0 +1,139 @@
+"""
+Export API endpoints
+Streams attendance, marks and exam results as CSV / NDJSON / XLSX files,
+scoped by the caller's role, school and a date range
+"""
+
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel import or_, select
+
+from src.auth.scope import ScopeContext, get_scope
+from src.models import Attendance, Class, Exam, ExamMarks, Marks, Student, Subject
+from src.services.exports import ExportFormat, stream_export
+
+router = APIRouter()
+
+
+def _class_filters(scope: ScopeContext, school_id: Optional[int], class_id: Optional[int]) -> list:
+    filters = []
+    if scope.is_principal:
+        school_id = scope.school_id
+    elif scope.is_teacher:
+        if scope.teacher_id is None:
+            raise HTTPException(status_code=404, detail="Teacher record not found")
+        school_id = scope.school_id
+
+    if school_id:
+        filters.append(Class.school_id == school_id)
+    if class_id:
+        filters.append(Class.id == class_id)
+    return filters
+
+
+def _date_filters(column, date_from: Optional[date], date_to: Optional[date], is_datetime: bool = False) -> list:
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+
+    filters = []
+    if date_from:
+        filters.append(column >= date_from)
+    if date_to:
+        # whole end day for timestamps
+        filters.append(column < date_to + timedelta(days=1) if is_datetime else column <= date_to)
+    return filters
+
+
+# Export attendance records
+@router.get("/attendance")
+async def export_attendance(
+    format: ExportFormat = ExportFormat.CSV,
+    school_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Stream attendance records as CSV, NDJSON or XLSX"""
+    filters = _class_filters(scope, school_id, class_id) + _date_filters(Attendance.attendance_date, date_from, date_to)
+    if scope.is_teacher:
+        filters.append(Class.id.in_(scope.class_ids | scope.assigned_class_ids))
+
+    statement = (
+        select(
+            Attendance.attendance_date, Class.id, Class.name,
+            Student.id, Student.roll_no, Student.name, Attendance.is_present,
+        )
+        .join(Class, Class.id == Attendance.class_id)
+        .join(Student, Student.id == Attendance.student_id)
+        .where(*filters)
+        .order_by(Attendance.attendance_date, Attendance.class_id, Attendance.student_id)
+    )
+    columns = ["date", "class_id", "class_name", "student_id", "roll_no", "student_name", "is_present"]
+    return stream_export(statement, columns, format, "attendance")
+
+
+# Export subject marks
+@router.get("/marks")
+async def export_marks(
+    format: ExportFormat = ExportFormat.CSV,
+    school_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Stream recorded marks as CSV, NDJSON or XLSX, dated by when they were recorded"""
+    filters = _class_filters(scope, school_id, class_id) + _date_filters(Marks.created_at, date_from, date_to, is_datetime=True)
+    if scope.is_teacher:
+        filters.append(or_(Marks.teacher_id == scope.teacher_id, Class.id.in_(scope.class_ids)))
+
+    statement = (
+        select(
+            Marks.created_at, Class.id, Class.name, Student.id, Student.roll_no, Student.name,
+            Subject.name, Marks.exam_type, Marks.marks,
+        )
+        .join(Class, Class.id == Marks.class_id)
+        .join(Student, Student.id == Marks.student_id)
+        .join(Subject, Subject.id == Marks.subject_id)
+        .where(*filters)
+        .order_by(Marks.id)
+    )
+    columns = ["recorded_at", "class_id", "class_name", "student_id", "roll_no", "student_name", "subject", "exam_type", "marks"]
+    return stream_export(statement, columns, format, "marks")
+
+
+# Export exam results
+@router.get("/exam-results")
+async def export_exam_results(
+    format: ExportFormat = ExportFormat.CSV,
+    school_id: Optional[int] = None,
+    class_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Stream exam marks as CSV, NDJSON or XLSX, dated by the exam date"""
+    filters = _class_filters(scope, school_id, class_id) + _date_filters(Exam.exam_date, date_from, date_to)
+    if scope.is_teacher:
+        filters.append(or_(Exam.teacher_id == scope.teacher_id, Class.id.in_(scope.class_ids)))
+
+    statement = (
+        select(
+            Exam.id, Exam.name, Exam.exam_type, Exam.exam_date, Subject.name, Class.id, Class.name,
+            Student.id, Student.roll_no, Student.name, ExamMarks.marks_obtained, Exam.max_marks,
+        )
+        .join(Exam, Exam.id == ExamMarks.exam_id)
+        .join(Class, Class.id == Exam.class_id)
+        .join(Subject, Subject.id == Exam.subject_id)
+        .join(Student, Student.id == ExamMarks.student_id)
+        .where(*filters)
+        .order_by(ExamMarks.exam_id, ExamMarks.student_id)
+    )
+    columns = [
+        "exam_id", "exam_name", "exam_type", "exam_date", "subject", "class_id", "class_name",
+        "student_id", "roll_no", "student_name", "marks_obtained", "max_marks",
+    ]
+    return stream_export(statement, columns, format, "exam_results")
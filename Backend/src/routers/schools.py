@@ -1,146 +1,124 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlmodel import Session, select, func
 from typing import List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.auth.models import User, UserRole
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
 from src.auth.dependencies import get_current_active_user, require_admin_or_principal, require_admin, require_principal
 from src.db.main import get_session
+from src.db.pagination import PageParams, page_params, paginate
+from src.db.fanout import QueryFanOut, get_primary_fanout
 from src.models.models import (
     Class, Marks, School, District, SchoolCreate, Student, 
     Subject, Teacher, SchoolDetailResponse
 )
+from src.services.data_versions import bump_data_version, DISTRICT, SCHOOLS
+from src.services.response_cache import school_detail_cache
 
 router = APIRouter()
 
 # List all schools -> only district admin can view all schools 
 @router.get("/", response_model=List[School])
 async def list_schools(
+    response: Response,
     district_id: Optional[int] = None,
+    name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin)
+    current_user: UserSnapshot = Depends(require_admin)
 ):
     statement = select(School)
     if district_id is not None:
         statement = statement.where(School.district_id == district_id)
+    if name:
+        statement = statement.where(School.name.icontains(name, autoescape=True))
     
-    result = await session.exec(statement)
-    schools = result.all()
-    return schools
+    return await paginate(
+        session, statement, [School.name, School.id], lambda school: (school.name, school.id), page, response
+    )
 
 # Principals can get their own school
 @router.get("/my-school", response_model=School)
 async def get_my_school(
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_principal)
+    current_user: UserSnapshot = Depends(require_principal)
 ):
     school = await session.get(School, current_user.school_id)
     if not school: 
         raise HTTPException(status_code=404, detail="School not found")
     return school
 
-# ⚠️ IMPORTANT: This endpoint MUST come BEFORE /{school_id}
-# Get detailed school information
-@router.get("/{school_id}/details", response_model=SchoolDetailResponse)
-async def get_school_details(
-    school_id: int,
-    session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
-):
-    """Get detailed school information including stats, teachers, and performance"""
-    
-    # Get school
-    school = await session.get(School, school_id)
-    if not school:
-        raise HTTPException(status_code=404, detail="School not found")
-    
-    # Check access
-    if current_user.role == UserRole.PRINCIPAL and current_user.school_id != school_id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    # Get stats
-    total_students = (await session.exec(
-        select(func.count(Student.id))
-        .join(Class, Student.class_id == Class.id)
-        .where(Class.school_id == school_id)
-    )).first() or 0
-    
-    total_teachers = (await session.exec(
-        select(func.count(Teacher.id))
-        .where(Teacher.school_id == school_id)
-    )).first() or 0
-    
-    total_classes = (await session.exec(
-        select(func.count(Class.id))
-        .where(Class.school_id == school_id)
-    )).first() or 0
-    
-    # Average performance
-    avg_marks = (await session.exec(
-        select(func.avg(Marks.marks))
-        .join(Student, Marks.student_id == Student.id)
-        .join(Class, Student.class_id == Class.id)
-        .where(Class.school_id == school_id)
-    )).first() or 0
-    
-    # Get teachers with their assignments
-    teachers_result = await session.exec(
-        select(Teacher)
+def _class_names_taught(session: AsyncSession):
+    """Names of the classes a teacher (correlated Teacher row) is class teacher of, as one value"""
+    if session.bind.dialect.name == "postgresql":
+        names = func.array_agg(aggregate_order_by(Class.name, Class.id))
+    else:
+        names = func.json_group_array(Class.name)
+    return select(names).where(Class.teacher_id == Teacher.id).correlate(Teacher).scalar_subquery()
+
+
+async def _school_teachers(session: AsyncSession, school_id: int) -> List[Dict[str, Any]]:
+    rows = (await session.exec(
+        select(Teacher.id, Teacher.name, Teacher.email, Teacher.phone, _class_names_taught(session))
         .where(Teacher.school_id == school_id)
+        .order_by(Teacher.id)
         .limit(10)
-    )
-    teachers_list = []
-    for teacher in teachers_result.all():
-        # Get classes taught
-        classes_taught = (await session.exec(
-            select(Class.name)
-            .where(Class.teacher_id == teacher.id)
-        )).all()
-        
-        teachers_list.append({
-            "id": teacher.id,
-            "name": teacher.name,
-            "email": teacher.email,
-            "phone": teacher.phone,
-            "classes": [c for c in classes_taught]
-        })
-    
-    # Get classes
-    classes_result = await session.exec(
-        select(Class)
+    )).all()
+    teachers = []
+    for teacher_id, name, email, phone, taught in rows:
+        # sqlite hands back the json_group_array text
+        if isinstance(taught, str):
+            taught = json.loads(taught)
+        teachers.append({"id": teacher_id, "name": name, "email": email, "phone": phone, "classes": taught or []})
+    return teachers
+
+
+async def _school_details(fanout: QueryFanOut, school_id: int) -> SchoolDetailResponse:
+    # a fixed set of aggregated queries, run concurrently, whatever the school's size
+    schools, stats, teachers, classes, subject_perf = await fanout.gather(
+        select(School).where(School.id == school_id),
+        select(
+            select(func.coalesce(func.sum(Class.student_count), 0))
+            .where(Class.school_id == school_id).scalar_subquery(),
+            select(func.count(Teacher.id))
+            .where(Teacher.school_id == school_id).scalar_subquery(),
+            select(func.count(Class.id))
+            .where(Class.school_id == school_id).scalar_subquery(),
+            select(func.avg(Marks.marks))
+            .join(Student, Marks.student_id == Student.id)
+            .join(Class, Student.class_id == Class.id)
+            .where(Class.school_id == school_id).scalar_subquery(),
+        ),
+        # teachers with the names of their classes aggregated per row
+        lambda session: _school_teachers(session, school_id),
+        select(Class.id, Class.name, Class.grade, Class.section, Class.student_count)
         .where(Class.school_id == school_id)
-    )
-    classes_list = []
-    for class_ in classes_result.all():
-        student_count = (await session.exec(
-            select(func.count(Student.id))
-            .where(Student.class_id == class_.id)
-        )).first() or 0
-        
-        classes_list.append({
-            "id": class_.id,
-            "name": class_.name,
-            "grade": class_.grade,
-            "section": class_.section,
-            "student_count": student_count
-        })
-    
-    # Subject performance
-    subject_perf_result = await session.exec(
+        .order_by(Class.id),
         select(Subject.name, func.avg(Marks.marks))
         .join(Marks, Marks.subject_id == Subject.id)
         .join(Student, Marks.student_id == Student.id)
         .join(Class, Student.class_id == Class.id)
         .where(Class.school_id == school_id)
-        .group_by(Subject.id, Subject.name)
+        .group_by(Subject.id, Subject.name),
     )
-    
-    subject_performance = []
-    for subject_name, avg in subject_perf_result.all():
-        subject_performance.append({
-            "subject": subject_name,
-            "average": round(avg or 0, 1)
-        })
-    
+
+    if not schools:
+        raise HTTPException(status_code=404, detail="School not found")
+    school = schools[0]
+    total_students, total_teachers, total_classes, avg_marks = stats[0]
+
+    classes_list = [
+        {"id": class_id, "name": name, "grade": grade, "section": section, "student_count": student_count}
+        for class_id, name, grade, section, student_count in classes
+    ]
+    subject_performance = [
+        {"subject": subject_name, "average": round(avg or 0, 1)}
+        for subject_name, avg in subject_perf
+    ]
+
     return SchoolDetailResponse(
         id=school.id,
         name=school.name,
@@ -154,17 +132,36 @@ async def get_school_details(
             "total_classes": total_classes,
             "average_performance": round(avg_marks or 0, 1)
         },
-        teachers=teachers_list,
+        teachers=teachers,
         classes=classes_list,
         subject_performance=subject_performance
     )
 
+# ⚠️ IMPORTANT: This endpoint MUST come BEFORE /{school_id}
+# Get detailed school information
+@router.get("/{school_id}/details", response_model=SchoolDetailResponse)
+async def get_school_details(
+    school_id: int,
+    fanout: QueryFanOut = Depends(get_primary_fanout),
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
+):
+    """Get detailed school information including stats, teachers, and performance"""
+    
+    # Check access
+    if current_user.role == UserRole.PRINCIPAL and current_user.school_id != school_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    # the same for every caller allowed to see it, so cached per school until its next write
+    return await school_detail_cache.get_or_compute_for_school(
+        "details", school_id, lambda: _school_details(fanout, school_id)
+    )
+
 # Get a single school by ID
 @router.get("/{school_id}", response_model=School)
 async def get_school(
     school_id: int, 
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
 ):
     school = await session.get(School, school_id)
     if not school:
@@ -180,10 +177,11 @@ async def get_school(
 async def create_school(
     school: SchoolCreate, 
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin)
+    current_user: UserSnapshot = Depends(require_admin)
 ):
     db_school = School(**school.dict())
     session.add(db_school)
+    await bump_data_version(session, DISTRICT, SCHOOLS)
     await session.commit()
     await session.refresh(db_school)
     return db_school
\ No newline at end of file
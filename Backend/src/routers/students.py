@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from sqlmodel import delete, select
 from sqlmodel.ext.asyncio.session import AsyncSession
-from typing import List
+from typing import List, Optional
 from src.db.main import get_session
-from src.auth.models import User, UserRole
-from src.auth.dependencies import get_current_active_user
+from src.db.pagination import PageParams, page_params, paginate
+from src.auth.scope import ScopeContext, get_scope
 from src.models.models import (
     Student, StudentCreate, StudentResponse, 
-    Marks, MarksCreate, Class, Teacher, TeacherAssignment
+    Marks, MarksCreate, Class, Attendance, StudentAttendancePrefix, RosterImportReport, ActivityKind
 )
+from src.services.attendance_rollup import refresh_class_days
+from src.services.marks_aggregate import apply_marks_deltas, remove_student_marks
+from src.services.student_counts import apply_student_count_deltas
+from src.services.roster_import import StudentImporter, import_school_id, run_import
+from src.services.activity import record_activity
+from src.services.data_versions import bump_data_version, conditional_get, ATTENDANCE, CLASSES, MARKS, STUDENTS
 
 router = APIRouter()
 
@@ -17,7 +23,7 @@ router = APIRouter()
 async def create_student(
     student: StudentCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Create a new student"""
 
@@ -25,13 +31,11 @@ async def create_student(
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_results.first()
-        if not teacher or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if scope.teacher_id is None or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == UserRole.PRINCIPAL:
-        if class_.school_id != current_user.school_id:
+    elif scope.is_principal:
+        if class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
     existing_result = await session.exec(
@@ -46,6 +50,9 @@ async def create_student(
     
     db_student = Student(**student.model_dump())
     session.add(db_student)
+    await apply_student_count_deltas(session, [(class_.id, 1)])
+    record_activity(session, class_.school_id, ActivityKind.STUDENT_ADDED, f"Student {db_student.name} added to {class_.name}", scope.user_id, class_.id)
+    await bump_data_version(session, class_.school_id, STUDENTS)
     await session.commit()
     await session.refresh(db_student)
 
@@ -58,83 +65,85 @@ async def create_student(
         date_enrolled=db_student.date_enrolled
     )
 
+# Import a student roster
+@router.post("/import", response_model=RosterImportReport)
+async def import_students(
+    file: UploadFile = File(...),
+    school_id: Optional[int] = None,
+    dry_run: bool = False,
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Import students from a CSV / XLSX roster in one transaction, returns a per-row error report"""
+    if scope.is_teacher and scope.teacher_id is None:
+        raise HTTPException(status_code=404, detail="Teacher record not found")
+
+    school_id = await import_school_id(session, scope, school_id)
+    importer = StudentImporter(school_id, scope.class_ids if scope.is_teacher else None)
+    report = await run_import(session, importer, file, dry_run)
+
+    if report.imported and not dry_run:
+        record_activity(session, school_id, ActivityKind.STUDENTS_IMPORTED, f"{report.imported} students imported", scope.user_id)
+        await bump_data_version(session, school_id, STUDENTS)
+        await session.commit()
+    return report
+
 # List all students in a class
-@router.get("/", response_model=List[StudentResponse])
+@router.get("/", response_model=List[StudentResponse], dependencies=[Depends(conditional_get(STUDENTS, CLASSES))])
 async def list_students(
+    response: Response,
     class_id: int | None = None,
+    name: Optional[str] = None,
+    roll_no: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
-    """List all students in a specific class"""
+    """List students page by page (by name), optionally filtered by class, name or roll number"""
     
-    statement = select(Student)
+    statement = select(Student, Class.name).join(Class, Class.id == Student.class_id)
 
-    if current_user.role == UserRole.TEACHER:
-        teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_results.first()
-        if not teacher:
+    if scope.is_teacher:
+        if scope.teacher_id is None:
             raise HTTPException(status_code=404, detail="Teacher record not found")
         
-        # Get classes where teacher is class teacher
-        class_teacher_result = await session.exec(
-            select(Class.id).where(Class.teacher_id == teacher.id)
-        )
-        class_teacher_classes = list(class_teacher_result.all())
-        
-        # Get classes where teacher has subject assignments
-        subject_teacher_result = await session.exec(
-            select(TeacherAssignment.class_id)
-            .where(TeacherAssignment.teacher_id == teacher.id)
-            .distinct()
-        )
-        subject_teacher_classes = list(subject_teacher_result.all())
-        
-        # Combine both lists (remove duplicates)
-        all_teacher_classes = list(set(class_teacher_classes + subject_teacher_classes))
+        # classes where the teacher is class teacher or has subject assignments
+        all_teacher_classes = list(scope.class_ids | scope.assigned_class_ids)
         
         if not all_teacher_classes:
             return []
         
         statement = statement.where(Student.class_id.in_(all_teacher_classes))
 
-    elif current_user.role == UserRole.PRINCIPAL:
-        school_classes_result = await session.exec(
-            select(Class.id).where(Class.school_id == current_user.school_id)
-        )
-        school_classes = school_classes_result.all()
-        if not school_classes:
-            return []
-        
-        statement = statement.where(Student.class_id.in_(school_classes))
+    elif scope.is_principal:
+        statement = statement.where(Class.school_id == scope.school_id)
     
     if class_id:
         statement = statement.where(Student.class_id == class_id)
+    if name:
+        statement = statement.where(Student.name.icontains(name, autoescape=True))
+    if roll_no:
+        statement = statement.where(Student.roll_no == roll_no)
 
-    students_result = await session.exec(statement)
-    students = students_result.all()    
-
-    #prefetch classes for names
-    class_ids = list({s.class_id for s in students})
-    classes_result = await session.exec(
-        select(Class).where(Class.id.in_(class_ids))
-    )  
-    classes_map = {c.id: c for c in classes_result.all()}
+    students = await paginate(
+        session, statement, [Student.name, Student.id], lambda row: (row[0].name, row[0].id), page, response
+    )
 
     return [StudentResponse(
         id=s.id,
         name=s.name,
         roll_no=s.roll_no,
         class_id=s.class_id,
-        class_name=classes_map.get(s.class_id).name if classes_map.get(s.class_id) else "Unknown",
+        class_name=class_name,
         date_enrolled=s.date_enrolled
-    ) for s in students]    
+    ) for s, class_name in students]    
 
 #get specific student details
 @router.get("/{student_id}", response_model=StudentResponse)
 async def get_student(
     student_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Get detailed student information by ID"""
     student = await session.get(Student, student_id)
@@ -145,13 +154,11 @@ async def get_student(
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_results.first()
-        if not teacher or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if scope.teacher_id is None or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == UserRole.PRINCIPAL:
-        if class_.school_id != current_user.school_id:
+    elif scope.is_principal:
+        if class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied")   
 
     return StudentResponse(
@@ -169,7 +176,7 @@ async def update_student(
     student_id: int,
     student_update: StudentCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Update student information"""
     student = await session.get(Student, student_id)
@@ -180,14 +187,12 @@ async def update_student(
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_results.first()
-        if not teacher or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if scope.teacher_id is None or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-    elif current_user.role == UserRole.PRINCIPAL:
-        if class_.school_id != current_user.school_id:
+    elif scope.is_principal:
+        if class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied")   
     
     if student_update.class_id != student.class_id or student_update.roll_no != student.roll_no:
@@ -205,12 +210,19 @@ async def update_student(
     for key, value in student_update.model_dump().items():
         setattr(student, key, value)
     
+    updated_class = await session.get(Class, student_update.class_id)
     session.add(student)
+    # transfer to another class
+    if student.class_id != class_.id:
+        await apply_student_count_deltas(session, [(class_.id, -1), (student.class_id, 1)])
+        if updated_class:
+            record_activity(session, updated_class.school_id, ActivityKind.STUDENT_UPDATED, f"Student {student.name} moved from {class_.name} to {updated_class.name}", scope.user_id, updated_class.id)
+    else:
+        record_activity(session, class_.school_id, ActivityKind.STUDENT_UPDATED, f"Student {student.name} updated in {class_.name}", scope.user_id, class_.id)
+    await bump_data_version(session, {class_.school_id, updated_class.school_id if updated_class else None}, STUDENTS)
     await session.commit()
     await session.refresh(student)
 
-    updated_class = await session.get(Class, student.class_id)
-
     return StudentResponse(
         id=student.id,
         name=student.name,
@@ -225,7 +237,7 @@ async def update_student(
 async def delete_student(
     student_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Delete a student by ID"""
     student = await session.get(Student, student_id)
@@ -236,17 +248,28 @@ async def delete_student(
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_results.first()
-        if not teacher or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if scope.teacher_id is None or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-    elif current_user.role == UserRole.PRINCIPAL:
-        if class_.school_id != current_user.school_id:
+    elif scope.is_principal:
+        if class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied") 
-           
+
+    # class days the student's attendance rows count towards in the rollup
+    attended_days = (await session.exec(
+        select(Attendance.class_id, Attendance.attendance_date)
+        .where(Attendance.student_id == student_id)
+        .distinct()
+    )).all()
+
+    await remove_student_marks(session, student_id)
+    await session.exec(delete(StudentAttendancePrefix).where(StudentAttendancePrefix.student_id == student_id))
     await session.delete(student)
+    await apply_student_count_deltas(session, [(student.class_id, -1)])
+    await refresh_class_days(session, attended_days)
+    record_activity(session, class_.school_id, ActivityKind.STUDENT_REMOVED, f"Student {student.name} removed from {class_.name}", scope.user_id, class_.id)
+    await bump_data_version(session, class_.school_id, STUDENTS, ATTENDANCE, MARKS)
     await session.commit()  
     return {"message": "Student deleted successfully"}
 
@@ -256,15 +279,13 @@ async def delete_student(
 async def record_marks(
     marks: MarksCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Record marks for a student"""
-    if current_user.role != UserRole.TEACHER:
+    if not scope.is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can record marks")
     
-    teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-    teacher = teacher_results.first()
-    if not teacher:
+    if scope.teacher_id is None:
         raise HTTPException(status_code=404, detail="Teacher record not found") 
     
     student = await session.get(Student, marks.student_id)
@@ -272,16 +293,21 @@ async def record_marks(
         raise HTTPException(status_code=404, detail="Student not found")    
     
     class_ = await session.get(Class, marks.class_id)
-    if not class_ or class_.teacher_id != teacher.id:
+    if not class_ or class_.teacher_id != scope.teacher_id:
         raise HTTPException(status_code=403, detail="Access denied to this class")
     if student.class_id != class_.id:
         raise HTTPException(status_code=400, detail="Student does not belong to this class")
     
     data = marks.model_dump()
-    data['teacher_id'] = teacher.id
+    data['teacher_id'] = scope.teacher_id
     db_marks = Marks(**data)
 
     session.add(db_marks)
+    await apply_marks_deltas(session, [
+        ((class_.school_id, class_.id, db_marks.subject_id, db_marks.exam_type), db_marks.marks, 1)
+    ])
+    record_activity(session, class_.school_id, ActivityKind.MARKS_SUBMITTED, f"{db_marks.exam_type.value.title()} marks recorded for {student.name} in {class_.name}", scope.user_id, class_.id)
+    await bump_data_version(session, class_.school_id, MARKS)
     await session.commit()
     await session.refresh(db_marks)
 
@@ -293,7 +319,7 @@ async def get_student_marks(
     student_id: int,
     subject_id: int | None = None,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Get all marks for a specific student"""
     student = await session.get(Student, student_id)
@@ -304,14 +330,12 @@ async def get_student_marks(
     if not class_:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if current_user.role == UserRole.TEACHER:
-        teacher_results = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        teacher = teacher_results.first()
-        if not teacher or class_.teacher_id != teacher.id:
+    if scope.is_teacher:
+        if scope.teacher_id is None or class_.teacher_id != scope.teacher_id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-    elif current_user.role == UserRole.PRINCIPAL:
-        if class_.school_id != current_user.school_id:
+    elif scope.is_principal:
+        if class_.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied")
     
     statement = select(Marks).where(Marks.student_id == student_id)
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlmodel import select
-from typing import List
-from src.auth.models import User, UserRole
+from typing import List, Optional
+from src.auth.user_cache import UserSnapshot
 from src.auth.dependencies import get_current_active_user, require_admin_or_principal
 from src.db.main import get_session
+from src.db.pagination import PageParams, page_params, paginate
 from src.models.models import Subject, SubjectCreate, SubjectUpdate
+from src.services.data_versions import bump_data_version, conditional_get, DISTRICT, SUBJECTS
 
 router = APIRouter()
 
@@ -14,30 +16,38 @@ router = APIRouter()
 async def create_subject(
     subject: SubjectCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
 ):
     db_subject = Subject(**subject.dict())
     session.add(db_subject)
+    await bump_data_version(session, DISTRICT, SUBJECTS)
     await session.commit()
     await session.refresh(db_subject)
     return db_subject
 
 # List all subjects
-@router.get("/", response_model=List[Subject])
+@router.get("/", response_model=List[Subject], dependencies=[Depends(conditional_get(SUBJECTS))])
 async def list_subjects(
+    response: Response,
+    name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
     ):
-    result = await session.exec(select(Subject))
-    subjects = result.all()
-    return subjects
+    statement = select(Subject)
+    if name:
+        statement = statement.where(Subject.name.icontains(name, autoescape=True))
+
+    return await paginate(
+        session, statement, [Subject.name, Subject.id], lambda subject: (subject.name, subject.id), page, response
+    )
 
 # Get a single subject by ID
 @router.get("/{subject_id}", response_model=Subject)
 async def get_subject(
     subject_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
     ):
     subject = await session.get(Subject, subject_id)
     if not subject:
@@ -50,7 +60,7 @@ async def update_subject(
     subject_id: int, 
     subject_update: SubjectUpdate, 
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
     ):
     subject = await session.get(Subject, subject_id)
     if not subject:
@@ -60,6 +70,7 @@ async def update_subject(
         setattr(subject, field, value)
     
     session.add(subject)
+    await bump_data_version(session, DISTRICT, SUBJECTS)
     await session.commit()
     await session.refresh(subject)
     return subject
@@ -69,12 +80,13 @@ async def update_subject(
 async def delete_subject(
     subject_id: int, 
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
     ):
     subject = await session.get(Subject, subject_id)
     if not subject:
         raise HTTPException(status_code=404, detail="Subject not found")
     
-    session.delete(subject)
+    await session.delete(subject)
+    await bump_data_version(session, DISTRICT, SUBJECTS)
     await session.commit()
     return {"message": "Subject deleted successfully"}
@@ -5,9 +5,12 @@ from typing import Any, Dict, List
 from pydantic import BaseModel
 
 from src.db.main import get_session
-from src.auth.models import User, UserRole
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
 from src.auth.dependencies import get_current_active_user, require_admin_or_principal
+from src.auth.scope import ScopeContext, get_scope
 from src.models.models import TeacherAssignment, Teacher, Subject, Class
+from src.services.data_versions import bump_data_version, ASSIGNMENTS
 
 router = APIRouter()
 
@@ -22,7 +25,7 @@ class TeacherAssignmentCreate(BaseModel):
 async def create_teacher_assignment(
     assignment_data: TeacherAssignmentCreate,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
 ):
     """Assign a teacher to teach a subject in a class"""
     # Verify teacher exists
@@ -66,6 +69,7 @@ async def create_teacher_assignment(
         subject_id=assignment_data.subject_id
     )
     session.add(assignment)
+    await bump_data_version(session, class_.school_id, ASSIGNMENTS)
     await session.commit()
     await session.refresh(assignment)
     
@@ -76,7 +80,7 @@ async def create_teacher_assignment(
 async def get_class_assignments(
     class_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
     """Get all teacher assignments for a class"""
     class_ = await session.get(Class, class_id)
@@ -97,7 +101,7 @@ async def get_class_assignments(
 async def delete_assignment(
     assignment_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
 ):
     """Delete a teacher assignment"""
     assignment = await session.get(TeacherAssignment, assignment_id)
@@ -105,12 +109,13 @@ async def delete_assignment(
         raise HTTPException(status_code=404, detail="Assignment not found")
     
     # Verify access
+    class_ = await session.get(Class, assignment.class_id)
     if current_user.role == UserRole.PRINCIPAL:
-        class_ = await session.get(Class, assignment.class_id)
         if class_ and class_.school_id != current_user.school_id:
             raise HTTPException(status_code=403, detail="Access denied")
     
     await session.delete(assignment)
+    await bump_data_version(session, class_.school_id if class_ else None, ASSIGNMENTS)
     await session.commit()
     
     return {"message": "Assignment deleted successfully"}
@@ -119,22 +124,16 @@ async def delete_assignment(
 @router.get("/me/subjects")
 async def get_my_teacher_subjects(
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ) -> List[Dict[str, Any]]:
     """
     Get all subjects assigned to the currently logged-in teacher.
     Returns class, subject, and related info.
     """
-    if current_user.role != UserRole.TEACHER:
+    if not scope.is_teacher:
         raise HTTPException(status_code=403, detail="Only teachers can access this endpoint")
     
-    # Find teacher by email (since user.id != teacher.id)
-    teacher_result = await session.exec(
-        select(Teacher).where(Teacher.email == current_user.email)
-    )
-    teacher = teacher_result.first()
-    
-    if not teacher:
+    if scope.teacher_id is None:
         raise HTTPException(
             status_code=404, 
             detail="Teacher profile not found. Please contact your administrator."
@@ -149,7 +148,7 @@ async def get_my_teacher_subjects(
         )
         .join(Class, Class.id == TeacherAssignment.class_id)
         .join(Subject, Subject.id == TeacherAssignment.subject_id)
-        .where(TeacherAssignment.teacher_id == teacher.id)
+        .where(TeacherAssignment.teacher_id == scope.teacher_id)
     )
 
     result = await session.exec(query)
@@ -176,7 +175,7 @@ async def get_my_teacher_subjects(
 async def get_teacher_subjects(
     teacher_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ) -> List[Dict[str, Any]]:
     """
     Get all subjects assigned to a specific teacher.
@@ -189,18 +188,13 @@ async def get_teacher_subjects(
         raise HTTPException(status_code=404, detail="Teacher not found")
     
     # Ensure principal is accessing within their school
-    if current_user.role == UserRole.PRINCIPAL:
-        if teacher.school_id != current_user.school_id:
+    if scope.is_principal:
+        if teacher.school_id != scope.school_id:
             raise HTTPException(status_code=403, detail="Access denied")
     
     # Teachers can only view their own data
-    if current_user.role == UserRole.TEACHER:
-        teacher_self_result = await session.exec(
-            select(Teacher).where(Teacher.email == current_user.email)
-        )
-        self_teacher = teacher_self_result.first()
-        if not self_teacher or self_teacher.id != teacher_id:
-            raise HTTPException(status_code=403, detail="Access denied")
+    if scope.is_teacher and scope.teacher_id != teacher_id:
+        raise HTTPException(status_code=403, detail="Access denied")
 
     # Query all assignments for this teacher
     query = (
@@ -1,22 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import select, func
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile
+from sqlmodel import select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from typing import List, Dict, Any, Optional
 from src.db.main import get_session
+from src.db.pagination import PageParams, page_params, paginate
 from src.auth.dependencies import get_current_active_user, require_admin_or_principal
-from src.auth.models import User, UserRole
-from src.models.models import Teacher, Class, ClassResponse, Student
+from src.auth.scope import ScopeContext, get_scope
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
+from src.models.models import Teacher, Class, ClassResponse, RosterImportReport, ActivityKind
+from src.services.roster_import import TeacherImporter, import_school_id, run_import
+from src.services.activity import record_activity
+from src.routers.classes import class_response
+from src.services.data_versions import bump_data_version, conditional_get, CLASSES, TEACHERS
 
 router = APIRouter()
 
 #List all teachers 
-@router.get("/", response_model=List[Teacher])
+@router.get("/", response_model=List[Teacher], dependencies=[Depends(conditional_get(TEACHERS))])
 async def list_teachers(
+    response: Response,
     school_id: Optional[int] = None,
+    name: Optional[str] = None,
+    page: PageParams = Depends(page_params),
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(get_current_active_user)
 ):
-    """List all teachers, optionally filtered by school_id"""
+    """List teachers page by page (by name), optionally filtered by school_id or name"""
     statement = select(Teacher)
     
     if current_user.role == UserRole.PRINCIPAL:
@@ -24,93 +34,76 @@ async def list_teachers(
 
     if school_id:
         statement = statement.where(Teacher.school_id == school_id)
+    if name:
+        statement = statement.where(Teacher.name.icontains(name, autoescape=True))
 
-    result = await session.exec(statement)
-    teachers = result.all()
-    return teachers
+    return await paginate(
+        session, statement, [Teacher.name, Teacher.id], lambda teacher: (teacher.name, teacher.id), page, response
+    )
 
-# get classes for a specific teacher
-@router.get("/{teacher_id}/classes", response_model=List[ClassResponse])
-async def get_teacher_classes(
-    teacher_id: int,
+# Import a teacher roster
+@router.post("/import", response_model=RosterImportReport)
+async def import_teachers(
+    file: UploadFile = File(...),
+    school_id: Optional[int] = None,
+    dry_run: bool = False,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    current_user: UserSnapshot = Depends(require_admin_or_principal),
+    scope: ScopeContext = Depends(get_scope)
 ):
-    """Get classes assigned to a specific teacher"""
-    teacher = await session.get(Teacher, teacher_id)
-    if not teacher:
-        raise HTTPException(status_code=404, detail="Teacher not found")
-    
-    if current_user.role == UserRole.PRINCIPAL and teacher.school_id != current_user.school_id:
-        raise HTTPException(status_code=403, detail="Access denied")
+    """Import teachers from a CSV / XLSX roster in one transaction, returns a per-row error report"""
+    school_id = await import_school_id(session, scope, school_id)
+    report = await run_import(session, TeacherImporter(school_id), file, dry_run)
 
-    elif current_user.role == UserRole.TEACHER:
-        result = await session.exec(select(Teacher).where(Teacher.email == current_user.email))
-        current_teacher = result.first()
-        if not current_teacher or current_teacher.id != teacher_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-    classes_result = await session.exec(
-        select(Class).where(Class.teacher_id == teacher_id)
-    )
-    classes = classes_result.all()
-
-    response = []
-    for class_ in classes:
-        student_count = await session.exec(
-            select(func.count(Student.id)).where(Student.class_id == class_.id)
-        )
-        count = student_count.first() or 0
-        response.append(ClassResponse(
-            id=class_.id,
-            name=class_.name,
-            grade=class_.grade,
-            section=class_.section,
-            school_id=class_.school_id,
-            teacher_id=class_.teacher_id,
-            teacher_name=teacher.name,
-            student_count=count
-        ))
-    
-    return response
+    if report.imported and not dry_run:
+        record_activity(session, school_id, ActivityKind.TEACHERS_IMPORTED, f"{report.imported} teachers imported", current_user.id)
+        await bump_data_version(session, school_id, TEACHERS)
+        await session.commit()
+    return report
 
 #get classes for the current teacher
+# (declared before /{teacher_id}/classes so "me" is not parsed as a teacher id)
 @router.get("/me/classes", response_model=List[ClassResponse])
 async def get_my_classes(
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(get_current_active_user)
+    scope: ScopeContext = Depends(get_scope)
 ):
     """Get classes assigned to the current logged-in teacher"""
-    if current_user.role != UserRole.TEACHER:
+    if not scope.is_teacher:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    teacher = await session.exec(select(Teacher).where(Teacher.email == current_user.email)).first()
-    if not teacher:
+    if scope.teacher_id is None:
         raise HTTPException(status_code=404, detail="Teacher record not found")
 
-    classes_result = await session.exec(
-        select(Class).where(Class.teacher_id == teacher.id)
-    )
-    classes = classes_result.all()
+    classes = (await session.exec(
+        select(Class, Teacher.name)
+        .join(Teacher, Teacher.id == Class.teacher_id)
+        .where(Class.teacher_id == scope.teacher_id)
+    )).all()
+
+    return [class_response(class_, teacher_name) for class_, teacher_name in classes]
 
-    response = []
-    for class_ in classes:
-        student_count = await session.exec(
-            select(func.count(Student.id)).where(Student.class_id == class_.id)
-        )
-        count = student_count.first() or 0
-        response.append(ClassResponse(
-            id=class_.id,
-            name=class_.name,
-            grade=class_.grade,
-            section=class_.section,
-            school_id=class_.school_id,
-            teacher_id=class_.teacher_id,
-            teacher_name=teacher.name,
-            student_count=student_count
-        ))
+# get classes for a specific teacher
+@router.get("/{teacher_id}/classes", response_model=List[ClassResponse])
+async def get_teacher_classes(
+    teacher_id: int,
+    session: AsyncSession = Depends(get_session),
+    scope: ScopeContext = Depends(get_scope)
+):
+    """Get classes assigned to a specific teacher"""
+    teacher = await session.get(Teacher, teacher_id)
+    if not teacher:
+        raise HTTPException(status_code=404, detail="Teacher not found")
     
-    return response
+    if scope.is_principal and teacher.school_id != scope.school_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    elif scope.is_teacher and scope.teacher_id != teacher_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+        
+    classes = (await session.exec(select(Class).where(Class.teacher_id == teacher_id))).all()
+
+    return [class_response(class_, teacher.name) for class_ in classes]
 
 # Assign teacher to a class
 @router.put("/classes/{class_id}/assign/{teacher_id}")
@@ -118,7 +111,7 @@ async def assign_teacher_to_class(
     class_id: int,
     teacher_id: int,
     session: AsyncSession = Depends(get_session),
-    current_user: User = Depends(require_admin_or_principal)
+    current_user: UserSnapshot = Depends(require_admin_or_principal)
 ):
     """Assign a teacher to a class. Only admins can perform this action."""
     class_ = await session.get(Class, class_id)
@@ -135,6 +128,8 @@ async def assign_teacher_to_class(
     
     class_.teacher_id = teacher_id
     session.add(class_)
+    record_activity(session, class_.school_id, ActivityKind.TEACHER_ASSIGNED, f"{teacher.name} assigned to {class_.name}", current_user.id, class_.id)
+    await bump_data_version(session, class_.school_id, CLASSES)
     await session.commit()
     await session.refresh(class_)
     
@@ -5,10 +5,8 @@ Creates demo users for testing the authentication system
 
 import asyncio
 from sqlmodel import select
-from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
 
-from src.db.main import async_engine, init_db
+from src.db.main import async_session_maker, init_db
 from src.auth.models import User, UserRole, UserStatus
 from src.auth.security import security
 from src.models import School
@@ -21,14 +19,7 @@ async def seed_auth_data():
     # Ensure tables exist
     await init_db()
 
-    # Session factory
-    SessionLocal = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
-
-    async with SessionLocal() as session:
+    async with async_session_maker() as session:
         # ✅ Check if users already exist
         result = await session.exec(select(User))
         existing_users = result.all()
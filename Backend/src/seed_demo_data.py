@@ -7,10 +7,12 @@ import asyncio
 from datetime import date, timedelta
 import random
 from sqlmodel import select
-from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
 
-from src.db.main import async_engine, init_db
+from src.db.main import async_session_maker, init_db
+from src.services.attendance_prefix import rebuild_student_attendance_prefix
+from src.services.attendance_rollup import rebuild_class_daily_attendance
+from src.services.marks_aggregate import rebuild_marks_aggregate
+from src.services.student_counts import reconcile_student_counts
 from src.models.models import ExamType
 from src.models import (
     District, School, Teacher, Class, Student, Subject,
@@ -21,13 +23,7 @@ from src.models import (
 async def seed_demo_data():
     await init_db()
 
-    SessionLocal = sessionmaker(
-        bind=async_engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
-
-    async with SessionLocal() as session:
+    async with async_session_maker() as session:
         # ✅ District
         district_name = "Karnal District"
         district = (await session.exec(select(District).where(District.name == district_name))).first()
@@ -152,6 +148,7 @@ async def seed_demo_data():
                     )
                     roll_counter += 1
             await session.commit()
+            await reconcile_student_counts(session)
             print("✅ Students seeded")
 
         students = (await session.exec(select(Student))).all()
@@ -202,6 +199,7 @@ async def seed_demo_data():
                         marks_obtained=marks_obtained
                     ))
             await session.commit()
+            await rebuild_marks_aggregate(session)
             print("✅ Exam Marks seeded")
 
         # ✅ Attendance (10 days)
@@ -218,6 +216,8 @@ async def seed_demo_data():
                         )
                     )
             await session.commit()
+            await rebuild_class_daily_attendance(session)
+            await rebuild_student_attendance_prefix(session)
             print("✅ Attendance seeded")
 
         print("\n🎓 Dense demo data seeded successfully for Karnal District!")
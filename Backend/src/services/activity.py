@@ -0,0 +1,245 @@
+"""
+Activity feed
+Write endpoints record compact events (attendance marked, exam created,
+marks submitted, students and teachers changed) that go into the
+activity_event table in the write's own transaction. Events are staged on the
+session and written by the transaction's bump_data_version call. On Postgres
+they ride in the same statement as the version upsert, so the write makes no
+extra round trip. Events still staged at commit (a write that did not bump)
+are inserted on their own just before it. Committed events are also appended
+to a bounded ring buffer per school, which serves the newest page of the feed
+without touching the database. Older pages are read from the table with a
+keyset cursor.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Deque, Dict, FrozenSet, List, Optional
+
+from cachetools import TTLCache
+from fastapi import HTTPException, Response
+from sqlalchemy import event, insert, or_
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from src.models import ActivityEvent
+from src.models.models import ActivityKind
+
+_STAGED_KEY = "staged_activity_events"
+_WRITTEN_KEY = "written_activity_events"
+
+_COLUMNS = list(ActivityEvent.__table__.c)
+
+# (type, icon) the dashboard shows per kind
+_PRESENTATION = {
+    ActivityKind.ATTENDANCE_MARKED: ("success", "check"),
+    ActivityKind.EXAM_CREATED: ("info", "exam"),
+    ActivityKind.MARKS_SUBMITTED: ("success", "grade"),
+    ActivityKind.STUDENT_ADDED: ("info", "user"),
+    ActivityKind.STUDENT_UPDATED: ("info", "user"),
+    ActivityKind.STUDENT_REMOVED: ("warning", "user"),
+    ActivityKind.STUDENTS_IMPORTED: ("info", "upload"),
+    ActivityKind.TEACHERS_IMPORTED: ("info", "upload"),
+    ActivityKind.TEACHER_ASSIGNED: ("info", "user"),
+}
+
+
+def record_activity(
+        session: AsyncSession,
+        school_id: Optional[int],
+        kind: ActivityKind,
+        message: str,
+        actor_id: Optional[int] = None,
+        class_id: Optional[int] = None
+    ):
+    """Stage an event, written by the transaction's next bump_data_version call or else at commit"""
+    if school_id is None:
+        return
+    session.info.setdefault(_STAGED_KEY, []).append({
+        "school_id": school_id,
+        "class_id": class_id,
+        "actor_id": actor_id,
+        "kind": kind.value,
+        "message": message,
+        "created_at": datetime.utcnow(),
+    })
+
+
+def _insert_events(events: List[Dict[str, Any]]):
+    return insert(ActivityEvent).values(events).returning(*_COLUMNS)
+
+
+async def execute_with_activity(session: AsyncSession, statement):
+    """Execute `statement` together with the events staged on the session"""
+    events = session.info.pop(_STAGED_KEY, None)
+    if not events:
+        await session.exec(statement)
+        return
+
+    stmt = _insert_events(events)
+    if session.bind.dialect.name == "postgresql":
+        # one statement: `statement` runs as a data-modifying CTE of the event insert
+        written = (await session.exec(stmt.add_cte(statement.cte("alongside")))).all()
+    else:
+        await session.exec(statement)
+        written = (await session.exec(stmt)).all()
+    session.info.setdefault(_WRITTEN_KEY, []).extend(written)
+
+
+@dataclass(frozen=True)
+class FeedScope:
+    """Whose events a feed shows: a school's (None for the whole district), optionally only some classes' and the user's own"""
+    school_id: Optional[int] = None
+    class_ids: Optional[FrozenSet[int]] = None
+    actor_id: Optional[int] = None
+
+    def filters(self) -> list:
+        filters = []
+        if self.school_id is not None:
+            filters.append(ActivityEvent.school_id == self.school_id)
+        if self.class_ids is not None:
+            filters.append(or_(ActivityEvent.class_id.in_(self.class_ids), ActivityEvent.actor_id == self.actor_id))
+        return filters
+
+    def matches(self, row: Row) -> bool:
+        if self.school_id is not None and row.school_id != self.school_id:
+            return False
+        return self.class_ids is None or row.class_id in self.class_ids or row.actor_id == self.actor_id
+
+
+class ActivityBuffer:
+    """
+    Newest committed events per school, and for the whole district under
+    None, in bounded deques (oldest first). A deque is loaded from the table
+    on first use and reloaded after the TTL, which bounds how long events
+    committed by other processes can be missing.
+    """
+
+    def __init__(self, size: int, ttl: float, maxsize: int):
+        self.size = size
+        self._rings: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def append(self, rows: List[Row]):
+        """Add committed events to the loaded deques they belong to, unloaded ones read them from the table"""
+        for row in rows:
+            for key in (row.school_id, None):
+                ring = self._rings.get(key)
+                if ring is None:
+                    continue
+                if ring and row.id <= ring[-1].id:
+                    # already there when the deque was loaded after this commit
+                    if any(loaded.id == row.id for loaded in ring):
+                        continue
+                    # transactions can commit out of id order
+                    ring = deque(sorted([*ring, row], key=lambda r: r.id), maxlen=self.size)
+                    self._rings[key] = ring
+                else:
+                    ring.append(row)
+
+    async def _ring(self, session: AsyncSession, school_id: Optional[int]) -> Deque[Row]:
+        ring = self._rings.get(school_id)
+        if ring is not None:
+            self.hits += 1
+            return ring
+
+        self.misses += 1
+        statement = select(*_COLUMNS).order_by(ActivityEvent.id.desc()).limit(self.size)
+        if school_id is not None:
+            statement = statement.where(ActivityEvent.school_id == school_id)
+        rows = (await session.exec(statement)).all()
+        ring = deque(reversed(rows), maxlen=self.size)
+        self._rings[school_id] = ring
+        return ring
+
+    async def newest(self, session: AsyncSession, scope: FeedScope, limit: int) -> Optional[List[Row]]:
+        """Up to limit + 1 of the scope's newest events, None when the deque may not hold enough of them"""
+        ring = await self._ring(session, scope.school_id)
+        rows = [row for row in reversed(ring) if scope.matches(row)]
+        if len(rows) > limit or len(ring) < self.size:
+            return rows[:limit + 1]
+        return None
+
+    def clear(self):
+        self._rings.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "schools": len(self._rings),
+            "max_schools": self._rings.maxsize,
+            "events_per_school": self.size,
+            "ttl_seconds": self._rings.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+activity_buffer = ActivityBuffer(Config.ACTIVITY_BUFFER_SIZE, Config.ACTIVITY_BUFFER_TTL_SECONDS, Config.ACTIVITY_BUFFER_MAX_SCHOOLS)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_leftover_events(session: Session):
+    events = session.info.pop(_STAGED_KEY, None)
+    if events:
+        written = session.execute(_insert_events(events)).all()
+        session.info.setdefault(_WRITTEN_KEY, []).extend(written)
+
+
+@event.listens_for(Session, "after_commit")
+def _buffer_on_commit(session: Session):
+    written = session.info.pop(_WRITTEN_KEY, None)
+    if written:
+        activity_buffer.append(written)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session):
+    session.info.pop(_STAGED_KEY, None)
+    session.info.pop(_WRITTEN_KEY, None)
+
+
+async def activity_page(session: AsyncSession, scope: FeedScope, limit: int, cursor: Optional[str], response: Response) -> List[Row]:
+    """
+    One page of the scope's events, newest first. The first page comes from
+    the ring buffer when it holds enough; the next page's cursor goes in
+    the X-Next-Cursor header.
+    """
+    rows = None
+    if cursor is None and limit < activity_buffer.size:
+        rows = await activity_buffer.newest(session, scope, limit)
+
+    if rows is None:
+        statement = select(*_COLUMNS).where(*scope.filters())
+        if cursor is not None:
+            before = decode_cursor(cursor, 1)[0]
+            if not isinstance(before, int):
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            statement = statement.where(ActivityEvent.id < before)
+        rows = (await session.exec(statement.order_by(ActivityEvent.id.desc()).limit(limit + 1))).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([rows[-1].id])
+    return rows
+
+
+def present(row: Row) -> Dict[str, Any]:
+    """An event as the dashboard shows it"""
+    kind = ActivityKind(row.kind)
+    type_, icon = _PRESENTATION[kind]
+    return {
+        "id": row.id,
+        "kind": kind.value,
+        "type": type_,
+        "message": row.message,
+        "timestamp": row.created_at.isoformat(),
+        "icon": icon,
+    }
@@ -0,0 +1,314 @@
+"""
+Alerts
+Low attendance / low performance alerts for schools, classes and students,
+evaluated in the background instead of on every dashboard poll. The rules
+(threshold and window per school and alert kind) of the evaluated schools
+are compiled into one aggregated query whose matches are upserted into the
+alert table, so an alert keeps its id and first_seen time while its
+condition holds and is removed once it no longer does. Every school is
+re-evaluated on a schedule, and shortly after writes to its attendance or
+marks.
+"""
+
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set
+
+from sqlalchemy import Float, Integer, String, case, cast, delete, func, literal, null, true, union_all
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.main import async_session_maker
+from src.db.upsert import dialect_insert
+from src.models import Alert, AlertRule, Class, ClassDailyAttendance, Marks, MarksAggregate, School, Student, StudentAttendancePrefix
+from src.models.models import AlertKind
+from src.services.marks_aggregate import average_marks
+
+# school_id of district wide rules
+DISTRICT = 0
+
+# who sees which alerts
+ADMIN_KINDS = (AlertKind.SCHOOL_ATTENDANCE, AlertKind.SCHOOL_PERFORMANCE)
+PRINCIPAL_KINDS = (AlertKind.CLASS_ATTENDANCE, AlertKind.CLASS_PERFORMANCE)
+TEACHER_KINDS = (AlertKind.STUDENT_ATTENDANCE, AlertKind.STUDENT_PERFORMANCE)
+
+MESSAGES = {
+    AlertKind.SCHOOL_ATTENDANCE: "Low attendance detected at {name}",
+    AlertKind.SCHOOL_PERFORMANCE: "Low performance detected at {name}",
+    AlertKind.CLASS_ATTENDANCE: "Low attendance detected in class {name}",
+    AlertKind.CLASS_PERFORMANCE: "Low performance detected in class {name}",
+    AlertKind.STUDENT_ATTENDANCE: "Low attendance detected for student {name}",
+    AlertKind.STUDENT_PERFORMANCE: "Declining performance detected for student {name}",
+}
+
+_COLUMNS = ["kind", "school_id", "class_id", "target_id", "target_name", "value", "threshold", "first_seen", "last_seen"]
+
+# schools written to since their last evaluation
+_dirty_school_ids: Set[int] = set()
+_dirty = asyncio.Event()
+
+
+def default_rules() -> Dict[AlertKind, AlertRule]:
+    """The Config defaults, used for kinds without a district or school rule"""
+    attendance = Config.ALERT_ATTENDANCE_THRESHOLD
+    performance = Config.ALERT_PERFORMANCE_THRESHOLD
+    thresholds = {
+        AlertKind.SCHOOL_ATTENDANCE: attendance,
+        AlertKind.SCHOOL_PERFORMANCE: performance,
+        AlertKind.CLASS_ATTENDANCE: attendance,
+        AlertKind.CLASS_PERFORMANCE: performance,
+        AlertKind.STUDENT_ATTENDANCE: Config.ALERT_STUDENT_ATTENDANCE_THRESHOLD,
+        AlertKind.STUDENT_PERFORMANCE: performance,
+    }
+    return {
+        kind: AlertRule(school_id=None, kind=kind.value, threshold=threshold, window_days=Config.ALERT_ATTENDANCE_WINDOW_DAYS)
+        for kind, threshold in thresholds.items()
+    }
+
+
+async def effective_rules(session: AsyncSession, school_ids: Sequence[int]) -> Dict[int, Dict[AlertKind, AlertRule]]:
+    """Per school and kind the rule that applies: the school's, else the district's, else the default"""
+    rows = (await session.exec(
+        select(AlertRule).where(AlertRule.school_id.in_([DISTRICT, *school_ids]))
+    )).all()
+
+    district = default_rules()
+    by_school: Dict[int, Dict[AlertKind, AlertRule]] = {school_id: {} for school_id in school_ids}
+    for rule in rows:
+        if rule.kind not in AlertKind._value2member_map_:
+            continue
+        if rule.school_id == DISTRICT:
+            district[AlertKind(rule.kind)] = rule
+        else:
+            by_school[rule.school_id][AlertKind(rule.kind)] = rule
+    return {school_id: {**district, **rules} for school_id, rules in by_school.items()}
+
+
+class _Compiled:
+    """One alert kind's per school thresholds / windows as CASE expressions over a school id column"""
+
+    def __init__(self, rules: Dict[int, Dict[AlertKind, AlertRule]], kind: AlertKind, today: date):
+        self.kind = kind
+        self.school_ids = [school_id for school_id, school_rules in rules.items() if school_rules[kind].enabled]
+        self._thresholds = {school_id: rules[school_id][kind].threshold for school_id in self.school_ids}
+        self._since = {school_id: today - timedelta(days=rules[school_id][kind].window_days) for school_id in self.school_ids}
+
+    def threshold(self, school_column):
+        return cast(case(self._thresholds, value=school_column), Float)
+
+    def since(self, school_column):
+        return case(self._since, value=school_column)
+
+    def columns(self, school_column, class_column, target_column, name_column, value):
+        return (
+            cast(literal(self.kind.value), String).label("kind"),
+            school_column.label("school_id"),
+            class_column.label("class_id"),
+            target_column.label("target_id"),
+            name_column.label("target_name"),
+            cast(value, Float).label("value"),
+            self.threshold(school_column).label("threshold"),
+        )
+
+
+def _attendance_rate():
+    return func.sum(ClassDailyAttendance.present) * 100.0 / func.nullif(func.sum(ClassDailyAttendance.total), 0)
+
+
+def _school_attendance(rule: _Compiled, today: date):
+    school_id = ClassDailyAttendance.school_id
+    return (
+        select(*rule.columns(school_id, cast(null(), Integer), school_id, School.name, _attendance_rate()))
+        .select_from(ClassDailyAttendance)
+        .join(School, School.id == school_id)
+        .where(school_id.in_(rule.school_ids))
+        .where(ClassDailyAttendance.attendance_date.between(rule.since(school_id), today))
+        .group_by(school_id, School.name)
+        .having(_attendance_rate() < rule.threshold(school_id))
+    )
+
+
+def _class_attendance(rule: _Compiled, today: date):
+    school_id = ClassDailyAttendance.school_id
+    return (
+        select(*rule.columns(school_id, Class.id, Class.id, Class.name, _attendance_rate()))
+        .select_from(ClassDailyAttendance)
+        .join(Class, Class.id == ClassDailyAttendance.class_id)
+        .where(school_id.in_(rule.school_ids))
+        .where(ClassDailyAttendance.attendance_date.between(rule.since(school_id), today))
+        .group_by(school_id, Class.id, Class.name)
+        .having(_attendance_rate() < rule.threshold(school_id))
+    )
+
+
+def _student_attendance(rule: _Compiled, today: date):
+    school_id = Class.school_id
+    rate = func.sum(StudentAttendancePrefix.present) * 100.0 / func.nullif(func.sum(StudentAttendancePrefix.total), 0)
+    return (
+        select(*rule.columns(school_id, Student.class_id, Student.id, Student.name, rate))
+        .select_from(StudentAttendancePrefix)
+        .join(Student, Student.id == StudentAttendancePrefix.student_id)
+        .join(Class, Class.id == Student.class_id)
+        .where(school_id.in_(rule.school_ids))
+        .where(StudentAttendancePrefix.attendance_date.between(rule.since(school_id), today))
+        .group_by(school_id, Student.class_id, Student.id, Student.name)
+        .having(rate < rule.threshold(school_id))
+    )
+
+
+def _school_performance(rule: _Compiled, today: date):
+    school_id = MarksAggregate.school_id
+    return (
+        select(*rule.columns(school_id, cast(null(), Integer), school_id, School.name, average_marks))
+        .select_from(MarksAggregate)
+        .join(School, School.id == school_id)
+        .where(school_id.in_(rule.school_ids))
+        .group_by(school_id, School.name)
+        .having(average_marks < rule.threshold(school_id))
+    )
+
+
+def _class_performance(rule: _Compiled, today: date):
+    school_id = MarksAggregate.school_id
+    return (
+        select(*rule.columns(school_id, Class.id, Class.id, Class.name, average_marks))
+        .select_from(MarksAggregate)
+        .join(Class, Class.id == MarksAggregate.class_id)
+        .where(school_id.in_(rule.school_ids))
+        .group_by(school_id, Class.id, Class.name)
+        .having(average_marks < rule.threshold(school_id))
+    )
+
+
+def _student_performance(rule: _Compiled, today: date):
+    school_id = Class.school_id
+    return (
+        select(*rule.columns(school_id, Student.class_id, Student.id, Student.name, func.avg(Marks.marks)))
+        .select_from(Marks)
+        .join(Student, Student.id == Marks.student_id)
+        .join(Class, Class.id == Student.class_id)
+        .where(school_id.in_(rule.school_ids))
+        .group_by(school_id, Student.class_id, Student.id, Student.name)
+        .having(func.avg(Marks.marks) < rule.threshold(school_id))
+    )
+
+
+_KIND_QUERIES = {
+    AlertKind.SCHOOL_ATTENDANCE: _school_attendance,
+    AlertKind.SCHOOL_PERFORMANCE: _school_performance,
+    AlertKind.CLASS_ATTENDANCE: _class_attendance,
+    AlertKind.CLASS_PERFORMANCE: _class_performance,
+    AlertKind.STUDENT_ATTENDANCE: _student_attendance,
+    AlertKind.STUDENT_PERFORMANCE: _student_performance,
+}
+
+
+def alerts_query(rules: Dict[int, Dict[AlertKind, AlertRule]], today: date):
+    """Every alert of the schools in `rules` as one UNION ALL of per kind aggregations, None without enabled rules"""
+    selects = []
+    for kind, build in _KIND_QUERIES.items():
+        rule = _Compiled(rules, kind, today)
+        if rule.school_ids:
+            selects.append(build(rule, today))
+    if not selects:
+        return None
+    return union_all(*selects).subquery()
+
+
+async def evaluate_alerts(session: AsyncSession, school_ids: Optional[Sequence[int]] = None) -> int:
+    """
+    Re-evaluate the alerts of the given schools (all of them when None):
+    matches are upserted, alerts that no longer match are removed. Returns
+    the number of current alerts.
+    """
+    if school_ids is None:
+        school_ids = (await session.exec(select(School.id))).all()
+    school_ids = sorted(set(school_ids))
+    if not school_ids:
+        return 0
+
+    rules = await effective_rules(session, school_ids)
+    now = datetime.utcnow()
+    matches = alerts_query(rules, now.date())
+
+    count = 0
+    if matches is not None:
+        stmt = dialect_insert(session, Alert).from_select(
+            _COLUMNS,
+            # sqlite needs a WHERE in INSERT ... SELECT ... ON CONFLICT
+            select(*matches.c, literal(now).label("first_seen"), literal(now).label("last_seen")).where(true()),
+        )
+        result = await session.exec(stmt.on_conflict_do_update(
+            index_elements=["kind", "target_id"],
+            set_={column: getattr(stmt.excluded, column) for column in _COLUMNS if column != "first_seen"},
+        ))
+        count = result.rowcount
+
+    await session.exec(delete(Alert).where(Alert.school_id.in_(school_ids), Alert.last_seen < now))
+    await session.commit()
+    return count
+
+
+async def current_alerts(session: AsyncSession, kinds: Sequence[AlertKind], *filters) -> List[Alert]:
+    """Stored alerts of the given kinds matching `filters`, oldest first"""
+    return (await session.exec(
+        select(Alert)
+        .where(Alert.kind.in_([kind.value for kind in kinds]), *filters)
+        .order_by(Alert.first_seen, Alert.id)
+    )).all()
+
+
+def mark_schools_dirty(*school_ids: int):
+    """Have the background loop re-evaluate these schools' alerts soon"""
+    _dirty_school_ids.update(school_ids)
+    if _dirty_school_ids:
+        _dirty.set()
+
+
+def _take_dirty() -> FrozenSet[int]:
+    school_ids = frozenset(_dirty_school_ids)
+    _dirty_school_ids.clear()
+    _dirty.clear()
+    return school_ids
+
+
+async def evaluate_alerts_periodically():
+    """Background loop: every school on a schedule, written schools shortly after their writes"""
+    loop = asyncio.get_running_loop()
+    next_full = loop.time()
+    while True:
+        try:
+            try:
+                await asyncio.wait_for(_dirty.wait(), max(next_full - loop.time(), 0))
+                # batch a burst of writes into one evaluation
+                await asyncio.sleep(Config.ALERT_EVALUATE_DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+            if loop.time() >= next_full:
+                _take_dirty()
+                school_ids = None
+                next_full = loop.time() + Config.ALERT_EVALUATE_INTERVAL_SECONDS
+            else:
+                school_ids = _take_dirty()
+
+            async with async_session_maker() as session:
+                await evaluate_alerts(session, school_ids)
+        except Exception as e:
+            print(f"Alert evaluation failed: {str(e)}")
+            await asyncio.sleep(Config.ALERT_EVALUATE_DEBOUNCE_SECONDS)
+
+
+async def main():
+    from src.db.main import async_engine
+
+    async with async_session_maker() as session:
+        count = await evaluate_alerts(session)
+    await async_engine.dispose()
+    print(f"alerts evaluated ({count} current)")
+
+
+if __name__ == "__main__":
+    # python -m src.services.alerts
+    asyncio.run(main())
@@ -0,0 +1,234 @@
+"""
+Student attendance prefix sums
+Keeps student_attendance_prefix (per student, per marked day counts plus
+running totals and the current absence streak) in step with the attendance
+table. A student's present / total over any date range is then the running
+totals at the range end minus those before its start: two index lookups
+instead of a scan of their attendance rows.
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, case, cast, delete, func, literal, select, true
+from sqlalchemy.orm import aliased
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.upsert import dialect_insert
+from src.models import Attendance, Student, StudentAttendancePrefix
+from src.models.models import AbsenceStreak, AttendancePeriod
+
+# (day, present, total)
+DayCounts = Tuple[date, int, int]
+
+_COLUMNS = ["student_id", "attendance_date", "present", "total", "cum_present", "cum_total", "absence_streak"]
+
+
+def _prefix_select(student_ids: Optional[Sequence[int]] = None, since: Optional[date] = None):
+    """
+    Prefix rows recomputed from the attendance rows on or after `since`,
+    continuing the running totals of each student's last row before it
+    """
+    days = (
+        select(
+            Attendance.student_id,
+            Attendance.attendance_date,
+            func.sum(cast(Attendance.is_present, Integer)).label("present"),
+            func.count(Attendance.id).label("total"),
+        )
+        .group_by(Attendance.student_id, Attendance.attendance_date)
+    )
+    if student_ids is not None:
+        days = days.where(Attendance.student_id.in_(student_ids))
+    if since is not None:
+        days = days.where(Attendance.attendance_date >= since)
+    days = days.subquery()
+
+    ranked = select(
+        days,
+        func.row_number().over(partition_by=days.c.student_id, order_by=days.c.attendance_date).label("seq"),
+    ).subquery()
+
+    def base(column):
+        if since is None:
+            return literal(0)
+        earlier = aliased(StudentAttendancePrefix)
+        return func.coalesce(
+            select(getattr(earlier, column))
+            .where(earlier.student_id == ranked.c.student_id, earlier.attendance_date < since)
+            .order_by(earlier.attendance_date.desc())
+            .limit(1)
+            .scalar_subquery(),
+            0,
+        )
+
+    def running(expression):
+        return expression.over(partition_by=ranked.c.student_id, order_by=ranked.c.attendance_date)
+
+    # days since the last present day, or continuing the earlier streak when there is none yet
+    last_present_seq = running(func.max(case((ranked.c.present > 0, ranked.c.seq))))
+    return select(
+        ranked.c.student_id,
+        ranked.c.attendance_date,
+        ranked.c.present,
+        ranked.c.total,
+        base("cum_present") + running(func.sum(ranked.c.present)),
+        base("cum_total") + running(func.sum(ranked.c.total)),
+        ranked.c.seq - func.coalesce(last_present_seq, -base("absence_streak")),
+    ).where(true())  # sqlite needs a WHERE in INSERT ... SELECT ... ON CONFLICT
+
+
+def _upsert_from(session: AsyncSession, prefix_query):
+    stmt = dialect_insert(session, StudentAttendancePrefix).from_select(_COLUMNS, prefix_query)
+    return stmt.on_conflict_do_update(
+        index_elements=["student_id", "attendance_date"],
+        set_={column: getattr(stmt.excluded, column) for column in _COLUMNS[2:]},
+    )
+
+
+async def refresh_student_days(session: AsyncSession, student_days: Iterable[Tuple[int, date]]):
+    """
+    Recompute the prefix rows of the given students from the earliest of
+    the given (student_id, date) pairs onwards. Marking today only rewrites
+    today's rows. Call before commit.
+    """
+    student_days = list(student_days)
+    if not student_days:
+        return
+    student_ids = sorted({student_id for student_id, _ in student_days})
+    since = min(day for _, day in student_days)
+
+    await session.flush()
+
+    await session.exec(
+        delete(StudentAttendancePrefix)
+        .where(StudentAttendancePrefix.student_id.in_(student_ids), StudentAttendancePrefix.attendance_date >= since)
+    )
+    await session.exec(_upsert_from(session, _prefix_select(student_ids, since)))
+
+
+async def rebuild_student_attendance_prefix(session: AsyncSession):
+    """Rebuild the prefix table from scratch"""
+    await session.exec(delete(StudentAttendancePrefix))
+    await session.exec(_upsert_from(session, _prefix_select()))
+    await session.commit()
+
+
+def _running_total(column, student_id: int, condition):
+    # the running total on the student's last marked day matching `condition`
+    return func.coalesce(
+        select(column)
+        .where(StudentAttendancePrefix.student_id == student_id, condition)
+        .order_by(StudentAttendancePrefix.attendance_date.desc())
+        .limit(1)
+        .scalar_subquery(),
+        0,
+    )
+
+
+async def student_range_counts(session: AsyncSession, student_id: int, date_from: date, date_to: date) -> Tuple[int, int]:
+    """A student's (present, total) between the two dates, inclusive"""
+    until_end = StudentAttendancePrefix.attendance_date <= date_to
+    before_start = StudentAttendancePrefix.attendance_date < date_from
+    return tuple((await session.exec(select(
+        _running_total(StudentAttendancePrefix.cum_present, student_id, until_end)
+        - _running_total(StudentAttendancePrefix.cum_present, student_id, before_start),
+        _running_total(StudentAttendancePrefix.cum_total, student_id, until_end)
+        - _running_total(StudentAttendancePrefix.cum_total, student_id, before_start),
+    ))).one())
+
+
+async def student_days(session: AsyncSession, student_id: int, date_from: date, date_to: date) -> List[DayCounts]:
+    """A student's per day (date, present, total) between the two dates"""
+    return (await session.exec(
+        select(StudentAttendancePrefix.attendance_date, StudentAttendancePrefix.present, StudentAttendancePrefix.total)
+        .where(
+            StudentAttendancePrefix.student_id == student_id,
+            StudentAttendancePrefix.attendance_date.between(date_from, date_to),
+        )
+        .order_by(StudentAttendancePrefix.attendance_date)
+    )).all()
+
+
+async def absence_streaks(session: AsyncSession, filters: list, as_of: date, min_days: int) -> List[AbsenceStreak]:
+    """
+    Students matching `filters` (on Student and joined tables) whose latest
+    marked day up to `as_of` ends a run of at least `min_days` absent days
+    """
+    latest = (
+        select(StudentAttendancePrefix.student_id, func.max(StudentAttendancePrefix.attendance_date).label("attendance_date"))
+        .join(Student, Student.id == StudentAttendancePrefix.student_id)
+        .where(StudentAttendancePrefix.attendance_date <= as_of, *filters)
+        .group_by(StudentAttendancePrefix.student_id)
+        .subquery()
+    )
+    rows = (await session.exec(
+        select(Student.id, Student.name, Student.class_id, StudentAttendancePrefix.absence_streak, StudentAttendancePrefix.attendance_date)
+        .join(latest, Student.id == latest.c.student_id)
+        .join(
+            StudentAttendancePrefix,
+            (StudentAttendancePrefix.student_id == latest.c.student_id)
+            & (StudentAttendancePrefix.attendance_date == latest.c.attendance_date),
+        )
+        .where(StudentAttendancePrefix.absence_streak >= min_days)
+        .order_by(StudentAttendancePrefix.absence_streak.desc(), Student.id)
+    )).all()
+    return [
+        AbsenceStreak(student_id=student_id, student_name=name, class_id=class_id, streak_days=streak, last_marked=last_marked)
+        for student_id, name, class_id, streak, last_marked in rows
+    ]
+
+
+def _period(start: date, end: date, present: int, total: int) -> AttendancePeriod:
+    return AttendancePeriod(
+        start=start,
+        end=end,
+        present=present,
+        total=total,
+        attendance_percentage=round(present / total * 100, 2) if total else 0,
+    )
+
+
+def _month_end(day: date) -> date:
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def attendance_periods(days: Iterable[DayCounts], date_from: date, date_to: date) -> Dict[str, List[AttendancePeriod]]:
+    """Daily, weekly (Monday to Sunday) and monthly totals of per day counts, clipped to the range"""
+    daily = []
+    weeks: Dict[date, List[int]] = defaultdict(lambda: [0, 0])
+    months: Dict[date, List[int]] = defaultdict(lambda: [0, 0])
+    for day, present, total in days:
+        daily.append(_period(day, day, present, total))
+        for bucket in (weeks[day - timedelta(days=day.weekday())], months[day.replace(day=1)]):
+            bucket[0] += present
+            bucket[1] += total
+
+    return {
+        "daily": daily,
+        "weekly": [
+            _period(max(start, date_from), min(start + timedelta(days=6), date_to), present, total)
+            for start, (present, total) in sorted(weeks.items())
+        ],
+        "monthly": [
+            _period(max(start, date_from), min(_month_end(start), date_to), present, total)
+            for start, (present, total) in sorted(months.items())
+        ],
+    }
+
+
+async def main():
+    from src.db.main import async_engine, async_session_maker
+
+    async with async_session_maker() as session:
+        await rebuild_student_attendance_prefix(session)
+    await async_engine.dispose()
+    print("student_attendance_prefix rebuilt")
+
+
+if __name__ == "__main__":
+    # python -m src.services.attendance_prefix
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Daily attendance rollup
+Keeps class_daily_attendance (present / total per class per day) in step with
+the attendance table so dashboards aggregate classes x days instead of
+students x days.
+"""
+
+import asyncio
+import sys
+from datetime import date
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import Integer, cast, delete, func, select, tuple_
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.upsert import dialect_insert
+from src.models import Attendance, Class, ClassDailyAttendance
+
+
+def _rollup_select():
+    return (
+        select(
+            Attendance.class_id,
+            Attendance.attendance_date,
+            Class.school_id,
+            func.sum(cast(Attendance.is_present, Integer)),
+            func.count(Attendance.id),
+        )
+        .join(Class, Attendance.class_id == Class.id)
+        .group_by(Attendance.class_id, Attendance.attendance_date, Class.school_id)
+    )
+
+
+def _upsert_from(session: AsyncSession, rollup_query):
+    stmt = dialect_insert(session, ClassDailyAttendance).from_select(
+        ["class_id", "attendance_date", "school_id", "present", "total"],
+        rollup_query,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["class_id", "attendance_date"],
+        set_={
+            "school_id": stmt.excluded.school_id,
+            "present": stmt.excluded.present,
+            "total": stmt.excluded.total,
+        },
+    )
+
+
+async def refresh_class_days(session: AsyncSession, class_days: Iterable[Tuple[int, date]]):
+    """
+    Recompute the rollup rows for the given (class_id, date) pairs from the
+    attendance rows in the current transaction. Call before commit.
+    """
+    class_days = list(set(class_days))
+    if not class_days:
+        return
+
+    await session.flush()
+
+    # pairs whose attendance rows were all removed
+    await session.exec(
+        delete(ClassDailyAttendance)
+        .where(tuple_(ClassDailyAttendance.class_id, ClassDailyAttendance.attendance_date).in_(class_days))
+    )
+    await session.exec(_upsert_from(
+        session,
+        _rollup_select().where(tuple_(Attendance.class_id, Attendance.attendance_date).in_(class_days)),
+    ))
+
+
+async def rebuild_class_daily_attendance(session: AsyncSession, since: Optional[date] = None):
+    """Rebuild the rollup from scratch (or from `since` onwards)"""
+    clear = delete(ClassDailyAttendance)
+    rollup = _rollup_select()
+    if since:
+        clear = clear.where(ClassDailyAttendance.attendance_date >= since)
+        rollup = rollup.where(Attendance.attendance_date >= since)
+
+    await session.exec(clear)
+    await session.exec(_upsert_from(session, rollup))
+    await session.commit()
+
+
+async def main(args):
+    from src.db.main import async_engine, async_session_maker
+
+    since = date.fromisoformat(args[0]) if args else None
+    async with async_session_maker() as session:
+        await rebuild_class_daily_attendance(session, since)
+    await async_engine.dispose()
+    print(f"class_daily_attendance rebuilt{f' since {since}' if since else ''}")
+
+
+if __name__ == "__main__":
+    # python -m src.services.attendance_rollup [YYYY-MM-DD]
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,168 @@
+"""
+Data versions
+A monotonic version per (school, entity type) bumped inside each write
+transaction, so it changes exactly when the write commits. Read endpoints
+derive a strong ETag from the versions they depend on and answer
+If-None-Match with 304 before running their main query. Committed bumps
+also invalidate the school's cached responses and cached user scopes, and
+queue its alerts for re-evaluation.
+"""
+
+import hashlib
+from typing import Dict, Iterable, Optional, Union
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.auth.dependencies import get_current_active_user
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
+from src.auth.scope import scope_cache
+from src.db.main import get_session
+from src.db.upsert import dialect_insert
+from src.models import DataVersion
+from src.services.activity import execute_with_activity
+from src.services.alerts import mark_schools_dirty
+from src.services.response_cache import dashboard_cache, school_detail_cache
+
+# entity types
+SCHOOLS = "schools"
+CLASSES = "classes"
+TEACHERS = "teachers"
+SUBJECTS = "subjects"
+STUDENTS = "students"
+ASSIGNMENTS = "assignments"
+ATTENDANCE = "attendance"
+EXAMS = "exams"
+MARKS = "marks"
+
+# school_id used for district-wide entities
+DISTRICT = 0
+
+_PENDING_KEY = "bumped_school_ids"
+_PENDING_SCOPE_KEY = "bumped_scope_school_ids"
+_PENDING_ALERT_KEY = "bumped_alert_school_ids"
+
+# entities that decide which classes / subjects a user can reach
+SCOPE_ENTITIES = {CLASSES, TEACHERS, ASSIGNMENTS}
+
+# entities the alert evaluator aggregates
+ALERT_ENTITIES = {CLASSES, STUDENTS, ATTENDANCE, EXAMS, MARKS}
+
+
+async def bump_data_version(session: AsyncSession, school_ids: Union[Optional[int], Iterable[Optional[int]]], *entities: str):
+    """
+    Increment the version of `entities` for the given school(s), DISTRICT for
+    district-wide entities. Also writes the activity events recorded so far.
+    Call before commit.
+    """
+    if school_ids is None or isinstance(school_ids, int):
+        school_ids = [school_ids]
+    school_ids = {school_id for school_id in school_ids if school_id is not None}
+    if not school_ids:
+        return
+
+    stmt = dialect_insert(session, DataVersion).values([
+        {"school_id": school_id, "entity": entity, "version": 1}
+        for school_id in sorted(school_ids) for entity in sorted(set(entities))
+    ])
+    # activity events recorded by the write go in the same statement
+    await execute_with_activity(session, stmt.on_conflict_do_update(
+        index_elements=["school_id", "entity"],
+        set_={"version": DataVersion.version + 1},
+    ))
+    session.info.setdefault(_PENDING_KEY, set()).update(school_ids)
+    if SCOPE_ENTITIES.intersection(entities):
+        session.info.setdefault(_PENDING_SCOPE_KEY, set()).update(school_ids)
+    if ALERT_ENTITIES.intersection(entities):
+        session.info.setdefault(_PENDING_ALERT_KEY, set()).update(school_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session):
+    scope_school_ids = session.info.pop(_PENDING_SCOPE_KEY, None)
+    if scope_school_ids:
+        scope_cache.invalidate_school(*scope_school_ids)
+
+    alert_school_ids = session.info.pop(_PENDING_ALERT_KEY, None)
+    if alert_school_ids:
+        mark_schools_dirty(*(alert_school_ids - {DISTRICT}))
+
+    school_ids = session.info.pop(_PENDING_KEY, None)
+    if not school_ids:
+        return
+    for cache in (dashboard_cache, school_detail_cache):
+        if DISTRICT in school_ids:
+            cache.invalidate_all()
+        cache.invalidate_school(*(school_ids - {DISTRICT}))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_on_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_PENDING_SCOPE_KEY, None)
+    session.info.pop(_PENDING_ALERT_KEY, None)
+
+
+async def get_data_versions(session: AsyncSession, entities: Iterable[str], school_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Current version per entity for one school (plus district-wide rows), or
+    summed across all schools when school_id is None. The sum only ever grows,
+    so it changes whenever any school's version does.
+    """
+    query = (
+        select(DataVersion.entity, func.sum(DataVersion.version))
+        .where(DataVersion.entity.in_(list(entities)))
+        .group_by(DataVersion.entity)
+    )
+    if school_id is not None:
+        query = query.where(DataVersion.school_id.in_([school_id, DISTRICT]))
+    return dict((await session.exec(query)).all())
+
+
+def _etag_scope(request: Request, user: UserSnapshot) -> Optional[int]:
+    if user.role != UserRole.ADMIN:
+        return user.school_id
+    school_id = request.query_params.get("school_id")
+    return int(school_id) if school_id and school_id.isdigit() else None
+
+
+def _if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [tag.strip() for tag in header.split(",")]
+
+
+def conditional_get(*entities: str, session_dependency=get_session):
+    """
+    Dependency factory for read endpoints whose response only depends on
+    `entities`. Sets a strong ETag on the response and short-circuits with
+    304 Not Modified when the client already has it.
+    """
+    async def dependency(
+        request: Request,
+        response: Response,
+        current_user: UserSnapshot = Depends(get_current_active_user),
+        session: AsyncSession = Depends(session_dependency),
+    ):
+        school_id = _etag_scope(request, current_user)
+        versions = await get_data_versions(session, entities, school_id)
+
+        # the response also depends on who is asking and the exact request
+        material = "|".join([
+            request.url.path,
+            str(sorted(request.query_params.multi_items())),
+            f"{current_user.id}:{current_user.role.value}:{current_user.school_id}",
+            ",".join(f"{entity}={versions.get(entity, 0)}" for entity in sorted(entities)),
+        ])
+        etag = f'"{hashlib.sha1(material.encode()).hexdigest()}"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+        if _if_none_match(request, etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
@@ -0,0 +1,152 @@
+"""
+Marks aggregate
+Keeps marks_aggregate (running sum / count per school, class, subject and exam
+type) in step with Marks and ExamMarks writes, so analytics averages are a
+lookup over a few rows instead of an aggregation over every mark.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, func, select, tuple_, union_all, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.db.upsert import dialect_insert
+from src.models import Class, Exam, ExamMarks, Marks, MarksAggregate
+from src.models.models import ExamType
+
+# (school_id, class_id, subject_id, exam_type)
+CellKey = Tuple[int, int, int, ExamType]
+_CELL_COLUMNS = ("school_id", "class_id", "subject_id", "exam_type")
+
+# average score over the aggregate rows in a query
+average_marks = func.sum(MarksAggregate.marks_sum) / func.nullif(func.sum(MarksAggregate.marks_count), 0)
+
+
+def exam_percentage(marks_obtained: float, max_marks: float) -> Optional[float]:
+    return marks_obtained * 100.0 / max_marks if max_marks else None
+
+
+async def apply_marks_deltas(session: AsyncSession, deltas: Iterable[Tuple[CellKey, float, int]]):
+    """
+    Add (sum, count) deltas to the aggregate cells. A new mark is (score, 1),
+    a correction is (new - old, 0). Call before commit.
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    for key, sum_delta, count_delta in deltas:
+        totals[key][0] += sum_delta
+        totals[key][1] += count_delta
+
+    rows = [
+        {
+            "school_id": school_id, "class_id": class_id, "subject_id": subject_id,
+            "exam_type": exam_type, "marks_sum": marks_sum, "marks_count": marks_count,
+        }
+        for (school_id, class_id, subject_id, exam_type), (marks_sum, marks_count) in totals.items()
+        if marks_sum or marks_count
+    ]
+    counted = [row for row in rows if row["marks_count"]]
+    # corrections only change existing cells, they must not create empty ones
+    corrections = [row for row in rows if not row["marks_count"]]
+
+    if counted:
+        stmt = dialect_insert(session, MarksAggregate).values(counted)
+        await session.exec(stmt.on_conflict_do_update(
+            index_elements=list(_CELL_COLUMNS),
+            set_={
+                "marks_sum": MarksAggregate.marks_sum + stmt.excluded.marks_sum,
+                "marks_count": MarksAggregate.marks_count + stmt.excluded.marks_count,
+            },
+        ))
+
+    if corrections:
+        table = MarksAggregate.__table__
+        connection = await session.connection()
+        # one executemany, parameters prefixed so they don't clash with the column names
+        await connection.execute(
+            update(table)
+            .where(*(table.c[column] == bindparam(f"cell_{column}") for column in _CELL_COLUMNS))
+            .values(marks_sum=table.c.marks_sum + bindparam("cell_marks_sum")),
+            [{f"cell_{column}": value for column, value in row.items()} for row in corrections],
+        )
+
+    # drop cells whose last mark was taken out
+    emptied = [tuple(row[column] for column in _CELL_COLUMNS) for row in counted if row["marks_count"] < 0]
+    if emptied:
+        await session.exec(delete(MarksAggregate).where(
+            tuple_(*(getattr(MarksAggregate, column) for column in _CELL_COLUMNS)).in_(emptied),
+            MarksAggregate.marks_count <= 0,
+        ))
+
+
+def _marks_cells():
+    return (
+        select(
+            Class.school_id, Marks.class_id, Marks.subject_id, Marks.exam_type,
+            Marks.marks.label("score"),
+        )
+        .join(Class, Marks.class_id == Class.id)
+    )
+
+
+def _exam_marks_cells():
+    score = ExamMarks.marks_obtained * 100.0 / func.nullif(Exam.max_marks, 0)
+    return (
+        select(
+            Class.school_id, Exam.class_id, Exam.subject_id, Exam.exam_type,
+            score.label("score"),
+        )
+        .join(Exam, ExamMarks.exam_id == Exam.id)
+        .join(Class, Exam.class_id == Class.id)
+    )
+
+
+def _grouped(cells):
+    cells = cells.subquery()
+    return (
+        select(
+            cells.c.school_id, cells.c.class_id, cells.c.subject_id, cells.c.exam_type,
+            func.coalesce(func.sum(cells.c.score), 0), func.count(cells.c.score),
+        )
+        .group_by(cells.c.school_id, cells.c.class_id, cells.c.subject_id, cells.c.exam_type)
+    )
+
+
+async def remove_student_marks(session: AsyncSession, student_id: int):
+    """Take a student's marks and exam marks out of the aggregate (before deleting the student)"""
+    scores = union_all(
+        _marks_cells().where(Marks.student_id == student_id),
+        _exam_marks_cells().where(ExamMarks.student_id == student_id),
+    )
+    rows = (await session.exec(_grouped(scores))).all()
+    await apply_marks_deltas(session, [
+        ((school_id, class_id, subject_id, exam_type), -marks_sum, -marks_count)
+        for school_id, class_id, subject_id, exam_type, marks_sum, marks_count in rows
+    ])
+
+
+async def rebuild_marks_aggregate(session: AsyncSession):
+    """Rebuild the aggregate from scratch"""
+    await session.exec(delete(MarksAggregate))
+    await session.exec(
+        dialect_insert(session, MarksAggregate).from_select(
+            ["school_id", "class_id", "subject_id", "exam_type", "marks_sum", "marks_count"],
+            _grouped(union_all(_marks_cells(), _exam_marks_cells())),
+        )
+    )
+    await session.commit()
+
+
+async def main():
+    from src.db.main import async_engine, async_session_maker
+
+    async with async_session_maker() as session:
+        await rebuild_marks_aggregate(session)
+    await async_engine.dispose()
+    print("marks_aggregate rebuilt")
+
+
+if __name__ == "__main__":
+    # python -m src.services.marks_aggregate
+    asyncio.run(main())
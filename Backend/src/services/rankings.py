@@ -0,0 +1,151 @@
+"""
+Rankings
+Rank, percentile and top-K lists of students, computed in SQL with window
+functions: RANK() over the score for positions (ties share a rank) and
+PERCENT_RANK() for the share of students scoring lower. A top-K list filters
+on the rank inside the database, so only K rows (plus ties) come back.
+Results are cached until the data versions of the ranked marks change.
+"""
+
+from enum import Enum
+from typing import Hashable, List, Optional
+
+from sqlalchemy import union_all
+from sqlalchemy.sql import Select
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.models import Class, Exam, ExamMarks, Marks, Student
+from src.models.models import ExamType, RankEntry
+from src.services.data_versions import get_data_versions, CLASSES, EXAMS, MARKS, STUDENTS
+from src.services.response_cache import VersionedCache
+
+# marks, exam max marks and student names / classes
+RANKING_ENTITIES = (MARKS, EXAMS, STUDENTS, CLASSES)
+
+ranking_cache = VersionedCache(Config.RANKING_CACHE_MAX_ENTRIES)
+
+
+class RankScope(str, Enum):
+    CLASS = "class"
+    SCHOOL = "school"
+    DISTRICT = "district"
+
+
+def _exam_percentage():
+    return ExamMarks.marks_obtained * 100.0 / Exam.max_marks
+
+
+def scope_filters(rank_scope: RankScope, scope_id: Optional[int]) -> list:
+    """Filters on Student / Class picking the students ranked against each other"""
+    if rank_scope == RankScope.CLASS:
+        return [Class.id == scope_id]
+    if rank_scope == RankScope.SCHOOL:
+        return [Class.school_id == scope_id]
+    return []
+
+
+def exam_scores(exam_id: int) -> Select:
+    """(student_id, score) per student who sat the exam, as a percentage"""
+    return (
+        select(ExamMarks.student_id, _exam_percentage().label("score"))
+        .select_from(ExamMarks)
+        .join(Exam, ExamMarks.exam_id == Exam.id)
+        .where(ExamMarks.exam_id == exam_id, Exam.max_marks > 0)
+    )
+
+
+def subject_scores(subject_id: int, term: Optional[ExamType], filters: list) -> Select:
+    """
+    (student_id, score) per student in scope: their average over the
+    subject's marks and exam marks (as percentages), of one term if given
+    """
+    students = select(Student.id).join(Class, Student.class_id == Class.id).where(*filters)
+    marks = (
+        select(Marks.student_id, Marks.marks.label("score"))
+        .where(Marks.subject_id == subject_id, Marks.student_id.in_(students))
+    )
+    exam_marks = (
+        select(ExamMarks.student_id, _exam_percentage().label("score"))
+        .select_from(ExamMarks)
+        .join(Exam, ExamMarks.exam_id == Exam.id)
+        .where(Exam.subject_id == subject_id, Exam.max_marks > 0, ExamMarks.student_id.in_(students))
+    )
+    if term is not None:
+        marks = marks.where(Marks.exam_type == term)
+        exam_marks = exam_marks.where(Exam.exam_type == term)
+
+    cells = union_all(marks, exam_marks).subquery()
+    return select(cells.c.student_id, func.avg(cells.c.score).label("score")).group_by(cells.c.student_id)
+
+
+async def ranking(
+        session: AsyncSession,
+        scores: Select,
+        filters: list,
+        top: int,
+        student_id: Optional[int] = None
+    ) -> List[RankEntry]:
+    """
+    The top `top` ranks (ties included) among the students matching
+    `filters`, or only `student_id`'s entry, ranked against all of them
+    """
+    scores = scores.subquery()
+    ranked = (
+        select(
+            Student.id.label("student_id"),
+            Student.name.label("student_name"),
+            Class.id.label("class_id"),
+            Class.name.label("class_name"),
+            scores.c.score,
+            func.rank().over(order_by=scores.c.score.desc()).label("rank"),
+            func.percent_rank().over(order_by=scores.c.score).label("percent_rank"),
+            func.count().over().label("out_of"),
+        )
+        .select_from(scores)
+        .join(Student, Student.id == scores.c.student_id)
+        .join(Class, Class.id == Student.class_id)
+        .where(*filters)
+        .subquery()
+    )
+
+    # filtered outside the window, so ranks stay relative to everyone in scope
+    query = select(*ranked.c)
+    if student_id is not None:
+        query = query.where(ranked.c.student_id == student_id)
+    else:
+        query = query.where(ranked.c.rank <= top)
+    rows = (await session.exec(query.order_by(ranked.c.rank, ranked.c.student_id))).all()
+
+    return [
+        RankEntry(
+            student_id=row.student_id,
+            student_name=row.student_name,
+            class_id=row.class_id,
+            class_name=row.class_name,
+            score=round(row.score, 2),
+            rank=row.rank,
+            out_of=row.out_of,
+            percentile=round(row.percent_rank * 100, 1),
+        )
+        for row in rows
+    ]
+
+
+async def cached_ranking(
+        session: AsyncSession,
+        key: Hashable,
+        school_id: Optional[int],
+        scores: Select,
+        filters: list,
+        top: int,
+        student_id: Optional[int] = None
+    ) -> List[RankEntry]:
+    """ranking() cached under `key` until the marks of the school (None for the district) change"""
+    versions = await get_data_versions(session, RANKING_ENTITIES, school_id)
+    return await ranking_cache.get_or_compute(
+        (key, top, student_id),
+        tuple(sorted(versions.items())),
+        lambda: ranking(session, scores, filters, top, student_id),
+    )
@@ -0,0 +1,142 @@
+"""
+Response caches
+Serialized responses kept in process, keyed by endpoint and the caller's
+scope (role, school, teacher), or by school alone for responses that are the
+same for everyone allowed to see them. Every write that changes a school's
+data bumps that school's generation, which makes its cached entries
+unreachable; they then age out through the TTL / LRU bounds. Entries are
+computed on the primary, since a replica may not have the write yet when
+the generation is bumped.
+
+VersionedCache instead stores results next to the data versions read from
+the database, so a write committed by any process makes them stale.
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from cachetools import LRUCache, TTLCache
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.auth.models import UserRole
+from src.auth.user_cache import UserSnapshot
+from src.config import Config
+
+
+class ResponseCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # requests already computing a key, so a burst of misses runs the queries once
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        # school_id -> generation, None is the district-wide generation
+        self._generations: Dict[Optional[int], int] = defaultdict(int)
+        # bumped when district-wide data (subjects, schools) changes
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    def _key(self, endpoint: str, user: UserSnapshot) -> tuple:
+        school_id = None if user.role == UserRole.ADMIN else user.school_id
+        teacher_user_id = user.id if user.role == UserRole.TEACHER else None
+        return (endpoint, user.role, school_id, teacher_user_id, self._epoch, self._generations[school_id])
+
+    @staticmethod
+    def _response(body: bytes) -> Response:
+        return Response(content=body, media_type="application/json")
+
+    async def get_or_compute(self, endpoint: str, user: UserSnapshot, compute: Callable[[], Awaitable[Any]]) -> Response:
+        """Return the cached response for the user's scope or compute and store it"""
+        return await self._get_or_compute(self._key(endpoint, user), compute)
+
+    async def get_or_compute_for_school(self, endpoint: str, school_id: int, compute: Callable[[], Awaitable[Any]]) -> Response:
+        """Same as get_or_compute for a response that only depends on the school, not the caller"""
+        key = (endpoint, school_id, self._epoch, self._generations[school_id])
+        return await self._get_or_compute(key, compute)
+
+    async def _get_or_compute(self, key: tuple, compute: Callable[[], Awaitable[Any]]) -> Response:
+        body = self._entries.get(key)
+        if body is not None:
+            self.hits += 1
+            return self._response(body)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return self._response(await asyncio.shield(pending))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        try:
+            body = JSONResponse(jsonable_encoder(await compute())).body
+        except BaseException as e:
+            future.set_exception(e)
+            # mark retrieved so a failure nobody waited for is not logged twice
+            future.exception()
+            raise
+        finally:
+            self._pending.pop(key, None)
+
+        self._entries[key] = body
+        future.set_result(body)
+        return self._response(body)
+
+    def invalidate_school(self, *school_ids: Optional[int]):
+        """Drop cached responses that include data from these schools"""
+        for school_id in set(school_ids):
+            self._generations[school_id] += 1
+        # district-wide (admin) and school-less entries cover every school
+        self._generations[None] += 1
+        self.invalidations += 1
+
+    def invalidate_all(self):
+        self._epoch += 1
+        self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self._entries.maxsize,
+            "ttl_seconds": self._entries.ttl,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+class VersionedCache:
+    """
+    Computed results kept with the data versions they were computed from,
+    served until the caller reads different versions for the same key
+    """
+
+    def __init__(self, maxsize: int):
+        self._entries = LRUCache(maxsize=maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    async def get_or_compute(self, key: Hashable, version: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = await compute()
+        self._entries[key] = (version, value)
+        return value
+
+
+dashboard_cache = ResponseCache(Config.DASHBOARD_CACHE_MAX_ENTRIES, Config.DASHBOARD_CACHE_TTL_SECONDS)
+school_detail_cache = ResponseCache(Config.SCHOOL_DETAIL_CACHE_MAX_ENTRIES, Config.SCHOOL_DETAIL_CACHE_TTL_SECONDS)
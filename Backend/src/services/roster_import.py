@@ -0,0 +1,354 @@
+"""
+Roster import
+Loads a students / teachers / classes roster from an uploaded CSV or XLSX
+file. Rows are parsed from the upload on a worker thread, a chunk at a time:
+each chunk is checked against indexes preloaded once per import (the
+school's classes and roll numbers, teacher emails) and its valid rows are
+written with one multi-row insert. Everything runs in the caller's
+transaction; rows that fail validation are skipped and reported by their
+sheet row number.
+"""
+
+import asyncio
+import csv
+import io
+import re
+import zipfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import func, insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.auth.scope import ScopeContext
+from src.config import Config
+from src.models import Class, School, Student, Teacher
+from src.models.models import RosterImportError, RosterImportReport
+from src.services.student_counts import apply_student_count_deltas
+
+# sheet row number (the header is row 1) and the row keyed by column name
+Row = Tuple[int, Dict[str, str]]
+
+# other headers seen in school spreadsheets
+_COLUMN_ALIASES = {
+    "roll": "roll_no",
+    "rollno": "roll_no",
+    "roll_number": "roll_no",
+    "class": "class_name",
+    "student_name": "name",
+    "teacher_name": "name",
+    "email_address": "email",
+    "phone_number": "phone",
+    "class_teacher_email": "teacher_email",
+}
+
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _column(header) -> str:
+    key = "_".join(str(header or "").strip().lower().replace(".", " ").split())
+    return _COLUMN_ALIASES.get(key, key)
+
+
+def _cell(value) -> str:
+    # spreadsheets hand numbers back as floats (roll no 12 -> 12.0)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return "" if value is None else str(value).strip()
+
+
+def _csv_rows(upload: UploadFile) -> Iterator[Row]:
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = [_column(h) for h in next(reader, [])]
+        for row_no, values in enumerate(reader, start=2):
+            cells = [_cell(v) for v in values]
+            if any(cells):
+                yield row_no, dict(zip(header, cells))
+    finally:
+        # the upload itself is closed by starlette
+        text.detach()
+
+
+def _xlsx_rows(upload: UploadFile) -> Iterator[Row]:
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # read only mode streams the first sheet instead of loading it whole
+    try:
+        workbook = load_workbook(upload.file, read_only=True, data_only=True)
+    except (InvalidFileException, OSError) as e:
+        # a zip that is not a workbook
+        raise ValueError(str(e)) from e
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = [_column(h) for h in next(rows, ())]
+        for row_no, values in enumerate(rows, start=2):
+            cells = [_cell(v) for v in values]
+            if any(cells):
+                yield row_no, dict(zip(header, cells))
+    finally:
+        workbook.close()
+
+
+def read_roster(upload: UploadFile) -> Iterator[Row]:
+    """Rows of an uploaded .csv / .xlsx roster, read lazily"""
+    filename = (upload.filename or "").lower()
+    if filename.endswith(".csv"):
+        return _csv_rows(upload)
+    if filename.endswith(".xlsx"):
+        return _xlsx_rows(upload)
+    raise HTTPException(status_code=400, detail="Unsupported file type, upload a .csv or .xlsx file")
+
+
+async def _chunks(rows: Iterator[Row], size: int) -> AsyncIterator[List[Row]]:
+    while True:
+        try:
+            # parsing (openpyxl above all) is CPU bound, keep it off the event loop
+            chunk = await asyncio.to_thread(list, islice(rows, size))
+        except (ValueError, KeyError, csv.Error, zipfile.BadZipFile) as e:
+            raise HTTPException(status_code=400, detail=f"Could not read the uploaded file: {str(e)}")
+        if not chunk:
+            return
+        yield chunk
+
+
+async def import_school_id(session: AsyncSession, scope: ScopeContext, school_id: Optional[int]) -> int:
+    """School an import writes to: the user's own, or the requested one for admins"""
+    if not scope.is_admin:
+        if school_id is not None and school_id != scope.school_id:
+            raise HTTPException(status_code=403, detail="Cannot import into another school")
+        if scope.school_id is None:
+            raise HTTPException(status_code=403, detail="Access denied")
+        return scope.school_id
+
+    if school_id is None:
+        raise HTTPException(status_code=400, detail="school_id is required")
+    if not await session.get(School, school_id):
+        raise HTTPException(status_code=404, detail="School not found")
+    return school_id
+
+
+class RosterImporter(ABC):
+    """Validates roster rows chunk by chunk, returning the values to insert"""
+    kind: str
+    model: type
+    required: Tuple[str, ...] = ()
+
+    def __init__(self, school_id: int):
+        self.school_id = school_id
+        self.errors: List[RosterImportError] = []
+
+    def reject(self, row_no: int, message: str, field: Optional[str] = None):
+        self.errors.append(RosterImportError(row=row_no, field=field, message=message))
+
+    def has_required(self, row_no: int, row: Dict[str, str]) -> bool:
+        for field in self.required:
+            if not row.get(field):
+                self.reject(row_no, f"Missing {field}", field)
+                return False
+        return True
+
+    async def preload(self, session: AsyncSession):
+        pass
+
+    @abstractmethod
+    async def validate(self, session: AsyncSession, chunk: List[Row]) -> List[dict]:
+        ...
+
+    async def inserted(self, session: AsyncSession, values: List[dict]):
+        """Hook run after a chunk's rows were inserted"""
+        pass
+
+
+class StudentImporter(RosterImporter):
+    """Columns: name, roll_no and the class as class_id, class_name or grade + section"""
+    kind = "students"
+    model = Student
+    required = ("name", "roll_no")
+
+    def __init__(self, school_id: int, allowed_class_ids: Optional[FrozenSet[int]] = None):
+        super().__init__(school_id)
+        # set for teachers, who may only enrol into their own classes
+        self.allowed_class_ids = allowed_class_ids
+
+    async def preload(self, session: AsyncSession):
+        classes = (await session.exec(
+            select(Class.id, Class.name, Class.grade, Class.section).where(Class.school_id == self.school_id)
+        )).all()
+        self.class_ids = {class_id for class_id, _, _, _ in classes}
+        # a name shared by several classes resolves to None (ambiguous)
+        self.by_name: Dict[str, Optional[int]] = {}
+        self.by_grade_section: Dict[Tuple[str, str], Optional[int]] = {}
+        for class_id, name, grade, section in classes:
+            name_key = name.strip().lower()
+            grade_section_key = (grade.strip().lower(), section.strip().lower())
+            self.by_name[name_key] = None if name_key in self.by_name else class_id
+            self.by_grade_section[grade_section_key] = None if grade_section_key in self.by_grade_section else class_id
+
+        self.rolls = set((await session.exec(
+            select(Student.class_id, Student.roll_no)
+            .join(Class, Class.id == Student.class_id)
+            .where(Class.school_id == self.school_id)
+        )).all())
+
+    def _class_id(self, row_no: int, row: Dict[str, str]) -> Optional[int]:
+        if row.get("class_id"):
+            class_id = int(row["class_id"]) if row["class_id"].isdigit() else None
+            if class_id not in self.class_ids:
+                self.reject(row_no, f"Class {row['class_id']} not found in this school", "class_id")
+                return None
+        elif row.get("class_name"):
+            key = row["class_name"].lower()
+            if key not in self.by_name:
+                self.reject(row_no, f"Class '{row['class_name']}' not found in this school", "class_name")
+                return None
+            class_id = self.by_name[key]
+            if class_id is None:
+                self.reject(row_no, f"Class name '{row['class_name']}' is ambiguous, use class_id", "class_name")
+                return None
+        elif row.get("grade") and row.get("section"):
+            key = (row["grade"].lower(), row["section"].lower())
+            class_id = self.by_grade_section.get(key)
+            if class_id is None:
+                self.reject(row_no, f"No single class for grade {row['grade']} section {row['section']}", "grade")
+                return None
+        else:
+            self.reject(row_no, "Missing class (class_id, class_name or grade and section)", "class_id")
+            return None
+
+        if self.allowed_class_ids is not None and class_id not in self.allowed_class_ids:
+            self.reject(row_no, f"Access denied to class {class_id}", "class_id")
+            return None
+        return class_id
+
+    async def validate(self, session: AsyncSession, chunk: List[Row]) -> List[dict]:
+        now = datetime.utcnow()
+        values = []
+        for row_no, row in chunk:
+            if not self.has_required(row_no, row):
+                continue
+            class_id = self._class_id(row_no, row)
+            if class_id is None:
+                continue
+            if (class_id, row["roll_no"]) in self.rolls:
+                self.reject(row_no, f"Roll number {row['roll_no']} already exists in class {class_id}", "roll_no")
+                continue
+
+            self.rolls.add((class_id, row["roll_no"]))
+            values.append({"name": row["name"], "roll_no": row["roll_no"], "class_id": class_id, "date_enrolled": now})
+        return values
+
+    async def inserted(self, session: AsyncSession, values: List[dict]):
+        await apply_student_count_deltas(session, [(row["class_id"], 1) for row in values])
+
+
+class TeacherImporter(RosterImporter):
+    """
+    Columns: name, email, phone. Login accounts are not created here, a
+    teacher is linked to their user by email on first sign in.
+    """
+    kind = "teachers"
+    model = Teacher
+    required = ("name", "email")
+
+    async def preload(self, session: AsyncSession):
+        self.emails = set()
+
+    async def validate(self, session: AsyncSession, chunk: List[Row]) -> List[dict]:
+        # emails are unique across schools, so check the chunk's against the whole table
+        chunk_emails = {row["email"].lower() for _, row in chunk if row.get("email")}
+        if chunk_emails:
+            self.emails.update((await session.exec(
+                select(func.lower(Teacher.email)).where(func.lower(Teacher.email).in_(chunk_emails))
+            )).all())
+
+        values = []
+        for row_no, row in chunk:
+            if not self.has_required(row_no, row):
+                continue
+            email = row["email"].lower()
+            if not _EMAIL.match(email):
+                self.reject(row_no, f"Invalid email {row['email']}", "email")
+                continue
+            if email in self.emails:
+                self.reject(row_no, f"A teacher with email {row['email']} already exists", "email")
+                continue
+
+            self.emails.add(email)
+            values.append({"name": row["name"], "email": email, "phone": row.get("phone") or None, "school_id": self.school_id})
+        return values
+
+
+class ClassImporter(RosterImporter):
+    """Columns: name, grade, section and optionally the class teacher's teacher_email"""
+    kind = "classes"
+    model = Class
+    required = ("name", "grade", "section")
+
+    async def preload(self, session: AsyncSession):
+        self.names = {
+            name.strip().lower()
+            for name in (await session.exec(select(Class.name).where(Class.school_id == self.school_id))).all()
+        }
+        self.teachers = dict((await session.exec(
+            select(func.lower(Teacher.email), Teacher.id).where(Teacher.school_id == self.school_id)
+        )).all())
+
+    async def validate(self, session: AsyncSession, chunk: List[Row]) -> List[dict]:
+        values = []
+        for row_no, row in chunk:
+            if not self.has_required(row_no, row):
+                continue
+            if row["name"].lower() in self.names:
+                self.reject(row_no, f"Class '{row['name']}' already exists in this school", "name")
+                continue
+            teacher_id = None
+            if row.get("teacher_email"):
+                teacher_id = self.teachers.get(row["teacher_email"].lower())
+                if teacher_id is None:
+                    self.reject(row_no, f"No teacher with email {row['teacher_email']} in this school", "teacher_email")
+                    continue
+
+            self.names.add(row["name"].lower())
+            values.append({
+                "name": row["name"], "grade": row["grade"], "section": row["section"],
+                "school_id": self.school_id, "teacher_id": teacher_id,
+            })
+        return values
+
+
+async def run_import(session: AsyncSession, importer: RosterImporter, upload: UploadFile, dry_run: bool = False) -> RosterImportReport:
+    """
+    Validate and insert the roster chunk by chunk. Does not commit: the caller
+    bumps data versions and commits when rows were imported, a dry run only
+    validates.
+    """
+    rows = read_roster(upload)
+    await importer.preload(session)
+
+    total = imported = 0
+    async for chunk in _chunks(rows, Config.ROSTER_IMPORT_CHUNK_ROWS):
+        total += len(chunk)
+        if total > Config.ROSTER_IMPORT_MAX_ROWS:
+            raise HTTPException(status_code=413, detail=f"Roster has more than {Config.ROSTER_IMPORT_MAX_ROWS} rows")
+
+        values = await importer.validate(session, chunk)
+        if values and not dry_run:
+            await session.exec(insert(importer.model).values(values))
+            await importer.inserted(session, values)
+        imported += len(values)
+
+    return RosterImportReport(
+        kind=importer.kind,
+        dry_run=dry_run,
+        total_rows=total,
+        imported=imported,
+        failed=total - imported,
+        errors=importer.errors,
+    )
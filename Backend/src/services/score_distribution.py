@@ -0,0 +1,216 @@
+"""
+Score distributions
+Loads a school's (or the whole district's) marks and exam marks as flat NumPy
+arrays and computes count, mean, standard deviation, quartiles, histogram and
+pass rate for every group in one vectorized pass: the scores are sorted once
+and each grouping reorders them stably by group, which makes every group a
+contiguous sorted slice whose quantiles are read off by index. Results are
+cached per school until one of the data versions they depend on changes.
+"""
+
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import union_all
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.models import Class, Exam, ExamMarks, Marks, School, Subject
+from src.models.models import ScoreDistribution, ScoreDistributionResponse
+from src.services.data_versions import get_data_versions, CLASSES, EXAMS, MARKS, SCHOOLS, SUBJECTS
+from src.services.response_cache import VersionedCache
+
+# what a school's distributions depend on, subjects are district-wide
+SCHOOL_ENTITIES = (MARKS, EXAMS, CLASSES, SUBJECTS)
+DISTRICT_ENTITIES = (MARKS, EXAMS, SCHOOLS, SUBJECTS)
+
+# columns of the key array
+SCHOOL, CLASS, SUBJECT = 0, 1, 2
+
+# keyed by school_id, None for the district
+distribution_cache = VersionedCache(Config.SCORE_DISTRIBUTION_CACHE_MAX_ENTRIES)
+
+
+def _scores_select(school_id: Optional[int]):
+    # exam marks count as a percentage of the exam's max marks, like the marks aggregate
+    marks = (
+        select(Class.school_id, Marks.class_id, Marks.subject_id, Marks.marks.label("score"))
+        .select_from(Marks)
+        .join(Class, Marks.class_id == Class.id)
+    )
+    exam_marks = (
+        select(Class.school_id, Exam.class_id, Exam.subject_id, (ExamMarks.marks_obtained * 100.0 / Exam.max_marks).label("score"))
+        .select_from(ExamMarks)
+        .join(Exam, ExamMarks.exam_id == Exam.id)
+        .join(Class, Exam.class_id == Class.id)
+        .where(Exam.max_marks > 0)
+    )
+    if school_id is not None:
+        marks = marks.where(Class.school_id == school_id)
+        exam_marks = exam_marks.where(Class.school_id == school_id)
+    cells = union_all(marks, exam_marks).subquery()
+    return select(cells.c.school_id, cells.c.class_id, cells.c.subject_id, cells.c.score)
+
+
+async def load_scores(session: AsyncSession, school_id: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """(school, class, subject) keys as an (n, 3) int array and the matching scores"""
+    rows = (await session.exec(_scores_select(school_id))).all()
+    flat = np.fromiter((value for row in rows for value in row), dtype=np.float64, count=len(rows) * 4)
+    flat = flat.reshape(-1, 4)
+    return flat[:, :3].astype(np.int64), np.ascontiguousarray(flat[:, 3])
+
+
+def bin_edges() -> List[float]:
+    return np.linspace(0, 100, Config.SCORE_HISTOGRAM_BINS + 1).tolist()
+
+
+def _group_ids(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """The distinct rows of `keys` (in sorted order) and each row's index among them"""
+    # one int code per key row, much faster to group than the rows themselves
+    radixes = keys.max(axis=0) + 1
+    code = np.zeros(len(keys), dtype=np.int64)
+    for column, radix in zip(keys.T, radixes):
+        code = code * radix + column
+
+    if int(np.prod(radixes, dtype=np.float64)) > max(len(code), 1 << 16):
+        codes, group = np.unique(code, return_inverse=True)
+        group = group.reshape(-1)
+    else:
+        # ids are small, a lookup table over every possible code avoids sorting
+        present = np.bincount(code) > 0
+        codes = np.flatnonzero(present)
+        group = (np.cumsum(present) - 1)[code]
+
+    groups = np.empty((len(codes), keys.shape[1]), dtype=np.int64)
+    for i in reversed(range(keys.shape[1])):
+        codes, groups[:, i] = np.divmod(codes, radixes[i])
+    return groups, group
+
+
+def distributions(
+        keys: np.ndarray,
+        scores: np.ndarray,
+        by_score: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Statistics of `scores` per distinct row of `keys` (n, k): the distinct
+    keys (g, k) and a dict of (g,) arrays, plus the (g, bins) histogram.
+    `by_score` (an argsort of the scores) can be shared by several
+    groupings of the same scores.
+    """
+    if not len(scores):
+        return keys[:0], {}
+    if by_score is None:
+        by_score = np.argsort(scores)
+
+    groups, group = _group_ids(keys)
+
+    # regrouping the score order stably leaves each group's scores sorted,
+    # small group ids take numpy's radix sort
+    grouped = group[by_score]
+    if len(groups) <= np.iinfo(np.uint16).max:
+        grouped = grouped.astype(np.uint16)
+    order = by_score[np.argsort(grouped, kind="stable")]
+
+    ordered = scores[order]
+    counts = np.bincount(group, minlength=len(groups))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    ends = starts + counts - 1
+
+    means = np.add.reduceat(ordered, starts) / counts
+    deviations = ordered - np.repeat(means, counts)
+
+    def quantile(q: float) -> np.ndarray:
+        # linear interpolation between the closest ranks, as np.quantile does
+        position = starts + q * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, ends)
+        return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+    bins = Config.SCORE_HISTOGRAM_BINS
+    bucket = np.clip((scores * bins // 100).astype(np.int64), 0, bins - 1)
+    histogram = np.bincount(group * bins + bucket, minlength=len(groups) * bins).reshape(len(groups), bins)
+
+    return groups, {
+        "count": counts,
+        "mean": means,
+        "std": np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts),
+        "min": ordered[starts],
+        "q1": quantile(0.25),
+        "median": quantile(0.5),
+        "q3": quantile(0.75),
+        "max": ordered[ends],
+        "pass_rate": np.add.reduceat(ordered >= Config.PASS_PERCENTAGE, starts) * 100.0 / counts,
+        "histogram": histogram,
+    }
+
+
+def _rows(
+        keys: np.ndarray,
+        scores: np.ndarray,
+        by_score: np.ndarray,
+        columns: Sequence[int],
+        names: Dict[int, Dict[int, str]]
+    ) -> List[ScoreDistribution]:
+    groups, stats = distributions(keys[:, columns], scores, by_score)
+    fields = {SCHOOL: "school", CLASS: "class", SUBJECT: "subject"}
+    rows = []
+    for i, group in enumerate(groups.tolist()):
+        ids = {}
+        for column, value in zip(columns, group):
+            ids[f"{fields[column]}_id"] = value
+            ids[f"{fields[column]}_name"] = names[column].get(value)
+        rows.append(ScoreDistribution(
+            **ids,
+            count=int(stats["count"][i]),
+            histogram=stats["histogram"][i].tolist(),
+            **{name: round(float(stats[name][i]), 2) for name in ("mean", "std", "min", "q1", "median", "q3", "max", "pass_rate")},
+        ))
+    return rows
+
+
+def build_response(
+        school_id: Optional[int],
+        keys: np.ndarray,
+        scores: np.ndarray,
+        names: Dict[int, Dict[int, str]]
+    ) -> ScoreDistributionResponse:
+    """Per class / subject groupings for a school, per school / subject ones for the district"""
+    response = ScoreDistributionResponse(school_id=school_id, pass_mark=Config.PASS_PERCENTAGE, bin_edges=bin_edges())
+    # the scores are sorted once, every grouping reuses the order
+    by_score = np.argsort(scores)
+    if school_id is None:
+        response.by_school = _rows(keys, scores, by_score, [SCHOOL], names)
+        response.by_subject = _rows(keys, scores, by_score, [SUBJECT], names)
+        response.by_school_subject = _rows(keys, scores, by_score, [SCHOOL, SUBJECT], names)
+    else:
+        response.by_class = _rows(keys, scores, by_score, [CLASS], names)
+        response.by_subject = _rows(keys, scores, by_score, [SUBJECT], names)
+        response.by_class_subject = _rows(keys, scores, by_score, [CLASS, SUBJECT], names)
+    return response
+
+
+async def _names(session: AsyncSession, school_id: Optional[int]) -> Dict[int, Dict[int, str]]:
+    classes = select(Class.id, Class.name)
+    if school_id is not None:
+        classes = classes.where(Class.school_id == school_id)
+    return {
+        SCHOOL: dict((await session.exec(select(School.id, School.name))).all()) if school_id is None else {},
+        CLASS: dict((await session.exec(classes)).all()) if school_id is not None else {},
+        SUBJECT: dict((await session.exec(select(Subject.id, Subject.name))).all()),
+    }
+
+
+async def score_distribution(session: AsyncSession, school_id: Optional[int] = None) -> ScoreDistributionResponse:
+    """A school's distributions, or the district's when school_id is None, recomputed only after their data changed"""
+    versions = await get_data_versions(session, SCHOOL_ENTITIES if school_id is not None else DISTRICT_ENTITIES, school_id)
+
+    async def compute():
+        keys, scores = await load_scores(session, school_id)
+        names = await _names(session, school_id)
+        # a district's worth of scores is a few hundred ms of numpy, keep it off the event loop
+        return await asyncio.to_thread(build_response, school_id, keys, scores, names)
+
+    return await distribution_cache.get_or_compute(school_id, tuple(sorted(versions.items())), compute)
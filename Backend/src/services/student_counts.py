@@ -0,0 +1,86 @@
+"""
+Class student counts
+Keeps class.student_count in step with student creates, deletes and
+transfers, so class listings read the count off the class row instead of
+counting students. A periodic reconciliation recounts from the student
+table and fixes any class that drifted (e.g. rows written outside the API).
+"""
+
+import asyncio
+from collections import defaultdict
+from typing import Iterable, Tuple
+
+from sqlalchemy import case, func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import Config
+from src.db.main import async_session_maker
+from src.models import Class, Student
+
+
+async def apply_student_count_deltas(session: AsyncSession, deltas: Iterable[Tuple[int, int]]):
+    """
+    Add (class_id, delta) changes to the classes' student counts in one
+    statement: +1 per enrolled student, -1 per removed one. Call before commit.
+    """
+    totals = defaultdict(int)
+    for class_id, delta in deltas:
+        totals[class_id] += delta
+    totals = {class_id: delta for class_id, delta in totals.items() if class_id is not None and delta}
+    if not totals:
+        return
+
+    await session.exec(
+        update(Class)
+        .where(Class.id.in_(list(totals)))
+        .values(student_count=Class.student_count + case(totals, value=Class.id, else_=0))
+        .execution_options(synchronize_session="fetch")
+    )
+
+
+def _counted():
+    return (
+        select(func.count(Student.id))
+        .where(Student.class_id == Class.id)
+        .correlate(Class)
+        .scalar_subquery()
+    )
+
+
+async def reconcile_student_counts(session: AsyncSession) -> int:
+    """Recount every class's students, returns the number of classes that had drifted"""
+    result = await session.exec(
+        update(Class)
+        .where(Class.student_count != _counted())
+        .values(student_count=_counted())
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def reconcile_student_counts_periodically():
+    """Background loop: repair drifted class student counts"""
+    while True:
+        try:
+            async with async_session_maker() as session:
+                fixed = await reconcile_student_counts(session)
+            if fixed:
+                print(f"Reconciled student counts of {fixed} classes")
+        except Exception as e:
+            print(f"Student count reconciliation failed: {str(e)}")
+        await asyncio.sleep(Config.STUDENT_COUNT_RECONCILE_INTERVAL_SECONDS)
+
+
+async def main():
+    from src.db.main import async_engine
+
+    async with async_session_maker() as session:
+        fixed = await reconcile_student_counts(session)
+    await async_engine.dispose()
+    print(f"student counts reconciled ({fixed} classes fixed)")
+
+
+if __name__ == "__main__":
+    # python -m src.services.student_counts
+    asyncio.run(main())
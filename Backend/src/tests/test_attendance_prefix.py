@@ -0,0 +1,150 @@
+# test_attendance_prefix.py
+"""
+Checks student_attendance_prefix against a direct count of the attendance
+rows: range counts and absence streaks after a full rebuild, and after a
+back-dated day is re-marked and only the days from it onwards are
+recomputed (which carries the running totals and streak of the day before).
+"""
+
+import os
+import random
+import asyncio
+import tempfile
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.models import Attendance, Class, District, School, Student, StudentAttendancePrefix, Teacher
+from src.services.attendance_prefix import (
+    absence_streaks, rebuild_student_attendance_prefix, refresh_student_days, student_range_counts
+)
+
+START = date(2026, 9, 1)
+DAYS = 60
+STUDENTS = 4
+REMARKED = 22
+
+# (student_id, day) -> present
+Marks = Dict[Tuple[int, date], bool]
+
+
+def synthetic_marks(student_ids: List[int], seed: int = 11) -> Marks:
+    rng = random.Random(seed)
+    marks = {}
+    for student_id in student_ids:
+        for offset in range(DAYS):
+            if rng.random() < 0.7:
+                marks[student_id, START + timedelta(days=offset)] = rng.random() < 0.6
+    # an absence run broken by one present day, which is re-marked absent
+    # below: the streak then has to carry over from the days before it
+    for offset in range(15, 30):
+        marks[student_ids[0], START + timedelta(days=offset)] = offset == REMARKED
+    return marks
+
+
+def reference_counts(marks: Marks, student_id: int, date_from: date, date_to: date) -> Tuple[int, int]:
+    days = [present for (sid, day), present in marks.items() if sid == student_id and date_from <= day <= date_to]
+    return sum(days), len(days)
+
+
+def reference_streaks(marks: Marks, student_id: int) -> Dict[date, int]:
+    """Absent marked days in a row ending on each of the student's marked days"""
+    streaks, streak = {}, 0
+    for day in sorted(day for sid, day in marks if sid == student_id):
+        streak = 0 if marks[student_id, day] else streak + 1
+        streaks[day] = streak
+    return streaks
+
+
+async def check(session: AsyncSession, marks: Marks, student_ids: List[int], class_id: int):
+    for student_id in student_ids:
+        rows = (await session.exec(
+            select(StudentAttendancePrefix.attendance_date, StudentAttendancePrefix.absence_streak)
+            .where(StudentAttendancePrefix.student_id == student_id)
+        )).all()
+        assert dict(rows) == reference_streaks(marks, student_id), student_id
+
+        for start in range(-3, DAYS + 3, 4):
+            for length in (0, 1, 6, 20, DAYS):
+                date_from = START + timedelta(days=start)
+                date_to = date_from + timedelta(days=length)
+                counts = await student_range_counts(session, student_id, date_from, date_to)
+                assert counts == reference_counts(marks, student_id, date_from, date_to), (student_id, date_from, date_to)
+
+    for offset in (10, 25, 40, DAYS):
+        as_of = START + timedelta(days=offset)
+        expected = []
+        for student_id in student_ids:
+            streaks = {day: streak for day, streak in reference_streaks(marks, student_id).items() if day <= as_of}
+            if streaks and streaks[max(streaks)] >= 2:
+                expected.append((student_id, streaks[max(streaks)]))
+        expected.sort(key=lambda entry: (-entry[1], entry[0]))
+        found = await absence_streaks(session, [Student.class_id == class_id], as_of, 2)
+        assert [(entry.student_id, entry.streak_days) for entry in found] == expected, as_of
+
+
+async def run(db_url: str):
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    try:
+        async with session_maker() as session:
+            district = District(name="District")
+            session.add(district)
+            await session.flush()
+            school = School(name="School", district_id=district.id)
+            session.add(school)
+            await session.flush()
+            teacher = Teacher(name="Teacher", email="teacher@school.edu", school_id=school.id)
+            class_ = Class(name="6A", grade="6", section="A", school_id=school.id)
+            session.add_all([teacher, class_])
+            await session.flush()
+            students = [Student(name=f"Student {i}", roll_no=str(i), class_id=class_.id) for i in range(STUDENTS)]
+            session.add_all(students)
+            await session.flush()
+            student_ids = [student.id for student in students]
+
+            marks = synthetic_marks(student_ids)
+            session.add_all([
+                Attendance(student_id=student_id, teacher_id=teacher.id, class_id=class_.id, attendance_date=day, is_present=present)
+                for (student_id, day), present in marks.items()
+            ])
+            await session.commit()
+
+        async with session_maker() as session:
+            await rebuild_student_attendance_prefix(session)
+            await check(session, marks, student_ids, class_.id)
+
+        # re-mark a back-dated day: flip whoever was marked, mark the rest present
+        remarked = START + timedelta(days=REMARKED)
+        async with session_maker() as session:
+            for student_id in student_ids[:3]:
+                if (student_id, remarked) in marks:
+                    row = (await session.exec(
+                        select(Attendance).where(Attendance.student_id == student_id, Attendance.attendance_date == remarked)
+                    )).one()
+                    row.is_present = not row.is_present
+                    session.add(row)
+                else:
+                    session.add(Attendance(student_id=student_id, teacher_id=teacher.id, class_id=class_.id, attendance_date=remarked, is_present=True))
+                marks[student_id, remarked] = not marks.get((student_id, remarked), False)
+            await refresh_student_days(session, [(student_id, remarked) for student_id in student_ids[:3]])
+            await session.commit()
+
+        async with session_maker() as session:
+            await check(session, marks, student_ids, class_.id)
+    finally:
+        await engine.dispose()
+
+
+def test_prefix_matches_attendance_after_back_dated_remark():
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run(f"sqlite+aiosqlite:///{tmp}/prefix.db"))
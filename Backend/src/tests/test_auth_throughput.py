@@ -0,0 +1,181 @@
+# test_auth_throughput.py
+"""
+Login storm benchmark (e.g. every teacher signing in at the start of the
+school day). Fires concurrent logins at the app while probing unrelated
+endpoints, and reports logins / sec and the probes' p50 / p99 latency, once
+with bcrypt run inline on the event loop and once on the hashing pool.
+
+Under pytest a small storm on a temporary SQLite database only checks that
+every login hashes on the pool rather than the event loop: latencies depend
+on the machine and its load, so they are reported, not asserted. For a
+measurement closer to production (default cost factor 12, with the usual
+DATABASE_URL / SECRET_KEY environment available):
+
+    python -m src.tests.test_auth_throughput [logins] [concurrency] [bcrypt rounds]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import httpx
+from passlib.hash import bcrypt
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src import app
+from src.auth import security as security_module
+from src.auth.models import User, UserRole
+from src.auth.security import SecurityManager, pwd_context
+from src.db.main import get_session
+
+PASSWORD = "storm-password"
+
+# endpoints that never touch bcrypt
+PROBES = ["/api/v1/health", "/api/v1/auth/me"]
+
+
+_pool_hashing = security_module._run_hashing
+
+
+async def _inline_hashing(fn, *args):
+    return fn(*args)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+async def login_storm(db_url: str, logins: int, concurrency: int, rounds: int, inline: bool = False) -> Dict[str, Any]:
+    engine = create_async_engine(db_url)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+    hashed = bcrypt.using(rounds=rounds).hash(PASSWORD)
+    emails = [f"storm{i}@school.edu" for i in range(concurrency)]
+    async with session_maker() as session:
+        session.add_all([
+            User(email=email, hashed_password=hashed, first_name="Storm", last_name=email, role=UserRole.TEACHER)
+            for email in emails + ["probe@school.edu"]
+        ])
+        await session.commit()
+
+    async def storm_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = storm_session
+    if inline:
+        security_module._run_hashing = _inline_hashing
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post("/api/v1/auth/login", json={"email": "probe@school.edu", "password": PASSWORD})
+            headers = {"Authorization": f"Bearer {response.json()['tokens']['access_token']}"}
+
+            storming = True
+            latencies: List[float] = []
+
+            async def probe():
+                while storming:
+                    for path in PROBES:
+                        start = time.perf_counter()
+                        response = await client.get(path, headers=headers)
+                        latencies.append(time.perf_counter() - start)
+                        assert response.status_code == 200, response.text
+                    await asyncio.sleep(0.005)
+
+            slots = asyncio.Semaphore(concurrency)
+
+            async def login(i: int):
+                async with slots:
+                    response = await client.post("/api/v1/auth/login", json={"email": emails[i % concurrency], "password": PASSWORD})
+                    assert response.status_code == 200, response.text
+
+            prober = asyncio.create_task(probe())
+            start = time.perf_counter()
+            await asyncio.gather(*(login(i) for i in range(logins)))
+            elapsed = time.perf_counter() - start
+            storming = False
+            await prober
+    finally:
+        app.dependency_overrides.pop(get_session, None)
+        security_module._run_hashing = _pool_hashing
+        await engine.dispose()
+
+    return {
+        "mode": "inline" if inline else "pool",
+        "logins": logins,
+        "seconds": round(elapsed, 2),
+        "logins_per_sec": round(logins / elapsed, 1),
+        "probes": len(latencies),
+        "probe_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "probe_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def run_benchmark(logins: int, concurrency: int, rounds: int) -> List[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        return [
+            asyncio.run(login_storm(f"sqlite+aiosqlite:///{tmp}/{mode}.db", logins, concurrency, rounds, inline=mode == "inline"))
+            for mode in ["inline", "pool"]
+        ]
+
+
+class RecordingPool(ThreadPoolExecutor):
+    """Hashing pool that remembers what it was handed"""
+
+    def __init__(self):
+        super().__init__(max_workers=2, thread_name_prefix="bcrypt-test")
+        self.calls = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls.append(fn)
+        return super().submit(fn, *args, **kwargs)
+
+
+def test_password_hashing_runs_on_the_pool(monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(security_module, "_hashing_pool", pool)
+
+    async def hash_and_verify():
+        hashed = await SecurityManager.hash_password_async(PASSWORD)
+        return await SecurityManager.verify_password_async(PASSWORD, hashed)
+
+    try:
+        assert asyncio.run(hash_and_verify())
+    finally:
+        pool.shutdown()
+    assert pool.calls == [pwd_context.hash, pwd_context.verify]
+
+
+def test_login_storm_verifies_on_the_pool(monkeypatch):
+    pool = RecordingPool()
+    monkeypatch.setattr(security_module, "_hashing_pool", pool)
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            result = asyncio.run(login_storm(f"sqlite+aiosqlite:///{tmp}/pool.db", logins=16, concurrency=4, rounds=4))
+        finally:
+            pool.shutdown()
+    # the storm's logins and the probe user's
+    assert pool.calls.count(pwd_context.verify) == result["logins"] + 1, result
+    assert result["probes"] > 0
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 12
+    for result in run_benchmark(logins, concurrency, rounds):
+        print(result)
@@ -0,0 +1,89 @@
+# test_score_distribution.py
+"""
+Checks the vectorized score distribution engine against per group NumPy
+reference statistics, and runs a whole-district recompute on synthetic
+scores (schools x classes x subjects x students x marks per student).
+
+Under pytest a mid-sized district is only checked for returning every
+group. The recompute time is printed when run directly:
+
+    python -m src.tests.test_score_distribution [schools] [students per class]
+"""
+
+import os
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import numpy as np
+
+from src.config import Config
+from src.services.score_distribution import CLASS, SCHOOL, SUBJECT, build_response, distributions
+
+CLASSES_PER_SCHOOL = 12
+SUBJECTS = 8
+MARKS_PER_STUDENT = 4
+
+
+def synthetic_district(schools: int, students_per_class: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    per_cell = students_per_class * MARKS_PER_STUDENT
+    school, class_, subject = np.meshgrid(
+        np.arange(schools), np.arange(CLASSES_PER_SCHOOL), np.arange(SUBJECTS), indexing="ij"
+    )
+    cells = np.stack([school.ravel(), school.ravel() * CLASSES_PER_SCHOOL + class_.ravel(), subject.ravel()], axis=1)
+    keys = np.repeat(cells, per_cell, axis=0).astype(np.int64)
+    scores = np.clip(rng.normal(62, 18, len(keys)), 0, 100).round(1)
+    # stored in no particular order
+    shuffle = rng.permutation(len(keys))
+    return keys[shuffle], scores[shuffle]
+
+
+def test_matches_per_group_reference():
+    rng = np.random.default_rng(1)
+    keys = rng.integers(0, 6, size=(5000, 2))
+    scores = rng.uniform(0, 100, 5000).round(1)
+    # a single-score group and a perfect score
+    keys = np.vstack([keys, [[99, 99]], [[0, 0]]])
+    scores = np.concatenate([scores, [41.0], [100.0]])
+
+    groups, stats = distributions(keys, scores)
+    edges = np.linspace(0, 100, Config.SCORE_HISTOGRAM_BINS + 1)
+    for i, key in enumerate(groups):
+        values = scores[(keys == key).all(axis=1)]
+        assert stats["count"][i] == len(values)
+        assert np.isclose(stats["mean"][i], values.mean())
+        assert np.isclose(stats["std"][i], values.std())
+        assert np.allclose(
+            [stats["min"][i], stats["q1"][i], stats["median"][i], stats["q3"][i], stats["max"][i]],
+            np.quantile(values, [0, 0.25, 0.5, 0.75, 1]),
+        )
+        assert np.isclose(stats["pass_rate"][i], (values >= Config.PASS_PERCENTAGE).mean() * 100)
+        assert stats["histogram"][i].tolist() == np.histogram(values, edges)[0].tolist()
+
+
+def district_recompute(schools: int, students_per_class: int) -> dict:
+    keys, scores = synthetic_district(schools, students_per_class)
+    names = {SCHOOL: {}, CLASS: {}, SUBJECT: {}}
+    start = time.perf_counter()
+    response = build_response(None, keys, scores, names)
+    elapsed = time.perf_counter() - start
+    return {
+        "scores": len(scores),
+        "groups": len(response.by_school) + len(response.by_subject) + len(response.by_school_subject),
+        "seconds": round(elapsed, 3),
+    }
+
+
+def test_district_recompute_covers_every_group():
+    # 100 schools, ~1.5M scores
+    result = district_recompute(schools=100, students_per_class=40)
+    assert result["groups"] == 100 + SUBJECTS + 100 * SUBJECTS, result
+
+
+if __name__ == "__main__":
+    schools = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    students_per_class = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    print(district_recompute(schools, students_per_class))
@@ -31,6 +31,9 @@ import {
 const API_BASE_URL =
   import.meta.env.VITE_API_BASE_URL || "http://localhost:8000";
 
+// largest page the list endpoints serve
+const PAGE_SIZE = 1000;
+
 const api: AxiosInstance = axios.create({
   baseURL: `${API_BASE_URL}/api/v1`,
   headers: {
@@ -156,14 +159,30 @@ export const dashboardAPI = {
   },
 };
 
+// List endpoints return one page per request; follow X-Next-Cursor until the last page
+const getAllPages = async <T>(
+  url: string,
+  params: Record<string, unknown> = {}
+): Promise<T[]> => {
+  const items: T[] = [];
+  let cursor: string | undefined;
+  do {
+    const response = await api.get<T[]>(url, {
+      params: { ...params, limit: PAGE_SIZE, ...(cursor ? { cursor } : {}) },
+    });
+    items.push(...response.data);
+    cursor = response.headers["x-next-cursor"] as string | undefined;
+  } while (cursor);
+  return items;
+};
+
 // Schools API services
 
 export const schoolsAPI = {
   getAll: async (district_id?: number): Promise<School[]> => {
     try {
       const params = district_id ? { district_id } : {};
-      const { data } = await api.get<School[]>("/routers/schools/", { params });
-      return data;
+      return await getAllPages<School>("/routers/schools/", params);
     } catch (error) {
       console.error("[SchoolsAPI] Error fetching all schools:", error);
       return [];
@@ -312,8 +331,7 @@ export const classesApi = {
   // Get all classes
   getClasses: async (schoolId?: number): Promise<ClassItem[]> => {
     const params = schoolId ? { school_id: schoolId } : {};
-    const response = await api.get("/routers/classes/", { params });
-    return response.data;
+    return getAllPages<ClassItem>("/routers/classes/", params);
   },
 
   // Get single class
@@ -343,10 +361,9 @@ export const classesApi = {
   //Fetch students for a specific class
   getStudents: async (classId: number): Promise<Student[]> => {
     try {
-      const { data } = await api.get<Student[]>(
-        `/routers/students?class_id=${classId}`
-      );
-      return data;
+      return await getAllPages<Student>("/routers/students/", {
+        class_id: classId,
+      });
     } catch (error) {
       console.error(
         `[ClassesAPI] Error fetching students for class ${classId}:`,
@@ -396,8 +413,7 @@ export const teachersApi = {
   // Get all teachers
   getTeachers: async (schoolId?: number): Promise<Teacher[]> => {
     const params = schoolId ? { school_id: schoolId } : {};
-    const response = await api.get("/routers/teachers/", { params });
-    return response.data;
+    return getAllPages<Teacher>("/routers/teachers/", params);
   },
 
   // Get teacher classes
@@ -422,8 +438,7 @@ export const teachersApi = {
 export const subjectsApi = {
   // Get all subjects
   getSubjects: async (): Promise<Subject[]> => {
-    const response = await api.get("/routers/subjects/");
-    return response.data;
+    return getAllPages<Subject>("/routers/subjects/");
   },
 
   // Create subject
@@ -540,10 +555,7 @@ export const examsAPI = {
   // Get exams for a specific teacher
   getTeacherExams: async (teacherId: number): Promise<Exam[]> => {
     try {
-      const { data } = await api.get<Exam[]>(
-        `/routers/exams/teacher/${teacherId}`
-      );
-      return data;
+      return await getAllPages<Exam>(`/routers/exams/teacher/${teacherId}`);
     } catch (error: any) {
       console.error("[ExamsAPI] Error fetching teacher exams:", error);
       return [];
@@ -553,8 +565,7 @@ export const examsAPI = {
   // Get current teacher's exams
   getMyExams: async (): Promise<Exam[]> => {
     try {
-      const { data } = await api.get<Exam[]>("/routers/exams/me");
-      return data;
+      return await getAllPages<Exam>("/routers/exams/me");
     } catch (error: any) {
       console.error("[ExamsAPI] Error fetching my exams:", error);
       return [];